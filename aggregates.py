@@ -0,0 +1,432 @@
+"""Precomputed aggregates behind the dashboard charts.
+
+``SalesCube`` folds the raw frame once into dense (Year x Month x
+Vehicle_Type x Recession) arrays of sums and non-null counts.  Every chart
+series is then a small reduction over those arrays, so the cost of a
+callback depends on the number of distinct keys rather than on the number
+of rows.
+
+Cubes are mergeable, so a file too large for memory can be folded in chunk
+by chunk (``SalesCube.from_chunks``) without ever holding all raw rows.
+
+Sales are also totalled per value of the continuous driver the bar chart is
+drawn over (``CUBE_DRIVERS``; ``SalesCube.by_driver``, binned by
+``binning.Binning``), and per calendar date, for the monthly and daily series
+(``SalesCube.timeseries``) of the long-range line charts.  Both grow with the
+distinct keys, not with the rows.  The other ``DRIVERS`` are binned from the
+raw rows when those are kept.
+
+Every query takes an optional cross filter (``cross_filter.CrossFilter``).
+``series`` applies it by masking the cube axes.  The date and driver totals
+are not broken down by every dimension, so for those the cube reads the
+rows passing the filter through the bitmaps of ``indexes.RowIndex``, when
+the raw rows are kept (``attach_rows``).  A cube folded without them
+(streamed ingest) is built ``detailed`` instead: its date and driver totals
+are also broken down by ``DETAIL_KEYS``, and a filter selects the totals it
+keeps.
+"""
+
+import numpy as np
+import pandas as pd
+
+from binning import reduce_totals
+
+MONTH_ORDER = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+DIMENSIONS = ('Year', 'Month', 'Vehicle_Type', 'Recession')
+MEASURES = ('Automobile_Sales', 'Advertising_Expenditure')
+# Continuous columns sales can be broken down by, per vehicle type (binning.py)
+DRIVERS = ('unemployment_rate', 'GDP', 'Advertising_Expenditure')
+# The drivers the cube keeps totals of, the ones the charts draw.  GDP and
+# advertising take about one value per row, so their per-value totals would
+# grow as large as the rows; they are totalled from the raw rows on request.
+CUBE_DRIVERS = ('unemployment_rate',)
+DATE_KEYS = ['Date', 'Recession']
+# Further keys of the date and driver totals of a detailed cube, so that
+# every dimension a cross filter selects on is one of their keys
+DETAIL_KEYS = ['Year', 'Month', 'Vehicle_Type']
+
+# Granularities of SalesCube.timeseries and the NumPy unit each is floored to
+TIMESERIES_UNITS = {'Month': 'M', 'Day': 'D'}
+
+
+def _month_labels(values):
+    present = set(values)
+    labels = [m for m in MONTH_ORDER if m in present]
+    return labels + sorted(present.difference(MONTH_ORDER))
+
+
+def _driver_totals(frame, driver, detailed=False):
+    """Sum and count of Automobile_Sales per (Vehicle_Type, driver, Recession),
+    and per Year and Month if ``detailed``."""
+    recession = pd.Series(frame['Recession'].to_numpy() == 1, index=frame.index, name='Recession')
+    keys = [frame['Vehicle_Type'], frame[driver], recession]
+    if detailed:
+        keys += [frame['Year'], frame['Month']]
+    return (
+        frame['Automobile_Sales']
+        .groupby(keys, observed=True)
+        .agg(['sum', 'count'])
+        .reset_index()
+        .astype({'Vehicle_Type': object})
+    )
+
+
+def _date_totals(frame, detailed=False):
+    """Sum and count of Automobile_Sales per (Date, Recession), and per
+    ``DETAIL_KEYS`` if ``detailed``."""
+    names = DATE_KEYS + DETAIL_KEYS if detailed else DATE_KEYS
+    if 'Date' not in frame.columns:
+        levels = [pd.DatetimeIndex([]), np.empty(0, dtype=bool)] + [np.empty(0)] * (len(names) - 2)
+        return pd.DataFrame(
+            {'sum': np.empty(0), 'count': np.empty(0, dtype=np.int64)},
+            index=pd.MultiIndex.from_arrays(levels, names=names),
+        )
+    # Group on the raw (categorical) strings first, so each distinct date
+    # string is parsed once rather than once per row
+    keys = pd.DataFrame({'Date': frame['Date'], 'Recession': frame['Recession'].to_numpy() == 1})
+    if detailed:
+        keys = keys.assign(**{key: frame[key] for key in DETAIL_KEYS})
+    totals = (
+        frame['Automobile_Sales']
+        .groupby([keys[key] for key in names], observed=True)
+        .agg(['sum', 'count'])
+        .reset_index()
+    )
+    return parse_date_totals(totals, names)
+
+
+def parse_date_totals(totals, keys=DATE_KEYS):
+    """Totals per (date string, recession flag, ...) regrouped on parsed dates."""
+    totals['Date'] = pd.to_datetime(totals['Date'].astype(str), errors='coerce')
+    return totals.dropna(subset=['Date']).groupby(keys, observed=True)[['sum', 'count']].sum()
+
+
+def _selected_totals(totals, where):
+    """The rows of detailed totals whose keys pass the cross filter ``where``."""
+    keep = np.ones(len(totals), dtype=bool)
+    for dimension in DIMENSIONS:
+        if dimension in totals.index.names:
+            labels = totals.index.get_level_values(dimension)
+        else:
+            labels = totals[dimension]
+        mask = where.mask(dimension, labels.to_numpy())
+        if mask is not None:
+            keep &= mask
+    return totals[keep]
+
+
+def date_series(date_totals, granularity, recession=None):
+    """Average Automobile_Sales per month or day from per-date totals."""
+    totals = date_totals
+    if recession is not None:
+        totals = totals[totals.index.get_level_values('Recession') == (recession == 1)]
+    else:
+        totals = totals.groupby(level='Date').sum()
+    dates = totals.index.get_level_values('Date').to_numpy()
+    dates, codes = np.unique(dates.astype(f'datetime64[{TIMESERIES_UNITS[granularity]}]'), return_inverse=True)
+    sums = np.bincount(codes, weights=totals['sum'].to_numpy(dtype=np.float64), minlength=len(dates))
+    counts = np.bincount(codes, weights=totals['count'].to_numpy(dtype=np.float64), minlength=len(dates))
+    observed = counts > 0
+    return pd.DataFrame({
+        'Date': dates[observed].astype('datetime64[ns]'),
+        'Automobile_Sales': sums[observed] / counts[observed],
+    })
+
+
+class SalesCube:
+
+    def __init__(self, years, months, vehicle_types, rows, sums, counts, dtypes, driver_totals, date_totals, detailed=False):
+        self.years = years
+        self.months = months
+        self.vehicle_types = vehicle_types
+        self.rows = rows
+        self.sums = sums
+        self.counts = counts
+        self.dtypes = dtypes
+        # Sum and count of Automobile_Sales per (Vehicle_Type, value,
+        # Recession) of each of CUBE_DRIVERS; kept as totals so that partial
+        # cubes can be merged and bins can be formed from them
+        self.driver_totals = driver_totals
+        self._by_driver = {}
+        # Sum and count of Automobile_Sales per (Date, Recession)
+        self.date_totals = date_totals
+        self._timeseries = {}
+        # Date and driver totals also broken down by DETAIL_KEYS, for cross
+        # filters without the raw rows
+        self.detailed = detailed
+        # The raw frame and its RowIndex, for filters the totals cannot answer
+        self._raw = None
+        self.labels = {
+            'Year': np.asarray(years),
+            'Month': np.asarray(months, dtype=object),
+            'Vehicle_Type': np.asarray(vehicle_types, dtype=object),
+            'Recession': np.array([0, 1]),
+        }
+        self._year_index = {year: i for i, year in enumerate(years)}
+
+    @classmethod
+    def from_frame(cls, frame, measures=MEASURES, detailed=False):
+        # Rows with a missing key are dropped, as groupby() would do
+        keys = frame[list(DIMENSIONS[:3])]
+        valid = keys.notna().all(axis=1).to_numpy()
+        if not valid.all():
+            frame = frame[valid]
+
+        years = np.unique(frame['Year'].to_numpy())
+        months = _month_labels(frame['Month'].unique())
+        vehicle_types = sorted(frame['Vehicle_Type'].unique())
+
+        year_codes = np.searchsorted(years, frame['Year'].to_numpy())
+        month_codes = pd.Categorical(frame['Month'], categories=months).codes
+        type_codes = pd.Categorical(frame['Vehicle_Type'], categories=vehicle_types).codes
+        rec_codes = (frame['Recession'].to_numpy() == 1).astype(np.intp)
+
+        shape = (len(years), len(months), len(vehicle_types), 2)
+        flat = np.ravel_multi_index((year_codes, month_codes, type_codes, rec_codes), shape)
+        size = int(np.prod(shape))
+        rows = np.bincount(flat, minlength=size).reshape(shape)
+
+        sums, counts, dtypes = {}, {}, {}
+        for measure in measures:
+            values = frame[measure].to_numpy()
+            present = ~pd.isna(values)
+            sums[measure] = np.bincount(flat[present], weights=values[present].astype(np.float64), minlength=size).reshape(shape)
+            counts[measure] = np.bincount(flat[present], minlength=size).reshape(shape)
+            dtypes[measure] = frame[measure].dtype
+
+        driver_totals = {
+            driver: _driver_totals(frame, driver, detailed)
+            for driver in CUBE_DRIVERS
+            if driver in frame.columns
+        }
+        date_totals = _date_totals(frame, detailed)
+        return cls(years, months, vehicle_types, rows, sums, counts, dtypes, driver_totals, date_totals, detailed)
+
+    @classmethod
+    def from_chunks(cls, chunks, measures=MEASURES, detailed=False):
+        """Fold an iterable of frames into one cube, one chunk at a time."""
+        cube = None
+        for chunk in chunks:
+            part = cls.from_frame(chunk, measures, detailed)
+            cube = part if cube is None else cube.merge(part)
+        if cube is None:
+            raise ValueError('No rows to aggregate')
+        return cube
+
+    def merge(self, other):
+        """New cube holding the totals of both cubes."""
+        if self.detailed != other.detailed:
+            raise ValueError('Cannot merge a detailed cube with one that is not')
+        years = np.union1d(self.years, other.years)
+        months = _month_labels(set(self.months) | set(other.months))
+        vehicle_types = sorted(set(self.vehicle_types) | set(other.vehicle_types))
+        shape = (len(years), len(months), len(vehicle_types), 2)
+
+        def positions(cube):
+            return np.ix_(
+                np.searchsorted(years, cube.years),
+                [months.index(m) for m in cube.months],
+                [vehicle_types.index(v) for v in cube.vehicle_types],
+                [0, 1],
+            )
+
+        def combine(a, b):
+            out = np.zeros(shape, dtype=np.result_type(a, b))
+            out[positions(self)] += a
+            out[positions(other)] += b
+            return out
+
+        rows = combine(self.rows, other.rows)
+        sums = {m: combine(self.sums[m], other.sums[m]) for m in self.sums}
+        counts = {m: combine(self.counts[m], other.counts[m]) for m in self.counts}
+        driver_totals = {
+            driver: (
+                pd.concat([totals, other.driver_totals[driver]])
+                .groupby([key for key in totals.columns if key not in ('sum', 'count')], as_index=False, observed=True)[['sum', 'count']]
+                .sum()
+            )
+            for driver, totals in self.driver_totals.items()
+            if driver in other.driver_totals
+        }
+        date_totals = (
+            pd.concat([self.date_totals, other.date_totals])
+            .groupby(level=list(self.date_totals.index.names), observed=True)
+            .sum()
+        )
+        return SalesCube(years, months, vehicle_types, rows, sums, counts, self.dtypes, driver_totals, date_totals, self.detailed)
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the cube, without the attached rows."""
+        arrays = [self.rows, *self.sums.values(), *self.counts.values()]
+        frames = [*self.driver_totals.values(), self.date_totals]
+        return sum(array.nbytes for array in arrays) + sum(int(frame.memory_usage().sum()) for frame in frames)
+
+    def attach_rows(self, frame, row_index, *segments):
+        """Keep the raw rows behind the cube for cross-filtered queries.
+
+        Further ``(frame, row_index)`` segments (appended rows) are selected
+        from separately and concatenated with the base rows.
+        """
+        self._raw = [(frame, row_index), *segments]
+        return self
+
+    def _filtered_rows(self, where):
+        """The raw rows passing ``where``."""
+        if self._raw is None:
+            raise ValueError('A cross filter needs the raw rows (attach_rows) or a detailed cube')
+        parts = [row_index.select_where(frame, where) for frame, row_index in self._raw]
+        return parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+
+    def _filtered_driver_totals(self, driver, where):
+        if self.detailed:
+            return _selected_totals(self._kept_driver_totals(driver), where)
+        return _driver_totals(self._filtered_rows(where), driver)
+
+    def _kept_driver_totals(self, driver):
+        totals = self.driver_totals.get(driver)
+        if totals is None:
+            raise ValueError(f'The cube keeps no totals of {driver!r}')
+        return totals
+
+    def _row_driver_totals(self, driver):
+        """Totals of a driver outside CUBE_DRIVERS, from the raw rows."""
+        if driver not in DRIVERS:
+            raise ValueError(f'Unknown driver {driver!r}')
+        if self._raw is None:
+            raise ValueError(f'{driver} is only totalled from the raw rows (attach_rows)')
+        parts = [_driver_totals(frame, driver) for frame, _ in self._raw]
+        if len(parts) == 1:
+            return parts[0]
+        return (
+            pd.concat(parts)
+            .groupby(['Vehicle_Type', driver, 'Recession'], as_index=False, observed=True)[['sum', 'count']]
+            .sum()
+        )
+
+    def _filtered_date_totals(self, where):
+        if self.detailed:
+            return _selected_totals(self.date_totals, where)
+        return _date_totals(self._filtered_rows(where))
+
+    def by_driver(self, driver, binning=None, recession=None, where=None):
+        """Average Automobile_Sales per vehicle type and value of ``driver``.
+
+        With a ``binning.Binning`` the values are folded into its bins.
+        Unfiltered results are memoized, the cube never changes.
+        """
+        if where:
+            return reduce_totals(self._filtered_driver_totals(driver, where), driver, binning, recession)
+        key = (driver, binning.key if binning is not None else None, recession)
+        series = self._by_driver.get(key)
+        if series is None:
+            totals = self.driver_totals.get(driver)
+            if totals is None:
+                totals = self._row_driver_totals(driver)
+            series = self._by_driver[key] = reduce_totals(totals, driver, binning, recession)
+        return series
+
+    def by_year(self, measure, by, years, stat='mean'):
+        """Aggregate ``measure`` grouped by year and one other dimension.
+
+        All of ``years`` are reduced together in one pass over their cube
+        slices, instead of one ``series`` call per year.  Returns a long
+        frame with ``Year``, ``by`` and ``measure`` columns in the order of
+        ``years``; years and groups without rows are left out.
+        """
+        positions = [self._year_index[year] for year in years if year in self._year_index]
+        axis = DIMENSIONS.index(by)
+        other = tuple(a for a in range(1, 4) if a != axis)
+        rows = self.rows[positions].sum(axis=other)
+        sums = self.sums[measure][positions].sum(axis=other)
+        counts = self.counts[measure][positions].sum(axis=other)
+
+        observed = rows > 0
+        if stat == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values = sums[observed] / counts[observed]
+        elif stat == 'sum':
+            values = sums[observed]
+            if pd.api.types.is_integer_dtype(self.dtypes[measure]):
+                values = values.astype(np.int64)
+        else:
+            raise ValueError(f'Unsupported statistic {stat!r}')
+        year_labels = np.broadcast_to(self.years[positions][:, None], observed.shape)
+        group_labels = np.broadcast_to(self.labels[by][None, :], observed.shape)
+        return pd.DataFrame({'Year': year_labels[observed], by: group_labels[observed], measure: values})
+
+    def timeseries(self, granularity, recession=None, where=None):
+        """Average Automobile_Sales per month or day, sorted by date.
+
+        Returns a frame with ``Date`` and ``Automobile_Sales`` columns; dates
+        without sales are left out.  Unfiltered results are memoized, the
+        cube never changes.
+        """
+        if where:
+            return date_series(self._filtered_date_totals(where), granularity, recession)
+        key = (granularity, recession)
+        series = self._timeseries.get(key)
+        if series is None:
+            series = self._timeseries[key] = date_series(self.date_totals, granularity, recession)
+        return series
+
+    def has_year(self, year):
+        return year in self._year_index
+
+    @property
+    def row_count(self):
+        return int(self.rows.sum())
+
+    def series(self, measure, by, stat='mean', year=None, recession=None, where=None):
+        """Aggregate ``measure`` grouped by one dimension.
+
+        ``year`` and ``recession`` select a slice of the cube first, standing
+        in for ``data[data['Year'] == year]`` and ``data[data['Recession'] == 1]``.
+        A cross filter ``where`` then masks the labels it leaves out along
+        each axis.  Groups without any rows are left out, matching
+        ``groupby()``.
+        """
+        rows = self.rows
+        sums = self.sums[measure]
+        counts = self.counts[measure]
+        index = [slice(None)] * 4
+        if year is not None:
+            if year not in self._year_index:
+                return pd.DataFrame({by: self.labels[by][:0], measure: np.empty(0)})
+            position = self._year_index[year]
+            index[0] = slice(position, position + 1)
+        if recession is not None:
+            position = 1 if recession == 1 else 0
+            index[3] = slice(position, position + 1)
+        rows = rows[tuple(index)]
+        sums = sums[tuple(index)]
+        counts = counts[tuple(index)]
+        labels = {dimension: self.labels[dimension][index[a]] for a, dimension in enumerate(DIMENSIONS)}
+        if where:
+            for a, dimension in enumerate(DIMENSIONS):
+                mask = where.mask(dimension, labels[dimension])
+                if mask is not None:
+                    rows = rows.compress(mask, axis=a)
+                    sums = sums.compress(mask, axis=a)
+                    counts = counts.compress(mask, axis=a)
+                    labels[dimension] = labels[dimension][mask]
+
+        axis = DIMENSIONS.index(by)
+        other = tuple(a for a in range(4) if a != axis)
+        rows = rows.sum(axis=other)
+        sums = sums.sum(axis=other)
+        counts = counts.sum(axis=other)
+        labels = labels[by]
+
+        observed = rows > 0
+        if stat == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values = sums[observed] / counts[observed]
+        elif stat == 'sum':
+            values = sums[observed]
+            if pd.api.types.is_integer_dtype(self.dtypes[measure]):
+                values = values.astype(np.int64)
+        else:
+            raise ValueError(f'Unsupported statistic {stat!r}')
+        return pd.DataFrame({by: labels[observed], measure: values})
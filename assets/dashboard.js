@@ -0,0 +1,82 @@
+// Clientside callbacks.  lodRequest serves every render mode; the rest are
+// for DASHBOARD_RENDER_MODE=clientside.
+//
+// The server renders the Yearly Statistics view once; afterwards year changes
+// are applied in the browser from the per-year aggregates held in the
+// 'yearly-aggregates' store.  Only the year marker on chart 1 and the traces
+// of charts 3 and 4 change, charts 1 and 2 are the same for every year.
+// The aggregates are unfiltered, so while a cross filter is set the server
+// renders every year change.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    dashboard: {
+        // Pass a zoom or pan of a monthly or daily chart on to the server
+        // together with the chart's width in pixels as drawn, so the points
+        // it sends back fit the chart.  The width is null (the server falls
+        // back to LOD_WIDTH) if the chart cannot be found.
+        lodRequest: function(relayoutData, graphId) {
+            // The DOM id of a pattern-matching id is its JSON, keys sorted
+            var domId = typeof graphId === 'string' ? graphId : '{' + Object.keys(graphId).sort().map(function(key) {
+                return JSON.stringify(key) + ':' + JSON.stringify(graphId[key]);
+            }).join(',') + '}';
+            var container = document.getElementById(domId);
+            var gd = container && (container.classList.contains('js-plotly-plot') ?
+                container : container.querySelector('.js-plotly-plot'));
+            var width = gd && gd._fullLayout ? gd._fullLayout.width : null;
+            return {relayout: relayoutData, width: width};
+        },
+
+        // Forward the selected year to the server only when it has to render
+        // something: any change of the other server inputs (report,
+        // granularity, compared years, cross filter, dataset), or a year picked
+        // before any yearly chart exists.  Those renders read the year from
+        // here, so it is sent on each of them, not only on year changes.  Year
+        // changes with the charts on screen stay in the browser.  The monthly
+        // and daily charts have pattern-matching IDs, so with one of those on
+        // screen the server renders the year as well.
+        requestYear: function(year, statistics, granularity, compareYears, crossFilter, dataset) {
+            var triggered = dash_clientside.callback_context.triggered || [];
+            var yearOnly = triggered.length > 0 && triggered.every(function(t) {
+                return t.prop_id === 'select-year.value';
+            });
+            // The DOM id of a pattern-matching id is its JSON, keys sorted
+            var chart1 = JSON.stringify({chart: 'yearly-chart1', type: 'filter-chart', year: ''});
+            if (yearOnly && !crossFilter && statistics === 'Yearly Statistics' &&
+                    document.getElementById(chart1)) {
+                return dash_clientside.no_update;
+            }
+            return year;
+        },
+
+        patchYearlyCharts: function(year, aggregates, chart1, chart3, chart4, crossFilter) {
+            var entry = aggregates && aggregates.years[String(year)];
+            if (crossFilter || !entry || !chart1 || !chart3 || !chart4) {
+                return [dash_clientside.no_update, dash_clientside.no_update, dash_clientside.no_update];
+            }
+
+            // Move the dotted marker
+            var layout1 = Object.assign({}, chart1.layout);
+            layout1.shapes = layout1.shapes.map(function(shape, i) {
+                return i === 0 ? Object.assign({}, shape, {x0: year, x1: year}) : shape;
+            });
+
+            // Swap the per-year traces and titles
+            var trace3 = Object.assign({}, chart3.data[0], {x: entry.sales.x, y: entry.sales.y});
+            var layout3 = Object.assign({}, chart3.layout, {
+                title: Object.assign({}, chart3.layout.title, {text: 'Average Sales by Vehicle Type in ' + year})
+            });
+            var trace4 = Object.assign({}, chart4.data[0], {
+                labels: entry.expenditure.labels,
+                values: entry.expenditure.values
+            });
+            var layout4 = Object.assign({}, chart4.layout, {
+                title: Object.assign({}, chart4.layout.title, {text: 'Ad Expenditure by Vehicle Type in ' + year})
+            });
+
+            return [
+                Object.assign({}, chart1, {layout: layout1}),
+                Object.assign({}, chart3, {data: [trace3].concat(chart3.data.slice(1)), layout: layout3}),
+                Object.assign({}, chart4, {data: [trace4].concat(chart4.data.slice(1)), layout: layout4})
+            ];
+        }
+    }
+});
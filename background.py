@@ -0,0 +1,111 @@
+"""Background execution of the plotting callback on a bounded process pool.
+
+With ``BACKGROUND_CALLBACKS=1`` the plotting callback runs as a Dash
+background callback: the request thread only hands the job over and the
+browser polls for the result, so slow renders never tie up a gunicorn
+thread.  ``PooledDiskcacheManager`` differs from Dash's ``DiskcacheManager``
+in two ways:
+
+* jobs run on a fixed pool of ``BACKGROUND_WORKERS`` processes instead of
+  one new process each, which bounds the CPU the dashboard can use;
+* a job is started once per cache key (the callback inputs plus the data
+  version).  Identical requests arriving while it runs, from any worker on
+  the host, poll the same job instead of starting their own.
+
+Results and job markers live in a diskcache directory
+(``BACKGROUND_CACHE_DIR``), so no broker is needed.  Results are kept for
+``BACKGROUND_EXPIRE`` seconds.  Needs ``pip install "dash[diskcache]"``.
+"""
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from dash import DiskcacheManager
+
+DEFAULT_WORKERS = 2
+DEFAULT_EXPIRE = 600
+
+# The manager of this process; pool workers are forked from it and find
+# the job functions through it
+_manager = None
+
+
+def _running_key(key):
+    return f'{key}-running'
+
+
+def _run_job(background_key, key, progress_key, args, context):
+    """Entry point of a job in a pool worker."""
+    try:
+        _manager.func_registry[background_key](key, progress_key, args, context)
+    finally:
+        _manager.handle.delete(_running_key(key))
+
+
+class PooledDiskcacheManager(DiskcacheManager):
+
+    def __init__(self, cache, version, workers=DEFAULT_WORKERS, expire=DEFAULT_EXPIRE):
+        # Results must outlive the first read, since requests that joined a
+        # job read them too; keying them on the data version keeps them fresh
+        super().__init__(cache, cache_by=[version], expire=expire)
+        self.version = version
+        self.workers = workers
+        self._pool = None
+        self._pool_version = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, version):
+        if os.environ.get('BACKGROUND_CALLBACKS') != '1':
+            return None
+        import diskcache
+        directory = os.environ.get('BACKGROUND_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'automobile-dashboard-jobs')
+        return cls(
+            diskcache.Cache(directory),
+            version,
+            workers=int(os.environ.get('BACKGROUND_WORKERS', DEFAULT_WORKERS)),
+            expire=int(os.environ.get('BACKGROUND_EXPIRE', DEFAULT_EXPIRE)),
+        )
+
+    def _executor(self):
+        global _manager
+        version = self.version()
+        with self._lock:
+            # Workers hold the data they were forked with, so a new data
+            # version gets a new pool; running jobs finish on the old one
+            if self._pool is None or self._pool_version != version:
+                if self._pool is not None:
+                    self._pool.shutdown(wait=False)
+                _manager = self
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('fork'))
+                self._pool_version = version
+            return self._pool
+
+    def call_job_fn(self, key, job_fn, args, context):
+        # A finished job's result is still cached; otherwise add() is atomic
+        # across processes, so only the first request for a key submits the
+        # job and the others poll the one in flight
+        if self.result_ready(key):
+            return key
+        if self.handle.add(_running_key(key), os.getpid(), expire=self.expire):
+            background_key = next(k for k, fn in self.func_registry.items() if fn is job_fn)
+            try:
+                self._executor().submit(_run_job, background_key, key, self._make_progress_key(key), args, dict(context))
+            except BaseException:
+                self.handle.delete(_running_key(key))
+                raise
+        # The job handle is the cache key itself, valid in every worker
+        return key
+
+    def job_running(self, job):
+        return job is not None and self.handle.get(_running_key(job)) is not None
+
+    def terminate_job(self, job):
+        # Pool workers are shared and a job may have other requests waiting
+        # on it, so jobs are never killed; they finish and expire
+        pass
+
+    def terminate_unhealthy_job(self, job):
+        return False
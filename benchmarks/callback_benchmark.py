@@ -0,0 +1,267 @@
+"""Latency, payload size and memory of the dashboard callbacks.
+
+Every (statistics, year) combination the dropdowns can produce is run
+against each dataset, once as a direct call of ``update_output_container``
+and ``update_input_container`` and once as a POST through the Flask test
+client of ``app.server`` (which adds Dash's JSON encoding).  Datasets are
+the configured source (``--csv`` or SALES_DATA_PATH / SALES_DATA_URL) and
+synthetic files of ``--scales`` times its 528 rows (``synthetic.py``).
+
+Each dataset is measured in a fresh interpreter, so import time and peak
+RSS are per dataset; the columnar cache is built beforehand, so the import
+is a warm start.  ``--backend`` runs them on one of the SQL backends of
+``query_engine`` instead of the in-memory cube.  The figure cache is off unless ``--figure-cache`` is
+given, so repeats measure rendering rather than cache hits.
+
+    python benchmarks/callback_benchmark.py --scales 10 100 1000 10000 --output results.json
+    python benchmarks/callback_benchmark.py --scales 10 100 --baseline results.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import synthetic
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATISTICS = ['Yearly Statistics', 'Recession Period Statistics', 'Select Statistics']
+
+WARM_START = 'import os, live_reload, data_source; live_reload.Snapshot.load(data_source.default_source(), backend=os.environ["SALES_BACKEND"])'
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(samples):
+    return {
+        'n': len(samples),
+        'mean_ms': sum(samples) / len(samples) * 1000,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'max_ms': max(samples) * 1000,
+    }
+
+
+def timed(call, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = call()
+        samples.append(time.perf_counter() - start)
+    return samples, result
+
+
+def update_body(output, inputs):
+    component, prop = output.split('.')
+    return {
+        'output': output,
+        'outputs': {'id': component, 'property': prop},
+        'inputs': [{'id': i, 'property': p, 'value': v} for i, p, v in inputs],
+        'changedPropIds': [f'{inputs[0][0]}.{inputs[0][1]}'],
+        'state': [],
+    }
+
+
+def run_worker(repeat):
+    """Measure the callbacks of the dataset configured in the environment."""
+    sys.path.insert(0, REPO_ROOT)
+    start = time.perf_counter()
+    import historical_automobile_sales_dashboard as dashboard
+    import_s = time.perf_counter() - start
+
+    client = dashboard.server.test_client()
+    cases = []
+
+    def measure(callback, call, body, **labels):
+        direct, _ = timed(call, repeat)
+        http, response = timed(lambda: client.post('/_dash-update-component', json=body), repeat)
+        if response.status_code not in (200, 204):
+            raise RuntimeError(f'{callback} {labels}: HTTP {response.status_code}')
+        cases.append(dict(
+            labels,
+            callback=callback,
+            direct=direct,
+            http=http,
+            payload_bytes=len(response.get_data()),
+        ))
+
+    for statistics in STATISTICS:
+        measure(
+            'update_input_container',
+            lambda: dashboard.update_input_container(statistics),
+            update_body('select-year.disabled', [('dropdown-statistics', 'value', statistics)]),
+            statistics=statistics,
+        )
+        for year in ['Select Year'] + dashboard.year_list:
+            measure(
+                'update_output_container',
+                lambda: dashboard.update_output_container(year, statistics),
+                update_body('output-container.children', [
+                    ('select-year', 'value', year),
+                    ('dropdown-statistics', 'value', statistics),
+                    ('select-granularity', 'value', 'Year'),
+                    ('compare-years', 'value', []),
+                    ('cross-filter', 'data', None),
+                    ('dropdown-dataset', 'value', 'default'),
+                ]),
+                statistics=statistics,
+                year=year,
+            )
+
+    print(json.dumps({
+        'rows': dashboard.datasets.current().cube.row_count,
+        'import_s': import_s,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'cases': cases,
+    }))
+
+
+def group(cases):
+    """Pool the samples of every case per (callback, statistics)."""
+    groups = {}
+    for case in cases:
+        key = f"{case['callback']} / {case['statistics']}"
+        entry = groups.setdefault(key, {'direct': [], 'http': [], 'payload_bytes': []})
+        entry['direct'].extend(case['direct'])
+        entry['http'].extend(case['http'])
+        entry['payload_bytes'].append(case['payload_bytes'])
+    return {
+        key: {
+            'direct': summarize(entry['direct']),
+            'http': summarize(entry['http']),
+            'payload_bytes_max': max(entry['payload_bytes']),
+        }
+        for key, entry in groups.items()
+    }
+
+
+def measure_dataset(name, csv_path, env, repeat):
+    env = dict(env)
+    if csv_path:
+        env['SALES_DATA_PATH'] = csv_path
+    # Build the columnar cache (or the database of a SQL backend) so the
+    # timed import is a warm start
+    subprocess.run([sys.executable, '-c', WARM_START], cwd=REPO_ROOT, env=env, check=True)
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', '--repeat', str(repeat)],
+        cwd=REPO_ROOT, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    groups = group(result['cases'])
+    for case in result['cases']:
+        case['direct'] = summarize(case['direct'])
+        case['http'] = summarize(case['http'])
+    return dict(result, dataset=name, groups=groups)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    versions = {}
+    for package in ('dash', 'pandas', 'plotly', 'numpy'):
+        try:
+            versions[package] = __import__(package).__version__
+        except ImportError:
+            versions[package] = None
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'packages': versions,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+
+
+def print_table(results, baseline=None):
+    previous = {r['dataset']: r for r in baseline['datasets']} if baseline else {}
+    for result in results:
+        print(f"{result['dataset']}: {result['rows']} rows, import {result['import_s'] * 1000:.0f} ms, "
+              f"peak RSS {result['peak_rss_kb'] / 1024:.0f} MB")
+        print(f"  {'callback / statistics':<56} {'direct p50':>10} {'p95':>8} {'http p50':>9} {'p95':>8} {'max bytes':>10}")
+        for key, entry in result['groups'].items():
+            line = (f"  {key:<56} {entry['direct']['p50_ms']:>10.3f} {entry['direct']['p95_ms']:>8.3f} "
+                    f"{entry['http']['p50_ms']:>9.2f} {entry['http']['p95_ms']:>8.2f} {entry['payload_bytes_max']:>10}")
+            old = previous.get(result['dataset'], {}).get('groups', {}).get(key)
+            if old and old['http']['p50_ms']:
+                line += f"  x{entry['http']['p50_ms'] / old['http']['p50_ms']:.2f} vs baseline"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', help='local CSV to load (defaults to SALES_DATA_PATH / SALES_DATA_URL)')
+    parser.add_argument('--scales', type=int, nargs='*', default=[10, 100, 1000], help='synthetic dataset sizes, as multiples of 528 rows')
+    parser.add_argument('--no-source', action='store_true', help='only run the synthetic datasets')
+    parser.add_argument('--repeat', type=int, default=5, help='calls per (statistics, year) combination')
+    parser.add_argument('--figure-cache', action='store_true', help='leave the figure cache on')
+    parser.add_argument('--backend', choices=('pandas', 'sqlite', 'duckdb'), default='pandas', help='SALES_BACKEND of the runs')
+    parser.add_argument('--data-dir', help='keep generated datasets here and reuse them')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='results JSON of an earlier run to compare against')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.repeat)
+        return
+
+    scratch = tempfile.mkdtemp(prefix='sales-callback-bench-')
+    data_dir = args.data_dir or os.path.join(scratch, 'data')
+    os.makedirs(data_dir, exist_ok=True)
+    env = dict(os.environ, SALES_CACHE_DIR=os.path.join(scratch, 'cache'), DASHBOARD_RENDER_MODE='full', SALES_BACKEND=args.backend)
+    for name in ('SALES_SHARED_DATA', 'SALES_RELOAD_INTERVAL', 'RESPONSE_CACHE', 'FIGURE_CACHE_WARMUP'):
+        env.pop(name, None)
+    if not args.figure_cache:
+        env['FIGURE_CACHE_BACKEND'] = 'off'
+
+    datasets = []
+    if not args.no_source:
+        datasets.append(('source', os.path.abspath(args.csv) if args.csv else None))
+    for scale in args.scales:
+        path = os.path.join(data_dir, f'synthetic_x{scale}.csv')
+        if not os.path.exists(path):
+            synthetic.generate(path, scale)
+        datasets.append((f'synthetic x{scale}', path))
+
+    try:
+        results = [measure_dataset(name, path, env, args.repeat) for name, path in datasets]
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    report = {'environment': environment(), 'repeat': args.repeat, 'figure_cache': args.figure_cache,
+              'backend': args.backend, 'datasets': results}
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(report, fh, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+    print_table(results, baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Figure construction: Plotly Express vs. the dict builder.
+
+Builds every chart of both reports with each path (``FIGURE_BUILDER=px``
+and the default ``figure_builder.FigureBuilder``) and reports build time,
+JSON encoding time and encoded bytes per chart.  It also checks that both
+paths produce the same figure apart from the trimmed template.
+
+    python benchmarks/figure_benchmark.py --csv path/to/sales.csv --repeat 50
+"""
+import argparse
+import base64
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def decoded(value):
+    """Figure JSON with typed arrays expanded, for comparing the two paths."""
+    import numpy as np
+    if isinstance(value, dict):
+        if set(value) == {'dtype', 'bdata'}:
+            return np.frombuffer(base64.b64decode(value['bdata']), dtype=np.dtype(value['dtype'])).tolist()
+        return {k: decoded(v) for k, v in value.items() if k != 'template'}
+    if isinstance(value, list):
+        return [decoded(v) for v in value]
+    return value
+
+
+def timed(call, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = call()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', help='local CSV to load (defaults to SALES_DATA_PATH / SALES_DATA_URL)')
+    parser.add_argument('--year', type=int, default=2001, help='year for the Yearly Statistics charts')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    if args.csv:
+        os.environ['SALES_DATA_PATH'] = os.path.abspath(args.csv)
+    os.environ.setdefault('SALES_CACHE_DIR', tempfile.mkdtemp(prefix='sales-figure-bench-'))
+    os.environ['FIGURE_CACHE_BACKEND'] = 'off'
+    sys.path.insert(0, REPO_ROOT)
+    import historical_automobile_sales_dashboard as dashboard
+    from dash._utils import to_json
+
+    cube = dashboard.datasets.current().cube
+    charts = {f'recession_chart{i}': (getattr(dashboard, f'recession_chart{i}'), (cube,)) for i in range(1, 5)}
+    charts.update({
+        'yearly_chart1': (dashboard.yearly_chart1, (cube, args.year)),
+        'yearly_chart2': (dashboard.yearly_chart2, (cube,)),
+        'yearly_chart3': (dashboard.yearly_chart3, (cube, args.year)),
+        'yearly_chart4': (dashboard.yearly_chart4, (cube, args.year)),
+    })
+    builders = {'px': None, 'dict': dashboard.figure_builder or dashboard.FigureBuilder(dashboard.graph_layout)}
+
+    results = []
+    for name, (chart, chart_args) in charts.items():
+        entry = {'chart': name}
+        encoded = {}
+        for path, builder in builders.items():
+            dashboard.figure_builder = builder
+            build_s, figure = timed(lambda: chart(*chart_args), args.repeat)
+            encode_s, payload = timed(lambda: to_json(figure), args.repeat)
+            encoded[path] = payload
+            entry[path] = {'build_ms': build_s * 1000, 'encode_ms': encode_s * 1000, 'bytes': len(payload)}
+        entry['same_figure'] = decoded(json.loads(encoded['px'])) == decoded(json.loads(encoded['dict']))
+        results.append(entry)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'chart':<16} {'px build':>9} {'encode':>7} {'bytes':>7} {'dict build':>11} {'encode':>7} {'bytes':>7}  same")
+    for r in results:
+        px, fast = r['px'], r['dict']
+        print(f"{r['chart']:<16} {px['build_ms']:>9.2f} {px['encode_ms']:>7.2f} {px['bytes']:>7} "
+              f"{fast['build_ms']:>11.3f} {fast['encode_ms']:>7.2f} {fast['bytes']:>7}  {r['same_figure']}")
+    for path in builders:
+        total = sum(r[path]['build_ms'] + r[path]['encode_ms'] for r in results)
+        print(f"{path}: {total:.1f} ms to build and encode all {len(results)} charts, "
+              f"{sum(r[path]['bytes'] for r in results)} bytes")
+
+
+if __name__ == '__main__':
+    main()
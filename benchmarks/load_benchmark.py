@@ -0,0 +1,299 @@
+"""Load test of the gunicorn deployment: throughput, latency and saturation.
+
+Starts gunicorn with ``gunicorn.conf.py`` on a local port for each
+``--workers`` x ``--threads`` configuration and drives it with simulated
+users, one thread each.  A user repeats sessions like the browser's:
+
+1. load the page (``/``, ``/_dash-layout``, ``/_dash-dependencies``);
+2. pick a report in ``dropdown-statistics``, which fires the control
+   callbacks and renders the report;
+3. for the Yearly Statistics report (three sessions in four), sweep
+   ``select-year`` over ``--sweep`` consecutive years, one render each.
+
+Users wait ``--think`` seconds between requests (0: back to back, which
+finds the ceiling fastest).  Each ``--users`` step runs for ``--duration``
+seconds after ``--warmup`` seconds that are not counted, and reports
+requests per second, latency percentiles, the error rate and the CPU and
+RSS of every worker, read from ``/proc``.  The steps form a saturation
+curve; its knee (the last step that still added ``KNEE_GAIN`` of
+throughput) is the concurrency a fleet of that shape can take before
+requests only queue.  Linux only; nothing leaves the machine.
+
+    python benchmarks/load_benchmark.py --csv path/to/sales.csv --workers 1 2 4 --threads 1 4 --users 1 2 4 8 16 32
+    python benchmarks/load_benchmark.py --env RESPONSE_CACHE=1 --output load.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from memory_benchmark import children, free_port, wait_until_serving
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from static_bundle import request_body  # noqa: E402
+
+REPORTS = ['Yearly Statistics', 'Recession Period Statistics']
+# Share of sessions that open the Yearly Statistics report and sweep years
+YEARLY_SHARE = 0.75
+YEARS = list(range(1980, 2024))
+# A step counts as adding throughput when it beats the previous one by this
+KNEE_GAIN = 0.05
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+# Outputs the browser updates when the report changes
+CONTROL_OUTPUTS = ['select-year.disabled', 'compare-years.disabled', 'filter-period.options']
+
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def control_body(output, statistics):
+    component, prop = output.split('.')
+    return {
+        'output': output,
+        'outputs': {'id': component, 'property': prop},
+        'inputs': [{'id': 'dropdown-statistics', 'property': 'value', 'value': statistics}],
+        'changedPropIds': ['dropdown-statistics.value'],
+        'state': [],
+    }
+
+
+def session(rng, sweep):
+    """The (kind, method, path, body) requests of one simulated session."""
+    requests = [
+        ('page', 'GET', '/', None),
+        ('page', 'GET', '/_dash-layout', None),
+        ('page', 'GET', '/_dash-dependencies', None),
+    ]
+    statistics = REPORTS[0] if rng.random() < YEARLY_SHARE else REPORTS[1]
+    for output in CONTROL_OUTPUTS:
+        requests.append(('control', 'POST', '/_dash-update-component', control_body(output, statistics)))
+    requests.append(('render', 'POST', '/_dash-update-component', request_body('Select Year', statistics, 'Year')))
+    if statistics == 'Yearly Statistics':
+        start = rng.randrange(len(YEARS) - sweep + 1)
+        for year in YEARS[start:start + sweep]:
+            requests.append(('render', 'POST', '/_dash-update-component', request_body(year, statistics, 'Year')))
+    return requests
+
+
+class User(threading.Thread):
+    """One simulated browser on a keep-alive connection."""
+
+    def __init__(self, port, seed, sweep, think, stop, record):
+        super().__init__(daemon=True)
+        self.port = port
+        self.rng = random.Random(seed)
+        self.sweep = sweep
+        self.think = think
+        self.stop = stop
+        self.record = record
+
+    def run(self):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        while not self.stop.is_set():
+            for kind, method, path, body in session(self.rng, self.sweep):
+                if self.stop.is_set():
+                    break
+                payload = json.dumps(body).encode() if body is not None else None
+                headers = {'Content-Type': 'application/json'} if body is not None else {}
+                start = time.perf_counter()
+                try:
+                    connection.request(method, path, body=payload, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    ok = response.status < 400
+                except (OSError, http.client.HTTPException):
+                    ok = False
+                    connection.close()
+                    connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+                self.record(kind, time.perf_counter() - start, ok)
+                if self.think:
+                    self.stop.wait(self.rng.expovariate(1 / self.think))
+        connection.close()
+
+
+def cpu_seconds(pid):
+    with open(f'/proc/{pid}/stat') as fh:
+        # The command name may hold spaces; fields resume after its ')'
+        fields = fh.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+def rss_kb(pid):
+    with open(f'/proc/{pid}/status') as fh:
+        for line in fh:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def run_step(port, master, users, args):
+    samples = []
+    lock = threading.Lock()
+    counting = threading.Event()
+
+    def record(kind, seconds, ok):
+        if counting.is_set():
+            with lock:
+                samples.append((kind, seconds, ok))
+
+    stop = threading.Event()
+    pool = [User(port, seed, args.sweep, args.think, stop, record) for seed in range(users)]
+    for user in pool:
+        user.start()
+    time.sleep(args.warmup)
+
+    workers = children(master.pid)
+    cpu_before = {pid: cpu_seconds(pid) for pid in workers}
+    counting.set()
+    start = time.perf_counter()
+    time.sleep(args.duration)
+    counting.clear()
+    elapsed = time.perf_counter() - start
+    cpu = {pid: (cpu_seconds(pid) - cpu_before[pid]) / elapsed * 100 for pid in workers if pid in cpu_before}
+    rss = {pid: rss_kb(pid) for pid in workers}
+    stop.set()
+    for user in pool:
+        user.join(timeout=60)
+
+    latencies = [seconds for _, seconds, ok in samples if ok]
+    renders = [seconds for kind, seconds, ok in samples if ok and kind == 'render']
+    errors = sum(1 for _, _, ok in samples if not ok)
+    return {
+        'users': users,
+        'requests': len(samples),
+        'throughput_rps': len(samples) / elapsed,
+        'render_rps': len(renders) / elapsed,
+        'error_rate': errors / len(samples) if samples else 0.0,
+        'latency_ms': {f'p{q}': (percentile(latencies, q) or 0) * 1000 for q in (50, 90, 95, 99)},
+        'render_latency_ms': {f'p{q}': (percentile(renders, q) or 0) * 1000 for q in (50, 95, 99)},
+        'cpu_percent_per_worker': [round(cpu[pid], 1) for pid in sorted(cpu)],
+        'rss_mb_per_worker': [round(rss[pid] / 1024, 1) for pid in sorted(rss)],
+    }
+
+
+def knee(steps):
+    """The last step whose throughput beat the one before by KNEE_GAIN."""
+    best = steps[0]
+    for previous, step in zip(steps, steps[1:]):
+        if step['throughput_rps'] < previous['throughput_rps'] * (1 + KNEE_GAIN):
+            break
+        best = step
+    return {'users': best['users'], 'throughput_rps': best['throughput_rps'], 'p95_ms': best['latency_ms']['p95']}
+
+
+def measure(workers, threads, env, args):
+    port = free_port()
+    command = [
+        sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+        '--workers', str(workers), '--threads', str(threads), '--bind', f'127.0.0.1:{port}',
+        'historical_automobile_sales_dashboard:server',
+    ]
+    master = subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_serving(f'http://127.0.0.1:{port}/', master, workers, args.timeout)
+        steps = []
+        for users in args.users:
+            step = run_step(port, master, users, args)
+            steps.append(step)
+            print_step(workers, threads, step, file=sys.stderr)
+    finally:
+        master.terminate()
+        master.wait(timeout=30)
+    return {'workers': workers, 'threads': threads, 'steps': steps, 'knee': knee(steps)}
+
+
+def print_step(workers, threads, step, file=sys.stdout):
+    cpu = step['cpu_percent_per_worker']
+    rss = step['rss_mb_per_worker']
+    print(f"{workers:>7} {threads:>7} {step['users']:>5} {step['throughput_rps']:>8.1f} {step['render_rps']:>8.1f} "
+          f"{step['latency_ms']['p50']:>7.1f} {step['latency_ms']['p95']:>7.1f} {step['latency_ms']['p99']:>7.1f} "
+          f"{step['error_rate'] * 100:>6.2f} {sum(cpu) / max(len(cpu), 1):>8.0f} {max(rss, default=0):>8.1f}", file=file)
+
+
+HEADER = (f"{'workers':>7} {'threads':>7} {'users':>5} {'req/s':>8} {'render/s':>8} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'err %':>6} {'CPU %/w':>8} {'RSS MB':>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', help='local CSV to load (defaults to SALES_DATA_PATH / SALES_DATA_URL)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='gunicorn worker counts')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1], help='gunicorn threads per worker')
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32], help='concurrent users per step')
+    parser.add_argument('--duration', type=float, default=20.0, help='measured seconds per step')
+    parser.add_argument('--warmup', type=float, default=3.0, help='unmeasured seconds before each step')
+    parser.add_argument('--think', type=float, default=0.0, help='mean seconds a user waits between requests')
+    parser.add_argument('--sweep', type=int, default=10, help='years swept per Yearly Statistics session')
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE', help='extra environment of the server, e.g. RESPONSE_CACHE=1')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='sales-load-bench-')
+    env = dict(
+        os.environ,
+        SALES_CACHE_DIR=os.path.join(scratch, 'cache'),
+        SALES_SHARED_DIR=os.path.join(scratch, 'shared'),
+        # The request bodies are those of the default render mode
+        DASHBOARD_RENDER_MODE='full',
+    )
+    env.pop('SALES_SHARED_DATA', None)
+    # Both change what the browser posts; the sessions replay the plain protocol
+    for name in ('STATIC_BUNDLE', 'BACKGROUND_CALLBACKS'):
+        env.pop(name, None)
+    if args.csv:
+        env['SALES_DATA_PATH'] = os.path.abspath(args.csv)
+    for item in args.env:
+        name, _, value = item.partition('=')
+        env[name] = value
+
+    results = []
+    print(HEADER, file=sys.stderr)
+    try:
+        # Build the columnar cache up front so no worker pays the CSV parse
+        subprocess.run([sys.executable, '-c', 'import data_source; data_source.load_data()'], cwd=REPO_ROOT, env=env, check=True)
+        for workers in args.workers:
+            for threads in args.threads:
+                results.append(measure(workers, threads, env, args))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    report = {
+        'settings': {name: getattr(args, name) for name in ('duration', 'warmup', 'think', 'sweep', 'users')},
+        'server_env': args.env,
+        'configurations': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(report, fh, indent=1)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print('Saturation (knee of each curve):')
+    print(f"{'workers':>7} {'threads':>7} {'users':>5} {'req/s':>8} {'p95 ms':>7}")
+    for result in results:
+        point = result['knee']
+        print(f"{result['workers']:>7} {result['threads']:>7} {point['users']:>5} "
+              f"{point['throughput_rps']:>8.1f} {point['p95_ms']:>7.1f}")
+
+
+if __name__ == '__main__':
+    main()
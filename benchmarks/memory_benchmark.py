@@ -0,0 +1,137 @@
+"""Per-worker memory of the gunicorn deployment, shared vs. private dataset.
+
+Starts gunicorn with ``gunicorn.conf.py`` for each worker count, waits for
+every worker to serve the dashboard, then reads RSS and PSS (proportional
+set size, which splits shared pages between the processes mapping them)
+from ``/proc``.  ``shared`` publishes the dataset once from the master;
+``private`` has every worker load its own copy.  Linux only.
+
+    python benchmarks/memory_benchmark.py --csv path/to/sales.csv --workers 1 4 16
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as fh:
+            return [int(p) for p in fh.read().split()]
+    except FileNotFoundError:
+        return []
+
+
+def memory_kb(pid):
+    usage = {}
+    with open(f'/proc/{pid}/status') as fh:
+        for line in fh:
+            if line.startswith('VmRSS:'):
+                usage['rss_kb'] = int(line.split()[1])
+    with open(f'/proc/{pid}/smaps_rollup') as fh:
+        for line in fh:
+            if line.startswith('Pss:'):
+                usage['pss_kb'] = int(line.split()[1])
+    return usage
+
+
+def wait_until_serving(url, master, workers, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if master.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup')
+        if len(children(master.pid)) == workers:
+            try:
+                with urllib.request.urlopen(url, timeout=2) as response:
+                    if response.status == 200:
+                        return
+            except OSError:
+                pass
+        time.sleep(0.2)
+    raise TimeoutError(f'{workers} workers did not come up within {timeout}s')
+
+
+def measure(mode, workers, env, settle, timeout):
+    port = free_port()
+    env = dict(env, SALES_SHARED_DATA_MODE='on' if mode == 'shared' else 'off')
+    command = [
+        sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+        '--workers', str(workers), '--bind', f'127.0.0.1:{port}',
+        'historical_automobile_sales_dashboard:server',
+    ]
+    master = subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_serving(f'http://127.0.0.1:{port}/', master, workers, timeout)
+        # Let every worker import and build its aggregates
+        time.sleep(settle)
+        usage = [memory_kb(pid) for pid in children(master.pid)]
+    finally:
+        master.terminate()
+        master.wait(timeout=30)
+
+    rss = [u['rss_kb'] for u in usage]
+    pss = [u['pss_kb'] for u in usage]
+    return {
+        'mode': mode,
+        'workers': workers,
+        'rss_per_worker_kb': sum(rss) / len(rss),
+        'pss_per_worker_kb': sum(pss) / len(pss),
+        'pss_total_kb': sum(pss),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', help='local CSV to load (defaults to SALES_DATA_PATH / SALES_DATA_URL)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--modes', nargs='+', default=['private', 'shared'], choices=['private', 'shared'])
+    parser.add_argument('--settle', type=float, default=2.0, help='seconds to wait after startup')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='sales-memory-bench-')
+    env = dict(
+        os.environ,
+        SALES_CACHE_DIR=os.path.join(scratch, 'cache'),
+        SALES_SHARED_DIR=os.path.join(scratch, 'shared'),
+    )
+    env.pop('SALES_SHARED_DATA', None)
+    if args.csv:
+        env['SALES_DATA_PATH'] = os.path.abspath(args.csv)
+
+    results = []
+    try:
+        # Build the columnar cache up front so no run pays the CSV parse
+        subprocess.run([sys.executable, '-c', 'import data_source; data_source.load_data()'], cwd=REPO_ROOT, env=env, check=True)
+        for mode in args.modes:
+            for workers in args.workers:
+                results.append(measure(mode, workers, env, args.settle, args.timeout))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<8} {'workers':>7} {'RSS/worker MB':>14} {'PSS/worker MB':>14} {'PSS total MB':>13}")
+    for r in results:
+        print(f"{r['mode']:<8} {r['workers']:>7} {r['rss_per_worker_kb'] / 1024:>14.1f} "
+              f"{r['pss_per_worker_kb'] / 1024:>14.1f} {r['pss_total_kb'] / 1024:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""Cold vs. warm startup benchmark for the dashboard data source.
+
+Cold runs start from an empty cache directory, so they pay for reading and
+parsing the CSV plus writing the columnar cache.  Warm runs reuse the cache
+built by the previous run and only memory-map it.
+
+Each run is a fresh interpreter so the numbers include imports, exactly
+what a gunicorn worker pays on boot:
+
+    python benchmarks/startup_benchmark.py --csv path/to/historical_automobile_sales.csv
+
+``--first-response`` imports the dashboard and times, from the start of the
+import, when the worker serves its first page, when ``/ready`` turns 200
+and when the first chart request is answered.  ``--startup lazy`` runs it
+with ``DASHBOARD_STARTUP=lazy``:
+
+    python benchmarks/startup_benchmark.py --first-response --startup lazy
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LOAD_ONLY = 'import data_source; data_source.load_data()'
+FULL_IMPORT = 'import historical_automobile_sales_dashboard'
+# Prints the time of each startup milestone, from the start of the import
+FIRST_RESPONSE = """
+import json, time
+start = time.perf_counter()
+import historical_automobile_sales_dashboard as dashboard
+from static_bundle import request_body
+imported = time.perf_counter() - start
+client = dashboard.server.test_client()
+client.get('/')
+page = time.perf_counter() - start
+while client.get('/ready').status_code != 200:
+    time.sleep(0.001)
+ready = time.perf_counter() - start
+response = client.post('/_dash-update-component', json=request_body(2001, 'Yearly Statistics', 'Year'))
+assert response.status_code == 200, response.status_code
+answered = time.perf_counter() - start
+print(json.dumps({'import': imported, 'first_page': page, 'ready': ready, 'first_response': answered}))
+"""
+MILESTONES = ('import', 'first_page', 'ready', 'first_response')
+
+
+def time_run(code, env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], cwd=REPO_ROOT, env=env, check=True)
+    return time.perf_counter() - start
+
+
+def milestone_run(code, env):
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', code], cwd=REPO_ROOT, env=env, check=True,
+                            stdout=subprocess.PIPE, text=True).stdout
+    return dict(json.loads(output.splitlines()[-1]), process=time.perf_counter() - start)
+
+
+def run(code, env, cache_dir, repeat):
+    cold, warm = [], []
+    for _ in range(repeat):
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        cold.append(time_run(code, env))
+        warm.append(time_run(code, env))
+    return {
+        'cold_median_s': statistics.median(cold),
+        'warm_median_s': statistics.median(warm),
+        'cold_s': cold,
+        'warm_s': warm,
+    }
+
+
+def run_milestones(env, cache_dir, repeat):
+    runs = {'cold': [], 'warm': []}
+    for _ in range(repeat):
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        runs['cold'].append(milestone_run(FIRST_RESPONSE, env))
+        runs['warm'].append(milestone_run(FIRST_RESPONSE, env))
+    return {
+        start: {
+            f'{name}_median_s': statistics.median(run[name] for run in samples)
+            for name in MILESTONES + ('process',)
+        }
+        for start, samples in runs.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', help='local CSV to load (defaults to SALES_DATA_PATH / SALES_DATA_URL)')
+    parser.add_argument('--format', default='npy', help='cache format: npy or feather')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--full-import', action='store_true', help='time importing the whole dashboard module')
+    parser.add_argument('--first-response', action='store_true',
+                        help='time the dashboard up to its first page, readiness and first chart response')
+    parser.add_argument('--startup', choices=('eager', 'lazy'), default='eager', help='DASHBOARD_STARTUP of the runs')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix='sales-cache-bench-')
+    env = dict(os.environ, SALES_CACHE_DIR=cache_dir, SALES_CACHE_FORMAT=args.format, DASHBOARD_STARTUP=args.startup)
+    if args.csv:
+        env['SALES_DATA_PATH'] = os.path.abspath(args.csv)
+
+    if args.first_response:
+        # The request posted is that of the full render mode
+        env['DASHBOARD_RENDER_MODE'] = 'full'
+        try:
+            results = run_milestones(env, cache_dir, args.repeat)
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        results['format'] = args.format
+        results['startup'] = args.startup
+        if args.json:
+            print(json.dumps(results, indent=2))
+            return
+        print(f"format={args.format} startup={args.startup} repeat={args.repeat}  (ms from the start of the import, median)")
+        print(f"  {'':6} " + ' '.join(f'{name:>15}' for name in MILESTONES + ('process',)))
+        for start in ('cold', 'warm'):
+            print(f"  {start:6} " + ' '.join(
+                f"{results[start][f'{name}_median_s'] * 1000:15.1f}" for name in MILESTONES + ('process',)
+            ))
+        return
+
+    try:
+        results = run(FULL_IMPORT if args.full_import else LOAD_ONLY, env, cache_dir, args.repeat)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    results['format'] = args.format
+    results['full_import'] = args.full_import
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"format={args.format} full_import={args.full_import} repeat={args.repeat}")
+        print(f"  cold start: {results['cold_median_s'] * 1000:8.1f} ms (median)")
+        print(f"  warm start: {results['warm_median_s'] * 1000:8.1f} ms (median)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Synthetic sales data in the schema of the historical automobile CSV.
+
+Scale 1 has the shape of the original file: one row per month from 1980 to
+2023 (528 rows).  Scale N writes N rows per month, one year at a time, so
+even the 10,000x file (5.3M rows) is generated in bounded memory.  Output
+is deterministic for a given seed.  Rows are dated the first of their
+month, as in the original; ``--daily`` spreads them over the days of the
+month instead, for the daily charts.
+
+    python benchmarks/synthetic.py sales_x100.csv --scale 100
+    python benchmarks/synthetic.py sales_daily.csv --scale 100 --daily
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+YEARS = range(1980, 2024)
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+VEHICLE_TYPES = ['Supperminicar', 'Smallfamiliycar', 'Mediumfamilycar', 'Executivecar', 'Sports']
+CITIES = ['Georgia', 'New York', 'California', 'Illinois']
+RECESSION_YEARS = {1980, 1981, 1982, 1991, 2000, 2001, 2007, 2008, 2009, 2020}
+
+COLUMNS = [
+    'Date', 'Year', 'Month', 'Recession', 'Consumer_Confidence', 'Seasonality_Weight', 'Price',
+    'Advertising_Expenditure', 'Competition', 'GDP', 'Growth_Rate', 'unemployment_rate',
+    'Automobile_Sales', 'Vehicle_Type', 'City',
+]
+
+
+def year_frame(year, scale, rng, daily=False):
+    n = 12 * scale
+    month = np.repeat(np.arange(12), scale)
+    recession = int(year in RECESSION_YEARS)
+    vehicle = rng.integers(0, len(VEHICLE_TYPES), n)
+    # Recessions depress sales and lift unemployment, as in the real data
+    sales = rng.normal(3000 - 1200 * recession, 600, n) * (0.6 + 0.15 * vehicle)
+    frame = pd.DataFrame({
+        'Date': [f'{m + 1}/1/{year}' for m in month],
+        'Year': year,
+        'Month': np.array(MONTHS)[month],
+        'Recession': recession,
+        'Consumer_Confidence': rng.normal(100, 10, n).round(2),
+        'Seasonality_Weight': rng.uniform(0, 1.5, n).round(2),
+        'Price': rng.normal(25000, 3000, n).round(2),
+        'Advertising_Expenditure': rng.integers(1000, 5000, n),
+        'Competition': rng.integers(1, 10, n),
+        'GDP': rng.normal(40, 10, n).round(3),
+        'Growth_Rate': rng.normal(0.3, 0.1, n).round(3),
+        'unemployment_rate': (rng.uniform(2, 5, n) + 2.5 * recession).round(1),
+        'Automobile_Sales': np.maximum(sales, 50).round(1),
+        'Vehicle_Type': np.array(VEHICLE_TYPES)[vehicle],
+        'City': np.array(CITIES)[rng.integers(0, len(CITIES), n)],
+    }, columns=COLUMNS)
+    if daily:
+        # Drawn last, so the other columns match the monthly file
+        days_in_month = pd.DatetimeIndex([f'{year}-{m + 1:02d}-01' for m in range(12)]).days_in_month.to_numpy()
+        day = (rng.random(n) * days_in_month[month]).astype(int) + 1
+        frame['Date'] = [f'{m + 1}/{d}/{year}' for m, d in zip(month, day)]
+    return frame
+
+
+def generate(path, scale=1, seed=0, daily=False):
+    """Write a synthetic CSV with ``528 * scale`` rows to ``path``."""
+    rng = np.random.default_rng(seed)
+    with open(path, 'w', newline='') as fh:
+        for i, year in enumerate(YEARS):
+            year_frame(year, scale, rng, daily).to_csv(fh, header=i == 0, index=False)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('output', help='CSV file to write')
+    parser.add_argument('--scale', type=int, default=1, help='rows per month')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--daily', action='store_true', help='spread rows over the days of each month')
+    args = parser.parse_args()
+    generate(args.output, args.scale, args.seed, args.daily)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Bins for the continuous drivers of sales (unemployment rate, GDP, ...).
+
+Grouping sales on the raw value of a float column gives one group per
+distinct value, so the bar chart over it grows with the data.  The cubes
+keep the sum and count of sales per distinct driver value
+(``driver_totals``), and ``reduce_totals`` folds those into at most
+``bins`` groups per vehicle type:
+
+- ``fixed``: bins of equal width between the smallest and largest value;
+- ``quantile``: bins holding about the same number of rows each.
+
+A driver with no more distinct values than ``bins`` is kept exact.  Each
+bin is drawn at its midpoint.  Configured through ``BINNING_METHOD``
+(``fixed``, ``quantile`` or ``off``) and ``BINNING_BINS``.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# Enough for the 0.1-step unemployment rates of the source data (51 values)
+# to be drawn exactly
+DEFAULT_BINS = 60
+
+
+class Binning:
+
+    def __init__(self, method='fixed', bins=DEFAULT_BINS):
+        if method not in ('fixed', 'quantile'):
+            raise ValueError(f'Unknown binning method {method!r}')
+        if bins < 1:
+            raise ValueError('At least one bin is needed')
+        self.method = method
+        self.bins = bins
+
+    @classmethod
+    def from_env(cls):
+        method = os.environ.get('BINNING_METHOD', 'fixed')
+        if method == 'off':
+            return None
+        return cls(method, int(os.environ.get('BINNING_BINS', DEFAULT_BINS)))
+
+    @property
+    def key(self):
+        return (self.method, self.bins)
+
+    def edges(self, values, weights):
+        """Bin edges for sorted, distinct ``values`` with row counts ``weights``."""
+        if self.method == 'fixed':
+            edges = np.linspace(values[0], values[-1], self.bins + 1)
+        else:
+            # Weighted quantiles: the value below which each fraction of
+            # the rows falls.  Bins are closed on the left, so the edge is
+            # the value after the one that reaches the fraction.
+            cumulative = np.cumsum(weights, dtype=np.float64)
+            targets = np.linspace(0, cumulative[-1], self.bins + 1)[1:-1]
+            inner = values[np.minimum(np.searchsorted(cumulative, targets) + 1, len(values) - 1)]
+            edges = np.concatenate(([values[0]], inner, [values[-1]]))
+        return np.unique(edges)
+
+
+def reduce_totals(totals, driver, binning=None, recession=None):
+    """Average Automobile_Sales per Vehicle_Type and driver value or bin.
+
+    ``totals`` has ``Vehicle_Type``, ``driver``, ``Recession``, ``sum`` and
+    ``count`` columns.  Returns a frame with ``Vehicle_Type``, ``driver``
+    and ``Automobile_Sales`` columns sorted on both keys.
+    """
+    if recession is not None:
+        totals = totals[totals['Recession'].to_numpy() == (recession == 1)]
+    values = totals[driver].to_numpy(dtype=np.float64)
+    distinct, value_codes = np.unique(values, return_inverse=True)
+    types = totals['Vehicle_Type'].to_numpy(dtype=object)
+    vehicle_types, type_codes = np.unique(types, return_inverse=True)
+
+    if binning is None or len(distinct) <= binning.bins:
+        labels = distinct
+        codes = value_codes
+    else:
+        weights = np.bincount(value_codes, weights=totals['count'].to_numpy(dtype=np.float64), minlength=len(distinct))
+        edges = binning.edges(distinct, weights)
+        labels = (edges[:-1] + edges[1:]) / 2
+        # The last bin is closed on the right
+        codes = np.clip(np.searchsorted(edges, values, side='right') - 1, 0, len(labels) - 1)
+
+    flat = type_codes * len(labels) + codes
+    size = len(vehicle_types) * len(labels)
+    sums = np.bincount(flat, weights=totals['sum'].to_numpy(dtype=np.float64), minlength=size)
+    counts = np.bincount(flat, weights=totals['count'].to_numpy(dtype=np.float64), minlength=size)
+    present = np.bincount(flat, minlength=size) > 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums[present] / np.where(counts[present] > 0, counts[present], np.nan)
+    return pd.DataFrame({
+        'Vehicle_Type': np.repeat(vehicle_types, len(labels))[present],
+        driver: np.tile(labels, len(vehicle_types))[present],
+        'Automobile_Sales': means,
+    })
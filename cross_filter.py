@@ -0,0 +1,147 @@
+"""Cross filters set by clicking the charts.
+
+Clicking a vehicle type in a bar or pie chart, a year on the yearly line
+chart or a month on the monthly one narrows every other chart to it; the
+recession flag is picked in the filter bar.  A ``CrossFilter`` is the
+normalized selection, built from (and stored as) the ``cross-filter``
+``dcc.Store`` of the page.  Each chart leaves out the dimension it is
+grouped by (``without``), so the chart that was clicked keeps showing every
+value and another one can be picked.
+"""
+import numpy as np
+
+# Dimension -> attribute holding its selection
+DIMENSIONS = {
+    'Year': 'years',
+    'Month': 'months',
+    'Vehicle_Type': 'vehicle_types',
+    'Recession': 'recession',
+}
+
+
+class CrossFilter:
+
+    def __init__(self, years=None, months=(), vehicle_types=(), recession=None):
+        # Inclusive (first, last) year range, or None for every year
+        self.years = years
+        self.months = tuple(months)
+        self.vehicle_types = tuple(vehicle_types)
+        # 1 for recession rows only, 0 for the others, None for all
+        self.recession = recession
+
+    @classmethod
+    def from_store(cls, data):
+        """The filter held in the ``cross-filter`` store; an empty filter
+        (which is falsy) for none."""
+        if not data:
+            return cls()
+        years = data.get('years')
+        if years:
+            # Any number of years is read as the range they span
+            years = [int(year) for year in years]
+            years = (min(years), max(years))
+        recession = data.get('recession')
+        return cls(
+            years=years or None,
+            months=sorted({str(month) for month in data.get('months') or []}),
+            vehicle_types=sorted({str(vehicle_type) for vehicle_type in data.get('vehicle_types') or []}),
+            recession=None if recession is None else int(recession == 1),
+        )
+
+    def to_store(self):
+        if not self:
+            return None
+        return {
+            'years': list(self.years) if self.years else None,
+            'months': list(self.months),
+            'vehicle_types': list(self.vehicle_types),
+            'recession': self.recession,
+        }
+
+    @property
+    def key(self):
+        """Hashable form for cache keys; None when nothing is filtered."""
+        if not self:
+            return None
+        return (self.years, self.months, self.vehicle_types, self.recession)
+
+    def __bool__(self):
+        return bool(self.years or self.months or self.vehicle_types or self.recession is not None)
+
+    def __eq__(self, other):
+        return isinstance(other, CrossFilter) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f'CrossFilter({self.key!r})'
+
+    def without(self, *dimensions):
+        """The filter with the selection on ``dimensions`` dropped."""
+        values = {
+            'years': self.years,
+            'months': self.months,
+            'vehicle_types': self.vehicle_types,
+            'recession': self.recession,
+        }
+        for dimension in dimensions:
+            values[DIMENSIONS[dimension]] = None if dimension in ('Year', 'Recession') else ()
+        return CrossFilter(**values)
+
+    def toggle(self, dimension, value):
+        """The filter after a click on ``value`` of ``dimension``.
+
+        A vehicle type or month is added to the selection, or removed if it
+        was selected.  Years build a range: the first click selects one
+        year, a second click extends it to a range, and a click after that
+        starts over.
+        """
+        if dimension == 'Year':
+            year = int(value)
+            if self.years is None or self.years[0] != self.years[1]:
+                years = (year, year)
+            elif self.years[0] == year:
+                years = None
+            else:
+                years = tuple(sorted((self.years[0], year)))
+            return CrossFilter(years, self.months, self.vehicle_types, self.recession)
+        attribute = DIMENSIONS[dimension]
+        selected = set(getattr(self, attribute))
+        selected.symmetric_difference_update([str(value)])
+        values = {'months': self.months, 'vehicle_types': self.vehicle_types}
+        values[attribute] = sorted(selected)
+        return CrossFilter(self.years, recession=self.recession, **values)
+
+    def with_recession(self, recession):
+        return CrossFilter(self.years, self.months, self.vehicle_types, recession)
+
+    def mask(self, dimension, labels):
+        """Which of the cube ``labels`` of ``dimension`` pass, or None if all do."""
+        if dimension == 'Year':
+            if self.years is None:
+                return None
+            labels = np.asarray(labels)
+            return (labels >= self.years[0]) & (labels <= self.years[1])
+        if dimension == 'Recession':
+            if self.recession is None:
+                return None
+            return np.asarray(labels) == self.recession
+        selected = getattr(self, DIMENSIONS[dimension])
+        if not selected:
+            return None
+        return np.isin(np.asarray(labels, dtype=object).astype(str), selected)
+
+    def describe(self):
+        """Short text of the selection for the filter bar."""
+        parts = []
+        if self.vehicle_types:
+            parts.append('Vehicle type: ' + ', '.join(self.vehicle_types))
+        if self.years:
+            first, last = self.years
+            parts.append(f'Year: {first}' if first == last else f'Years: {first}-{last}')
+        if self.months:
+            parts.append('Month: ' + ', '.join(self.months))
+        if self.recession is not None:
+            parts.append('Recession periods' if self.recession == 1 else 'Non-recession periods')
+        return ' | '.join(parts)
@@ -0,0 +1,510 @@
+"""Data-source layer for the automobile sales dashboard.
+
+The raw CSV is read from a local path (``SALES_DATA_PATH``) or a URL
+(``SALES_DATA_URL``, defaulting to the public IBM course file) and converted
+once into a typed columnar cache under ``SALES_CACHE_DIR``.  Later starts
+memory-map that cache instead of downloading and parsing the CSV again.
+Once a cache for a new version of the file is written, those of its older
+versions are deleted.
+
+Columns are converted to compact types on read (``SCHEMA``): string keys
+become categoricals, integers are downcast, ``Recession`` becomes a boolean
+mask and auxiliary float columns drop to float32.  Columns that are averaged
+or grouped on for the charts keep full float64 precision.  Rows are sorted
+by Year so every year is a contiguous range (see ``indexes.RowIndex``).
+
+``SALES_DATA_PATH`` may also name a SQLite or DuckDB database with a
+``sales`` table, or a Parquet file (``DatabaseSource``), for the SQL
+backends of ``query_engine``.
+
+For multi-worker deployments the gunicorn master can publish the dataset
+once as an .npy bundle on tmpfs (``publish_shared``).  Workers started with
+``SALES_SHARED_DATA`` pointing at it attach read-only, zero-copy views
+instead of holding a private copy each.
+"""
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_DATA_URL = 'https://cf-courses-data.s3.us.cloud-object-storage.appdomain.cloud/IBMDeveloperSkillsNetwork-DV0101EN-SkillsNetwork/Data%20Files/historical_automobile_sales.csv'
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.data_cache')
+DEFAULT_CHUNK_SIZE = 250_000
+DEFAULT_SHARED_DIR = os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'automobile-dashboard')
+
+# Bump when the on-disk layout changes so stale caches are rebuilt
+CACHE_LAYOUT_VERSION = 4
+
+# Compact in-memory types for the known columns.  'category' columns are
+# stored as small integer codes; 'mask' is a boolean of ``column == 1``.
+SCHEMA = {
+    'Date': 'category',
+    'Year': 'int16',
+    'Month': 'category',
+    'Recession': 'mask',
+    'Consumer_Confidence': 'float32',
+    'Seasonality_Weight': 'float32',
+    'Price': 'float32',
+    'Advertising_Expenditure': 'integer',
+    'Competition': 'integer',
+    'GDP': 'float32',
+    'Growth_Rate': 'float32',
+    # Grouped on and averaged for the charts, so kept exact
+    'unemployment_rate': 'float64',
+    'Automobile_Sales': 'float64',
+    'Vehicle_Type': 'category',
+    'City': 'category',
+}
+
+
+def _convert(column, kind):
+    if kind == 'category':
+        return column.astype('category')
+    if kind == 'mask':
+        return column == 1
+    if kind == 'integer':
+        if column.isna().any():
+            return column
+        return pd.to_numeric(column, downcast='integer')
+    if kind.startswith('int') and column.isna().any():
+        # Missing values cannot live in a plain integer column
+        return column
+    return column.astype(kind)
+
+
+def apply_schema(frame, schema=SCHEMA):
+    """Convert ``frame`` to the compact types in ``schema``.
+
+    Columns not in the schema are still compacted where it is lossless:
+    strings become categoricals and integers are downcast.
+    """
+    columns = {}
+    for name in frame.columns:
+        column = frame[name]
+        kind = schema.get(name)
+        if kind is None:
+            if pd.api.types.is_integer_dtype(column):
+                kind = 'integer'
+            elif not pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column):
+                kind = 'category'
+        columns[name] = _convert(column, kind) if kind else column
+    return pd.DataFrame(columns)
+
+
+def plain_types(frame):
+    """``frame`` with the column types ``pd.read_csv`` gives, undoing
+    ``apply_schema``.  A float32 column is widened through the shortest
+    decimal of each value, which is what the file held; the Recession mask
+    comes back as 0 and 1."""
+    columns = {}
+    for name in frame.columns:
+        column = frame[name]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            column = column.astype(object)
+        elif pd.api.types.is_bool_dtype(column):
+            column = column.astype(np.int64)
+        elif column.dtype == np.float32:
+            column = column.astype(str).astype(np.float64)
+        elif pd.api.types.is_integer_dtype(column):
+            column = column.astype(np.int64)
+        columns[name] = column
+    return pd.DataFrame(columns)
+
+
+class _Head(io.RawIOBase):
+    """The first ``size`` bytes of the binary file ``fh``."""
+
+    def __init__(self, fh, size):
+        self._fh = fh
+        self._left = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._fh.read(min(len(buffer), self._left))
+        self._left -= len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def file_digest(path, block_size=2**20):
+    """sha1 of the bytes of the file at ``path``, read a block at a time."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class CSVSource:
+    """A CSV file on the local filesystem or behind a URL."""
+
+    def __init__(self, location):
+        self.location = location
+
+    @property
+    def is_remote(self):
+        return '://' in self.location and not self.location.startswith('file://')
+
+    @property
+    def path(self):
+        """Local filesystem path, or None for a remote source."""
+        if self.is_remote:
+            return None
+        return self.location[len('file://'):] if self.location.startswith('file://') else self.location
+
+    def fingerprint(self):
+        # Local files are keyed on size and mtime so edits rebuild the cache;
+        # remote files are keyed on the URL alone so a warm cache never needs
+        # the network.
+        if self.is_remote:
+            token = self.location
+        else:
+            stat = os.stat(self.path)
+            token = f'{os.path.abspath(self.path)}:{stat.st_size}:{stat.st_mtime_ns}'
+        token = f'{CACHE_LAYOUT_VERSION}:{token}'
+        return hashlib.sha1(token.encode('utf-8')).hexdigest()[:16]
+
+    def content_digest(self):
+        """Hash of the file contents, the same on any host and path; None
+        for a remote file, whose fingerprint is already its URL."""
+        return None if self.is_remote else file_digest(self.path)
+
+    def read(self):
+        frame = apply_schema(pd.read_csv(self.location))
+        if 'Year' in frame.columns:
+            frame = frame.sort_values('Year', kind='stable', ignore_index=True)
+        return frame
+
+    def read_chunks(self, chunksize, typed=True, size=None):
+        # Only one chunk is alive at a time; rows keep their file order.
+        # typed=False leaves the columns as the file has them; ``size``
+        # stops a local file after that many bytes.
+        if size is None:
+            with pd.read_csv(self.location, chunksize=chunksize) as reader:
+                for chunk in reader:
+                    yield apply_schema(chunk) if typed else chunk
+            return
+        with open(self.path, 'rb') as fh:
+            head = io.BufferedReader(_Head(fh, size))
+            with pd.read_csv(head, chunksize=chunksize) as reader:
+                for chunk in reader:
+                    yield apply_schema(chunk) if typed else chunk
+
+    def columns(self):
+        return list(pd.read_csv(self.location, nrows=0).columns)
+
+    def read_appended(self, offset, columns):
+        """Rows appended to a local file after byte ``offset``.
+
+        Only complete lines are parsed, so a row still being written is left
+        for the next call.  Returns the typed frame (None if there is no new
+        complete line) and the offset to continue from.
+        """
+        with open(self.path, 'rb') as fh:
+            fh.seek(offset)
+            appended = fh.read()
+        end = appended.rfind(b'\n') + 1
+        if not appended[:end].strip():
+            return None, offset + end
+        frame = pd.read_csv(io.BytesIO(appended[:end]), header=None, names=columns)
+        return apply_schema(frame), offset + end
+
+    def __repr__(self):
+        return f'CSVSource({self.location!r})'
+
+
+class DatabaseSource:
+    """A local database holding a ``sales`` table, or a Parquet file.
+
+    Meant for the SQL backends (``query_engine``), which query it in place.
+    The pandas backend reads it whole into a frame like a CSV.
+    """
+
+    is_remote = False
+
+    def __init__(self, path):
+        self.path = path
+
+    @property
+    def kind(self):
+        extension = os.path.splitext(self.path)[1].lower()
+        return 'sqlite' if extension in ('.sqlite', '.db') else extension[1:]
+
+    def fingerprint(self):
+        stat = os.stat(self.path)
+        token = f'{CACHE_LAYOUT_VERSION}:{os.path.abspath(self.path)}:{stat.st_size}:{stat.st_mtime_ns}'
+        return hashlib.sha1(token.encode('utf-8')).hexdigest()[:16]
+
+    def content_digest(self):
+        return file_digest(self.path)
+
+    def _read_raw(self):
+        if self.kind == 'parquet':
+            return pd.read_parquet(self.path)
+        if self.kind == 'duckdb':
+            import duckdb
+            with duckdb.connect(self.path, read_only=True) as connection:
+                return connection.execute('SELECT * FROM sales').df()
+        import sqlite3
+        with closing(sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)) as connection:
+            return pd.read_sql('SELECT * FROM sales', connection)
+
+    def read(self):
+        frame = apply_schema(self._read_raw())
+        if 'Year' in frame.columns:
+            frame = frame.sort_values('Year', kind='stable', ignore_index=True)
+        return frame
+
+    def read_chunks(self, chunksize, typed=True):
+        if not typed:
+            yield from self._raw_chunks(chunksize)
+            return
+        frame = self.read()
+        for start in range(0, len(frame), chunksize):
+            yield frame.iloc[start:start + chunksize]
+
+    def _raw_chunks(self, chunksize):
+        # The rows as stored, one chunk at a time
+        if self.kind == 'parquet':
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(self.path).iter_batches(batch_size=chunksize):
+                yield batch.to_pandas()
+            return
+        if self.kind == 'duckdb':
+            import duckdb
+            connection = duckdb.connect(self.path, read_only=True)
+        else:
+            import sqlite3
+            connection = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+        with closing(connection):
+            cursor = connection.execute('SELECT * FROM sales')
+            columns = [column[0] for column in cursor.description]
+            while True:
+                rows = cursor.fetchmany(chunksize)
+                if not rows:
+                    return
+                yield pd.DataFrame(rows, columns=columns)
+
+    def columns(self):
+        return []
+
+    def __repr__(self):
+        return f'DatabaseSource({self.path!r})'
+
+
+# Files SALES_DATA_PATH may name besides a CSV
+DATABASE_EXTENSIONS = ('.sqlite', '.db', '.duckdb', '.parquet')
+
+
+def source_for(location):
+    """The source reading ``location``: a database file, or a CSV path or URL."""
+    if location.lower().endswith(DATABASE_EXTENSIONS):
+        return DatabaseSource(location)
+    return CSVSource(location)
+
+
+def default_source():
+    path = os.environ.get('SALES_DATA_PATH')
+    if path:
+        return source_for(path)
+    return CSVSource(os.environ.get('SALES_DATA_URL', DEFAULT_DATA_URL))
+
+
+# ---------------------------------------------------------------------------
+# NumPy .npy bundle: one file per column plus a JSON manifest.  Numeric
+# columns are memory-mapped read-only; categorical columns are stored as
+# integer codes with their categories in the manifest.  Codes use the same
+# width pandas picks for categoricals so they can be wrapped without a copy.
+# ---------------------------------------------------------------------------
+
+def _code_dtype(n_categories):
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+def _write_npy_bundle(frame, path):
+    manifest = {'rows': len(frame), 'columns': []}
+    for i, name in enumerate(frame.columns):
+        column = frame[name]
+        entry = {'name': name, 'file': f'{i}.npy'}
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            entry['kind'] = 'category'
+            categories = column.cat.categories
+            codes = column.cat.codes.to_numpy()
+        elif pd.api.types.is_numeric_dtype(column) or pd.api.types.is_bool_dtype(column):
+            entry['kind'] = 'numeric'
+            values = column.to_numpy()
+        else:
+            entry['kind'] = 'category'
+            codes, categories = pd.factorize(column.astype(object), use_na_sentinel=True)
+        if entry['kind'] == 'category':
+            entry['categories'] = [str(c) for c in categories]
+            values = codes.astype(_code_dtype(len(categories)))
+        np.save(os.path.join(path, entry['file']), np.ascontiguousarray(values), allow_pickle=False)
+        manifest['columns'].append(entry)
+    with open(os.path.join(path, 'manifest.json'), 'w') as fh:
+        json.dump(manifest, fh)
+
+
+def _read_npy_bundle(path):
+    with open(os.path.join(path, 'manifest.json')) as fh:
+        manifest = json.load(fh)
+    columns = {}
+    for entry in manifest['columns']:
+        values = np.load(os.path.join(path, entry['file']), mmap_mode='r', allow_pickle=False)
+        if entry['kind'] == 'category':
+            # Wraps the mapped codes; only the categories live in the heap
+            values = pd.Categorical.from_codes(values, entry['categories'])
+        columns[entry['name']] = values
+    return pd.DataFrame(columns, copy=False)
+
+
+# ---------------------------------------------------------------------------
+# Feather (Arrow IPC), available when pyarrow is installed
+# ---------------------------------------------------------------------------
+
+def _write_feather(frame, path):
+    frame.reset_index(drop=True).to_feather(os.path.join(path, 'data.feather'), compression='uncompressed')
+
+
+def _read_feather(path):
+    import pyarrow.feather as feather
+    table = feather.read_table(os.path.join(path, 'data.feather'), memory_map=True)
+    return table.to_pandas()
+
+
+CACHE_FORMATS = {
+    'npy': (_write_npy_bundle, _read_npy_bundle),
+    'feather': (_write_feather, _read_feather),
+}
+
+# Extensions of the caches written under SALES_CACHE_DIR, including the
+# database copies of query_engine
+CACHE_EXTENSIONS = tuple(CACHE_FORMATS) + ('sqlite', 'duckdb')
+
+
+def _source_prefix(source):
+    # Stable across edits of the file, unlike the fingerprint, so the bundles
+    # of older versions of the same source can be found and removed
+    location = os.path.abspath(source.path) if source.path else source.location
+    return hashlib.sha1(location.encode('utf-8')).hexdigest()[:8]
+
+
+def cache_path(source, cache_dir=None, fmt=None):
+    cache_dir = cache_dir or os.environ.get('SALES_CACHE_DIR', DEFAULT_CACHE_DIR)
+    fmt = fmt or os.environ.get('SALES_CACHE_FORMAT', 'npy')
+    return os.path.join(cache_dir, f'{_source_prefix(source)}-{source.fingerprint()}.{fmt}')
+
+
+def _legacy_cache(entry):
+    # Caches were named after the fingerprint alone before the source prefix
+    # was added; nothing reads them any more, whichever source they hold
+    fingerprint, _, fmt = entry.partition('.')
+    return fmt in CACHE_EXTENSIONS and len(fingerprint) == 16 and all(c in '0123456789abcdef' for c in fingerprint)
+
+
+def prune_cache(path):
+    """Delete the caches of older versions of the source ``path`` was built
+    from, and any cache under the unprefixed names of earlier releases.
+    Caches of the same version in other formats are kept."""
+    parent, name = os.path.split(path)
+    prefix, _, rest = name.partition('-')
+    fingerprint = rest.split('.')[0]
+    current = f'{prefix}-{fingerprint}.'
+    try:
+        entries = os.listdir(parent)
+    except OSError:
+        return
+    for entry in entries:
+        if entry.startswith(current):
+            continue
+        if not entry.startswith(f'{prefix}-') and not _legacy_cache(entry):
+            continue
+        stale = os.path.join(parent, entry)
+        # Processes still mapping a removed bundle keep reading it until
+        # they unmap it
+        if os.path.isdir(stale):
+            shutil.rmtree(stale, ignore_errors=True)
+        else:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+
+def load_data(source=None, cache_dir=None, fmt=None, use_cache=True):
+    """Return the sales frame, building the columnar cache on first use."""
+    source = source or default_source()
+
+    # A bundle published by the gunicorn master for this same source
+    shared = os.environ.get('SALES_SHARED_DATA')
+    if shared and os.path.basename(shared) == os.path.basename(cache_path(source, fmt='npy')):
+        return attach_shared(shared)
+    if not use_cache:
+        return source.read()
+
+    fmt = fmt or os.environ.get('SALES_CACHE_FORMAT', 'npy')
+    if fmt not in CACHE_FORMATS:
+        raise ValueError(f'Unknown cache format {fmt!r}; expected one of {sorted(CACHE_FORMATS)}')
+    write, read = CACHE_FORMATS[fmt]
+    path = cache_path(source, cache_dir, fmt)
+
+    if os.path.isdir(path):
+        return read(path)
+
+    frame = source.read()
+    parent = os.path.dirname(path)
+    scratch = None
+    # Build into a scratch directory and rename it into place so concurrent
+    # workers never observe a half-written cache.
+    try:
+        os.makedirs(parent, exist_ok=True)
+        scratch = tempfile.mkdtemp(prefix='.building-', dir=parent)
+        write(frame, scratch)
+        os.rename(scratch, path)
+        prune_cache(path)
+    except OSError:
+        # Another process won the race, or the cache dir is read-only
+        if os.path.isdir(path):
+            return read(path)
+        return frame
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+    return read(path)
+
+
+def clear_cache(cache_dir=None):
+    cache_dir = cache_dir or os.environ.get('SALES_CACHE_DIR', DEFAULT_CACHE_DIR)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def publish_shared(source=None, directory=None):
+    """Write the dataset as an .npy bundle for workers to attach to.
+
+    Meant to run once in the gunicorn master; the bundle lands on tmpfs
+    (``/dev/shm``) unless ``directory`` or ``SALES_SHARED_DIR`` says
+    otherwise.  Returns the bundle path to export as ``SALES_SHARED_DATA``.
+    """
+    source = source or default_source()
+    directory = directory or os.environ.get('SALES_SHARED_DIR', DEFAULT_SHARED_DIR)
+    path = cache_path(source, directory, 'npy')
+    if not os.path.isdir(path):
+        load_data(source, cache_dir=directory, fmt='npy')
+    if not os.path.isdir(path):
+        raise OSError(f'Could not publish the dataset to {directory}')
+    return path
+
+
+def attach_shared(path):
+    """Read-only, zero-copy view of a bundle written by ``publish_shared``."""
+    return _read_npy_bundle(path)
@@ -0,0 +1,197 @@
+"""Several datasets of the same schema served by one deployment.
+
+``SALES_DATASETS`` names them, either as a directory (every CSV, Parquet or
+database file in it is a dataset named after the file) or as a
+comma-separated list of ``name=location`` pairs, where a location is
+anything ``SALES_DATA_PATH`` accepts, or a URL.  The dataset of
+``SALES_DATA_PATH`` / ``SALES_DATA_URL`` is always there as ``default``,
+unless the list names one ``default`` itself.
+
+A dataset is loaded (``live_reload.LiveDataset``) the first time a request
+asks for it; concurrent first requests share one load.  Loaded datasets
+are kept in least-recently-used order.  Once their estimated memory
+(``Snapshot.nbytes``) passes ``SALES_DATASETS_MEMORY_MB``, or more than
+``SALES_DATASETS_MAX`` are loaded, the coldest ones are evicted: their
+reload watcher is stopped and the ``on_evict`` listeners drop what was
+cached for them.  Requests already holding a snapshot of an evicted dataset
+finish with it.  The default dataset is loaded at startup and never
+evicted, so ``/ready`` and the cache warmup keep referring to it.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from data_source import DATABASE_EXTENSIONS, default_source, source_for
+from live_reload import LiveDataset
+
+DEFAULT_NAME = 'default'
+DATASET_EXTENSIONS = ('.csv',) + DATABASE_EXTENSIONS
+
+
+def _configured_sources(spec):
+    """Name -> source for the ``SALES_DATASETS`` value ``spec``."""
+    sources = {}
+    if os.path.isdir(spec):
+        for entry in sorted(os.scandir(spec), key=lambda entry: entry.name):
+            name, extension = os.path.splitext(entry.name)
+            if entry.is_file() and extension.lower() in DATASET_EXTENSIONS:
+                sources[name] = source_for(entry.path)
+        return sources
+    for item in spec.split(','):
+        name, _, location = item.strip().partition('=')
+        if not name or not location:
+            raise ValueError(f'SALES_DATASETS entries are name=location, got {item.strip()!r}')
+        sources[name.strip()] = source_for(location.strip())
+    return sources
+
+
+def _nbytes(datasets):
+    # Datasets still loading in the background are not counted yet
+    return sum(dataset.current.nbytes for dataset in datasets if dataset.ready())
+
+
+class DatasetManager:
+
+    def __init__(self, sources, default=DEFAULT_NAME, max_bytes=None, max_loaded=None, open_dataset=LiveDataset.from_env):
+        # Name -> source, in the order the dataset dropdown lists them
+        self.sources = sources
+        self.default = default
+        self.max_bytes = max_bytes
+        self.max_loaded = max_loaded
+        self._open_dataset = open_dataset
+        # Name -> LiveDataset, least recently used first
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._listeners = []
+        # Last version seen per name, including evicted datasets
+        self._versions = {}
+        # Data changes of the datasets other than the default (see version)
+        self.changes = 0
+        self.loads = 0
+        self.evictions = 0
+        self._load(default, wait=False)
+
+    @classmethod
+    def from_env(cls, source=None):
+        sources = {DEFAULT_NAME: source or default_source()}
+        spec = os.environ.get('SALES_DATASETS')
+        if spec:
+            sources.update(_configured_sources(spec))
+        memory_mb = float(os.environ.get('SALES_DATASETS_MEMORY_MB', 0))
+        max_loaded = int(os.environ.get('SALES_DATASETS_MAX', 0))
+        return cls(
+            sources,
+            max_bytes=int(memory_mb * 2**20) or None,
+            max_loaded=max_loaded or None,
+        )
+
+    @property
+    def names(self):
+        return list(self.sources)
+
+    def resolve(self, name):
+        """``name`` if it is a configured dataset, else the default."""
+        return name if name in self.sources else self.default
+
+    def get(self, name=None):
+        """The ``LiveDataset`` of ``name`` (default: the default dataset),
+        loaded on first use."""
+        name = self.resolve(name)
+        with self._lock:
+            dataset = self._loaded.get(name)
+            if dataset is not None:
+                self._loaded.move_to_end(name)
+                return dataset
+        return self._load(name)
+
+    def current(self, name=None):
+        """The current snapshot of ``name``."""
+        return self.get(name).current
+
+    def _load(self, name, wait=True):
+        with self._lock:
+            loading = self._loading.setdefault(name, threading.Lock())
+        # One load per name; other requests for it wait for that one
+        with loading:
+            with self._lock:
+                dataset = self._loaded.get(name)
+            if dataset is not None:
+                return dataset
+            dataset = self._open_dataset(self.sources[name])
+            if wait:
+                # Raises if the load failed, so the next request tries again
+                self._seen(name, dataset.current)
+            dataset.subscribe(lambda snapshot: self._seen(name, snapshot))
+            with self._lock:
+                self._loaded[name] = dataset
+                self.loads += 1
+                evicted = self._over_budget(keep=name)
+            for evicted_name, evicted_dataset in evicted:
+                self._evict(evicted_name, evicted_dataset)
+            return dataset
+
+    def _seen(self, name, snapshot):
+        previous = self._versions.get(name)
+        self._versions[name] = snapshot.version
+        if name != self.default and previous is not None and previous != snapshot.version:
+            self.changes += 1
+
+    def _over_budget(self, keep):
+        """Pop the coldest datasets until the rest fit; called under the lock.
+
+        ``keep``, the dataset just loaded, stays even if it alone is over
+        the budget, since a request is about to use it.
+        """
+        evicted = []
+        while True:
+            candidates = [name for name in self._loaded if name not in (self.default, keep)]
+            if not candidates or not self._too_much():
+                return evicted
+            name = candidates[0]
+            evicted.append((name, self._loaded.pop(name)))
+
+    def _too_much(self):
+        if self.max_loaded is not None and len(self._loaded) > self.max_loaded:
+            return True
+        if self.max_bytes is not None and _nbytes(self._loaded.values()) > self.max_bytes:
+            return True
+        return False
+
+    def _evict(self, name, dataset):
+        dataset.stop()
+        self.evictions += 1
+        for listener in self._listeners:
+            listener(name, dataset)
+
+    def on_evict(self, listener):
+        """Call ``listener(name, dataset)`` after a dataset is evicted."""
+        self._listeners.append(listener)
+
+    def loaded(self):
+        with self._lock:
+            return list(self._loaded)
+
+    def version(self):
+        """Token that changes whenever the data of any dataset changes.
+
+        The version of the default dataset, plus a count of the changes seen
+        in the others.  While only the default changes it is the data
+        version itself, which a static bundle is keyed on.
+        """
+        version = self.current().version
+        return version if not self.changes else f'{version}+{self.changes}'
+
+    def stats(self):
+        with self._lock:
+            loaded = dict(self._loaded)
+        return {
+            'configured': len(self.sources),
+            'loaded': len(loaded),
+            'loads': self.loads,
+            'evictions': self.evictions,
+            'changes': self.changes,
+            'bytes': _nbytes(loaded.values()),
+            'max_bytes': self.max_bytes,
+            'max_loaded': self.max_loaded,
+        }
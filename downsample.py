@@ -0,0 +1,129 @@
+"""Level of detail for the long time-series line charts.
+
+At monthly or daily granularity the whole-period charts have far more
+points than their width in pixels can show.  ``LevelOfDetail.window`` cuts
+a series to the visible x-range and, when more points remain than the chart
+can draw (``width * POINTS_PER_PIXEL``), reduces them with one of:
+
+- ``lttb``: Largest-Triangle-Three-Buckets, which keeps the points that
+  shape the line (peaks and turns) and drops the ones in between;
+- ``minmax``: the minimum and maximum of each bucket, which keeps every
+  extreme at the cost of a jagged line.
+
+Configured through ``LOD_METHOD`` (``lttb`` or ``minmax``) and
+``LOD_WIDTH`` (chart width in pixels, for charts whose width is not known).
+"""
+import os
+
+import numpy as np
+
+DEFAULT_WIDTH = 600
+# Points drawn per horizontal pixel; more are indistinguishable
+POINTS_PER_PIXEL = 2
+
+
+def _numeric(x):
+    x = np.asarray(x)
+    if x.dtype.kind in 'mM':
+        x = x.view(np.int64)
+    return x.astype(np.float64)
+
+
+def lttb(x, y, threshold):
+    """Indices of ``threshold`` points of (x, y) chosen by LTTB."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = _numeric(x)
+    y = np.asarray(y, dtype=np.float64)
+
+    # The first and last points are kept; the rest is split into
+    # threshold - 2 buckets of (nearly) equal size
+    bounds = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.intp) + 1
+    bounds[-1] = n - 1
+    sum_x = np.concatenate(([0.0], np.cumsum(x)))
+    sum_y = np.concatenate(([0.0], np.cumsum(y)))
+    sizes = np.diff(bounds)
+    mean_x = (sum_x[bounds[1:]] - sum_x[bounds[:-1]]) / sizes
+    mean_y = (sum_y[bounds[1:]] - sum_y[bounds[:-1]]) / sizes
+    # Each bucket is judged against the average of the next one
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = bounds[i], bounds[i + 1]
+        area = np.abs(
+            (x[a] - next_x[i]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (next_y[i] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(y, buckets):
+    """Indices of the minimum and maximum of ``buckets`` equal slices of y."""
+    n = len(y)
+    if buckets < 1 or n <= 2 * buckets:
+        return np.arange(n)
+    size = -(-n // buckets)
+    rows = -(-n // size)
+    padded = np.full(rows * size, np.nan)
+    padded[:n] = y
+    grid = padded.reshape(rows, size)
+    offsets = np.arange(rows) * size
+    picks = np.concatenate((
+        [0, n - 1],
+        offsets + np.nanargmin(grid, axis=1),
+        offsets + np.nanargmax(grid, axis=1),
+    ))
+    return np.unique(picks)
+
+
+class LevelOfDetail:
+
+    def __init__(self, method='lttb', width=DEFAULT_WIDTH):
+        if method not in ('lttb', 'minmax'):
+            raise ValueError(f'Unknown level-of-detail method {method!r}')
+        self.method = method
+        self.width = width
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.environ.get('LOD_METHOD', 'lttb'),
+            int(os.environ.get('LOD_WIDTH', DEFAULT_WIDTH)),
+        )
+
+    def max_points(self, width=None):
+        """Points a chart ``width`` pixels wide can show; ``self.width``
+        when its width is not known."""
+        return (width or self.width) * POINTS_PER_PIXEL
+
+    def reduce(self, x, y, width=None):
+        """Indices of the points of (x, y) to draw."""
+        max_points = self.max_points(width)
+        if len(x) <= max_points:
+            return np.arange(len(x))
+        if self.method == 'minmax':
+            return minmax(np.asarray(y, dtype=np.float64), max_points // 2)
+        return lttb(x, y, max_points)
+
+    def window(self, x, y, start=None, end=None, width=None):
+        """The points of sorted (x, y) between ``start`` and ``end``, reduced
+        to the resolution of a chart ``width`` pixels wide."""
+        x = np.asarray(x)
+        y = np.asarray(y)
+        lo = 0 if start is None else np.searchsorted(x, start, side='left')
+        hi = len(x) if end is None else np.searchsorted(x, end, side='right')
+        # One point beyond each edge, so the line runs out of the window
+        # instead of stopping short of it
+        lo = max(lo - 1, 0)
+        hi = min(hi + 1, len(x))
+        x, y = x[lo:hi], y[lo:hi]
+        keep = self.reduce(x, y, width)
+        return x[keep], y[keep]
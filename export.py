@@ -0,0 +1,251 @@
+"""Streaming downloads of the numbers behind the dashboard.
+
+The ``/export`` route answers with either the aggregates each chart of the
+current view, or the source rows passing the cross filter, as CSV, Parquet
+or Arrow IPC (stream format).  The response is written chunk by chunk as it
+is sent: rows are taken ``chunk_rows`` at a time (from the source file, a
+database cursor or the loaded rows) and each chunk is encoded and handed to
+the server before the next one is read.  A worker never holds the encoded
+file, only one chunk of it; Parquet gets one row group per chunk.
+
+An export occupies the thread that serves it until the client has read the
+last byte, so each worker runs at most ``max_concurrent`` row exports and
+answers 429 beyond that, leaving its other threads (``GUNICORN_THREADS``)
+to the dashboard.  Chart aggregates are a few kilobytes and are not limited.
+
+Parquet and Arrow need pyarrow; without it only CSV is offered.
+Configured through ``EXPORT_CHUNK_ROWS`` and ``EXPORT_CONCURRENCY``.
+"""
+import os
+import threading
+
+import flask
+import pandas as pd
+
+from data_source import CSVSource, DatabaseSource, apply_schema, plain_types
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from pyarrow import ipc
+except ImportError:  # optional dependency
+    pa = None
+
+DEFAULT_CHUNK_ROWS = 50_000
+DEFAULT_CONCURRENCY = 1
+
+# Format -> (MIME type, file extension)
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+# Rows the cube counts: those with every key present
+KEYS = ('Year', 'Month', 'Vehicle_Type')
+
+
+class _Sink:
+    """Write-only file object whose contents are taken after each chunk."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def _encode_csv(frames):
+    header = True
+    for frame in frames:
+        yield frame.to_csv(index=False, header=header).encode('utf-8')
+        header = False
+
+
+def _encode_arrow(frames, open_writer):
+    sink = _Sink()
+    writer = schema = None
+    for frame in frames:
+        table = pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+        if writer is None:
+            # Later chunks are converted to the schema of the first one
+            schema = table.schema
+            writer = open_writer(sink, schema)
+        writer.write_table(table)
+        yield sink.take()
+    if writer is not None:
+        writer.close()
+        yield sink.take()
+
+
+def encode(frames, fmt):
+    """The bytes of ``frames`` written as one file of format ``fmt``.
+
+    ``frames`` yields at least one frame (possibly empty, for the header
+    or schema); every frame has the columns of the first.
+    """
+    if fmt == 'csv':
+        return _encode_csv(frames)
+    if fmt == 'parquet':
+        return _encode_arrow(frames, pq.ParquetWriter)
+    return _encode_arrow(frames, ipc.new_stream)
+
+
+def frame_chunks(frame, chunk_rows):
+    for start in range(0, max(len(frame), 1), chunk_rows):
+        yield frame.iloc[start:start + chunk_rows]
+
+
+def _selected(chunk, where):
+    """The rows of a source chunk the cube counts that pass ``where``."""
+    # Matched on the key columns as the cube types them (Recession == 1)
+    keys = apply_schema(chunk[list(KEYS) + ['Recession']])
+    keep = keys[list(KEYS)].notna().all(axis=1).to_numpy(copy=True)
+    for column in keys.columns:
+        mask = where.mask(column, keys[column].to_numpy())
+        if mask is not None:
+            keep &= mask
+    return chunk[keep]
+
+
+def _source_rows(source, extent, where, chunk_rows):
+    # A CSV is read only as far as the snapshot read it, so rows appended
+    # since are left out
+    if isinstance(source, CSVSource):
+        chunks = source.read_chunks(chunk_rows, typed=False, size=extent)
+    else:
+        chunks = source.read_chunks(chunk_rows, typed=False)
+    empty = True
+    for chunk in chunks:
+        chunk = _selected(chunk, where)
+        if len(chunk) or empty:
+            yield chunk
+            empty = False
+
+
+def _snapshot_rows(snapshot, where, chunk_rows):
+    empty = True
+    for frame, row_index in snapshot.segments:
+        rows = row_index.select_where(frame, where)
+        for start in range(0, len(rows), chunk_rows):
+            yield plain_types(rows.iloc[start:start + chunk_rows])
+            empty = False
+    if empty:
+        yield plain_types(snapshot.data.iloc[:0])
+
+
+def row_chunks(dataset, snapshot, where, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """The source rows of ``dataset`` passing the cross filter ``where``.
+
+    Rows are those of ``snapshot``, the data the view was drawn from.  While
+    the source file is as the snapshot read it, they are read again from it
+    and keep every column in its order, types and precision, whatever the
+    ingest mode and backend; a database a SQL backend queries in place is
+    the source, and filters in the query.  Otherwise (a remote source, or a
+    file changed since) they come from the rows the snapshot holds, in year
+    order, with the types a CSV read gives (``plain_types``).  Yields frames
+    of up to ``chunk_rows`` rows, at least one; raises ValueError, before
+    any row is read, when the snapshot holds no rows either.
+    """
+    source = dataset.source
+    if snapshot.unchanged(source):
+        if dataset.backend != 'pandas' and isinstance(source, DatabaseSource):
+            return snapshot.cube.iter_rows(where, chunk_rows)
+        return _source_rows(source, snapshot.extent, where, chunk_rows)
+    if snapshot.data is not None:
+        return _snapshot_rows(snapshot, where, chunk_rows)
+    if source.path is None:
+        raise ValueError('Rows of a remote source can only be exported with the in-memory ingest')
+    raise ValueError('The source changed since the data was loaded; retry once it is reloaded')
+
+
+def aggregate_chunks(tables, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """The (chart title, frame) pairs of a view as one long table.
+
+    Each row names its chart in a leading ``Chart`` column; columns a chart
+    does not have are left empty.
+    """
+    frames = [frame.assign(Chart=title)[['Chart', *frame.columns]] for title, frame in tables]
+    frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame({'Chart': []})
+    # Integer columns of every chart having them, turned to float by the
+    # gaps of the others
+    integers = {
+        column for column in frame.columns
+        if all(pd.api.types.is_integer_dtype(part[column]) for part in frames if column in part.columns)
+    }
+    # One dtype per column, so every chunk converts to the same schema
+    for column in frame.columns:
+        if isinstance(frame[column].dtype, pd.CategoricalDtype):
+            frame[column] = frame[column].astype(object)
+        elif column in integers and not pd.api.types.is_integer_dtype(frame[column]):
+            frame[column] = frame[column].astype('Int64')
+    return frame_chunks(frame, chunk_rows)
+
+
+class Exporter:
+
+    def __init__(self, chunk_rows=DEFAULT_CHUNK_ROWS, max_concurrent=DEFAULT_CONCURRENCY):
+        self.chunk_rows = chunk_rows
+        self.max_concurrent = max_concurrent
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self.exports = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            chunk_rows=int(os.environ.get('EXPORT_CHUNK_ROWS', DEFAULT_CHUNK_ROWS)),
+            max_concurrent=int(os.environ.get('EXPORT_CONCURRENCY', DEFAULT_CONCURRENCY)),
+        )
+
+    @property
+    def formats(self):
+        """The formats that can be written here."""
+        return [fmt for fmt in FORMATS if fmt == 'csv' or pa is not None]
+
+    def response(self, frames, fmt, name, limited=False):
+        """Streaming response writing ``frames`` as ``name``.<extension>.
+
+        ``limited`` exports (the row exports) count against ``max_concurrent``.
+        """
+        if limited and not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            response = flask.jsonify({'error': 'Too many exports in progress, retry shortly'})
+            response.status_code = 429
+            response.headers['Retry-After'] = '5'
+            return response
+        self.exports += 1
+        mimetype, extension = FORMATS[fmt]
+        response = flask.Response(encode(frames, fmt), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename="{name}.{extension}"'
+        if limited:
+            # Released once the last chunk is sent or the client goes away
+            response.call_on_close(self._slots.release)
+        return response
+
+    def stats(self):
+        return {
+            'exports': self.exports,
+            'rejected': self.rejected,
+            'chunk_rows': self.chunk_rows,
+            'max_concurrent': self.max_concurrent,
+        }
@@ -0,0 +1,175 @@
+"""Chart figures as plain dicts, without Plotly Express.
+
+``px.line`` / ``px.bar`` / ``px.pie`` validate every property and merge the
+whole ``plotly_dark`` template into each figure, and ``update_layout``
+validates and merges again.  ``FigureBuilder`` writes the figure JSON that
+path produces directly: the layout shared by every chart (``graph_layout``
+plus the template) is compiled once, and traces are built straight from
+NumPy arrays, sent as base64 typed arrays the way Plotly sends them.
+
+The template is trimmed to the parts that apply to cartesian scatter and
+bar charts and to pie charts, so the figures render the same at a fraction
+of the bytes.  ``FIGURE_BUILDER=px`` switches the dashboard back to Plotly
+Express.
+"""
+import base64
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+# Template parts that can affect the dashboard's charts; polar, geo, 3D and
+# colour-scale settings are dropped
+TEMPLATE_LAYOUT_KEYS = (
+    'annotationdefaults', 'autotypenumbers', 'colorway', 'font', 'hoverlabel', 'hovermode',
+    'paper_bgcolor', 'plot_bgcolor', 'shapedefaults', 'title', 'xaxis', 'yaxis',
+)
+TEMPLATE_TRACE_TYPES = ('bar', 'pie', 'scatter')
+
+
+def trimmed_template(name):
+    template = pio.templates[name].to_plotly_json()
+    return {
+        'data': {k: v for k, v in template.get('data', {}).items() if k in TEMPLATE_TRACE_TYPES},
+        'layout': {k: v for k, v in template.get('layout', {}).items() if k in TEMPLATE_LAYOUT_KEYS},
+    }
+
+
+def typed_array(values):
+    """Numeric arrays as a Plotly typed array, anything else as a list."""
+    values = np.asarray(values)
+    if values.dtype.kind == 'M':
+        # Dates go out as ISO strings, without a time part when there is none
+        days = values.astype('datetime64[D]')
+        return np.datetime_as_string(days if (days == values).all() else values).tolist()
+    if values.dtype.kind not in 'iuf':
+        return values.tolist()
+    if values.dtype.itemsize == 8 and values.dtype.kind in 'iu':
+        # plotly.js has no 64-bit integer arrays
+        info = np.iinfo(np.int32)
+        fits = values.size == 0 or (values.min() >= info.min and values.max() <= info.max)
+        values = values.astype(np.int32 if fits else np.float64)
+    values = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder('<'))
+    return {'dtype': values.dtype.str[1:], 'bdata': base64.b64encode(values.tobytes()).decode('ascii')}
+
+
+def _expand(layout):
+    """Turn magic-underscore keys (``title_font``) into nested dicts."""
+    expanded = {}
+    for key, value in layout.items():
+        if isinstance(value, dict):
+            value = _expand(value)
+        head, _, rest = key.partition('_')
+        if rest and head in ('title', 'legend'):
+            expanded.setdefault(head, {})[rest] = value
+        else:
+            expanded[key] = value
+    return expanded
+
+
+class FigureBuilder:
+
+    def __init__(self, graph_layout, template='plotly_dark'):
+        self.template = trimmed_template(template)
+        base = _expand(graph_layout)
+        self._title_font = base.pop('title', {}).get('font')
+        self._legend = dict(base.pop('legend', {}), tracegroupgap=0)
+
+        # update_layout(xaxis_title=...) replaces the whole axis title, so
+        # the cartesian charts keep only the tick and grid settings
+        def axis(name, anchor):
+            settings = {k: v for k, v in base[name].items() if k != 'title'}
+            return dict({'anchor': anchor, 'domain': [0.0, 1.0]}, **settings)
+        self._cartesian = dict(base, xaxis=axis('xaxis', 'y'), yaxis=axis('yaxis', 'x'))
+        self._pie = base
+
+    def _layout(self, base, title, **extra):
+        layout = dict(base, template=self.template, **extra)
+        layout['title'] = {'text': title, 'font': self._title_font, 'x': 0.5}
+        return layout
+
+    def _cartesian_layout(self, title, xaxis_title, yaxis_title, legend=None, **extra):
+        layout = self._layout(self._cartesian, title, legend=dict(self._legend, **(legend or {})), **extra)
+        layout['xaxis'] = dict(layout['xaxis'], title={'text': xaxis_title})
+        layout['yaxis'] = dict(layout['yaxis'], title={'text': yaxis_title})
+        return layout
+
+    def line(self, frame, x, y, title, color, xaxis_title, yaxis_title, markers=False, shapes=None, line_shape='spline'):
+        trace = {
+            'hovertemplate': f'{x}=%{{x}}<br>{y}=%{{y}}<extra></extra>',
+            'legendgroup': '',
+            'line': {'color': color, 'dash': 'solid', 'shape': line_shape},
+            'marker': {'symbol': 'circle'},
+            'mode': 'lines+markers' if markers else 'lines',
+            'name': '',
+            'orientation': 'v',
+            'showlegend': False,
+            'x': typed_array(frame[x]),
+            'xaxis': 'x',
+            'y': typed_array(frame[y]),
+            'yaxis': 'y',
+            'type': 'scatter',
+        }
+        layout = self._cartesian_layout(title, xaxis_title, yaxis_title)
+        if shapes:
+            layout['shapes'] = shapes
+        return {'data': [trace], 'layout': layout}
+
+    def _bar_trace(self, x_values, y_values, color, hovertemplate, **extra):
+        return dict({
+            'hovertemplate': hovertemplate,
+            'legendgroup': '',
+            'marker': {'color': color, 'pattern': {'shape': ''}},
+            'name': '',
+            'orientation': 'v',
+            'showlegend': False,
+            'textposition': 'auto',
+            'x': typed_array(x_values),
+            'xaxis': 'x',
+            'y': typed_array(y_values),
+            'yaxis': 'y',
+            'type': 'bar',
+        }, **extra)
+
+    def bar(self, frame, x, y, title, color, xaxis_title, yaxis_title):
+        trace = self._bar_trace(frame[x], frame[y], color, f'{x}=%{{x}}<br>{y}=%{{y}}<extra></extra>')
+        layout = self._cartesian_layout(title, xaxis_title, yaxis_title, barmode='relative')
+        return {'data': [trace], 'layout': layout}
+
+    def grouped_bar(self, frame, x, y, group, title, colors, xaxis_title, yaxis_title, legend_title):
+        """One bar trace per value of ``group``, side by side."""
+        traces = []
+        groups = frame[group].to_numpy()
+        for i, name in enumerate(pd.unique(groups)):
+            rows = groups == name
+            traces.append(self._bar_trace(
+                frame[x].to_numpy()[rows],
+                frame[y].to_numpy()[rows],
+                colors[i % len(colors)],
+                f'{group}={name}<br>{x}=%{{x}}<br>{y}=%{{y}}<extra></extra>',
+                alignmentgroup='True',
+                legendgroup=name,
+                name=name,
+                offsetgroup=name,
+                showlegend=True,
+            ))
+        layout = self._cartesian_layout(
+            title, xaxis_title, yaxis_title, legend={'title': {'text': legend_title}}, barmode='group',
+        )
+        return {'data': traces, 'layout': layout}
+
+    def pie(self, frame, values, names, title, colors, hole=None, legend=None):
+        trace = {
+            'domain': {'x': [0.0, 1.0], 'y': [0.0, 1.0]},
+            'hovertemplate': f'{names}=%{{label}}<br>{values}=%{{value}}<extra></extra>',
+            'labels': typed_array(frame[names]),
+            'legendgroup': '',
+            'name': '',
+            'showlegend': True,
+            'values': typed_array(frame[values]),
+            'type': 'pie',
+        }
+        if hole is not None:
+            trace['hole'] = hole
+        layout = self._layout(self._pie, title, legend=dict(self._legend, **(legend or {})), piecolorway=list(colors))
+        return {'data': [trace], 'layout': layout}
@@ -0,0 +1,322 @@
+"""Bounded cache for rendered dashboard views.
+
+Each chart depends only on the version of the data it is drawn from, the
+selected report and the selected year, so the whole output space is a few
+hundred figures.  ``FigureCache`` keeps rendered figures in an LRU store:
+
+* ``MemoryBackend`` -- per-process ``OrderedDict``.
+* ``DiskBackend`` -- JSON-encoded entries in a directory shared by every
+  gunicorn worker on the host.  Point it at ``/dev/shm`` to keep it in
+  shared memory.  Entries come back as plain component dicts, which Dash
+  accepts as callback output just like component objects.  Each entry has
+  its key beside it (``.key``) so entries can be discarded by key.
+
+Misses are single-flight: concurrent requests for the same figure wait for
+the one that renders it instead of rendering it again.  With the disk
+backend this holds across workers too, through a lock file per entry.
+A read-through source (``read_through``, e.g. a static bundle) is asked
+before a missing figure is rendered.
+
+Configured through ``FIGURE_CACHE_BACKEND`` (``memory``, ``disk`` or
+``off``), ``FIGURE_CACHE_DIR``, ``FIGURE_CACHE_SIZE`` and
+``FIGURE_CACHE_WARMUP``.
+"""
+import ast
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from plotly.io.json import to_json_plotly
+
+DEFAULT_SIZE = 256
+
+
+def entry_name(key):
+    """File name of ``key`` in a ``DiskBackend`` directory."""
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest() + '.json'
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers share its result."""
+
+    def __init__(self):
+        self.shared = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            call.value = function()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value
+
+
+class MemoryBackend:
+
+    def __init__(self, maxsize=DEFAULT_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._entries.move_to_end(key)
+            except KeyError:
+                return None
+            return self._entries[key]
+
+    def set(self, key, value):
+        evicted = 0
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    def discard(self, predicate):
+        """Drop the entries whose key matches ``predicate``; returns how many."""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def lock(self, key):
+        # Threads of this process are already serialized by SingleFlight
+        return contextlib.nullcontext()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskBackend:
+
+    def __init__(self, directory, maxsize=DEFAULT_SIZE):
+        self.directory = directory
+        self.maxsize = maxsize
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, entry_name(key))
+
+    def _entries(self, suffix='.json'):
+        return [e for e in os.scandir(self.directory) if e.name.endswith(suffix)]
+
+    def _remove(self, path):
+        """Delete the entry at ``path`` and its key; True if it existed.
+
+        The lock file stays, another process may be waiting on it.
+        """
+        try:
+            os.unlink(path[:-len('.json')] + '.key')
+        except FileNotFoundError:
+            pass
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as fh:
+                value = json.loads(fh.read())
+            # mtime doubles as the recency stamp for eviction
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return value
+
+    def _write(self, path, data):
+        fd, scratch = tempfile.mkstemp(prefix='.tmp-', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(data)
+            os.replace(scratch, path)
+        except BaseException:
+            if os.path.exists(scratch):
+                os.unlink(scratch)
+            raise
+
+    def set(self, key, value):
+        path = self._path(key)
+        # The key first, so an entry never exists without it
+        self._write(path[:-len('.json')] + '.key', repr(key).encode('utf-8'))
+        self._write(path, to_json_plotly(value).encode('utf-8'))
+
+        entries = self._entries()
+        evicted = 0
+        if len(entries) > self.maxsize:
+            entries.sort(key=lambda e: e.stat().st_mtime_ns)
+            for entry in entries[:len(entries) - self.maxsize]:
+                evicted += self._remove(entry.path)
+        return evicted
+
+    @contextlib.contextmanager
+    def lock(self, key):
+        """Exclusive lock on ``key`` across every process using the directory."""
+        fd = os.open(self._path(key)[:-len('.json')] + '.lock', os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            # Closing the descriptor releases the lock
+            os.close(fd)
+
+    def discard(self, predicate):
+        """Delete the entries whose key matches ``predicate``; returns how many."""
+        discarded = 0
+        for entry in self._entries('.key'):
+            try:
+                with open(entry.path, encoding='utf-8') as fh:
+                    key = ast.literal_eval(fh.read())
+            except (OSError, ValueError, SyntaxError):
+                continue
+            if predicate(key):
+                discarded += self._remove(entry.path[:-len('.key')] + '.json')
+        return discarded
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def __len__(self):
+        return len(self._entries())
+
+    def clear(self):
+        for entry in self._entries():
+            self._remove(entry.path)
+
+
+class FigureCache:
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.source = None
+        self._flight = SingleFlight()
+
+    @classmethod
+    def from_env(cls):
+        kind = os.environ.get('FIGURE_CACHE_BACKEND', 'memory')
+        maxsize = int(os.environ.get('FIGURE_CACHE_SIZE', DEFAULT_SIZE))
+        if kind == 'off':
+            return cls(None)
+        if kind == 'memory':
+            return cls(MemoryBackend(maxsize))
+        if kind == 'disk':
+            directory = os.environ.get('FIGURE_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'automobile-dashboard-figures')
+            return cls(DiskBackend(directory, maxsize))
+        raise ValueError(f'Unknown FIGURE_CACHE_BACKEND {kind!r}')
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def read_through(self, source):
+        """Look up misses in ``source.get(key)`` before rendering them."""
+        self.source = source
+
+    def _create(self, key, create):
+        if self.source is not None:
+            value = self.source.get(key)
+            if value is not None:
+                return value
+        return create()
+
+    def get_or_create(self, key, create):
+        if self.backend is None:
+            return self._flight.do(key, lambda: self._create(key, create))
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        return self._flight.do(key, lambda: self._fill(key, create))
+
+    def _fill(self, key, create):
+        with self.backend.lock(key):
+            # Another worker may have rendered it while this one waited
+            value = self.backend.get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            self.misses += 1
+            value = self._create(key, create)
+            self.evictions += self.backend.set(key, value)
+            return value
+
+    def warm(self, keys, create):
+        """Render every key not already cached (e.g. by another worker)."""
+        if self.backend is None:
+            return 0
+        rendered = 0
+        for key in keys:
+            if key not in self.backend:
+                self.evictions += self.backend.set(key, create(key))
+                rendered += 1
+        return rendered
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def discard(self, predicate):
+        """Drop the cached figures whose key matches ``predicate``."""
+        if self.backend is None:
+            return 0
+        return self.backend.discard(predicate)
+
+    def stats(self):
+        return {
+            'backend': type(self.backend).__name__ if self.backend is not None else None,
+            'size': len(self.backend) if self.backend is not None else 0,
+            'maxsize': self.backend.maxsize if self.backend is not None else 0,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            # Requests that waited for a render already in flight
+            'shared': self._flight.shared,
+        }
@@ -0,0 +1,31 @@
+"""gunicorn settings for the dashboard.
+
+    gunicorn -c gunicorn.conf.py historical_automobile_sales_dashboard:server
+
+The master publishes the dataset once to shared memory before forking, and
+every worker maps it read-only instead of loading a private copy.  Set
+SALES_SHARED_DATA_MODE=off to fall back to per-worker loading.
+"""
+import os
+
+import data_source
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8050')
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+
+
+def on_starting(server):
+    if os.environ.get('SALES_SHARED_DATA_MODE', 'on') == 'off':
+        return
+    # The SQL backends hold no rows in memory, so there is nothing to share
+    if os.environ.get('SALES_BACKEND', 'pandas') != 'pandas':
+        return
+    # Streamed ingest never holds the raw rows, and publishing would read
+    # the whole file into the master
+    if os.environ.get('SALES_INGEST') == 'stream':
+        return
+    path = data_source.publish_shared()
+    # Inherited by every worker forked after this point
+    os.environ['SALES_SHARED_DATA'] = path
+    server.log.info('Published shared dataset at %s', path)
@@ -1,22 +1,97 @@
+import json
+import os
+import threading
+from urllib.parse import parse_qs, urlencode
+
 import dash
 from dash import dcc
 from dash import html
-from dash.dependencies import Input, Output, State
+from dash import Patch, ctx, no_update
+from dash.dependencies import ALL, ClientsideFunction, Input, MATCH, Output, State
+from dash.exceptions import PreventUpdate
+import flask
+import numpy as np
 import pandas as pd
-import plotly.graph_objs as go
-import plotly.express as px
+from plotly.colors import qualitative, sequential
+
+from background import PooledDiskcacheManager
+from binning import Binning
+from cross_filter import CrossFilter
+from datasets import DatasetManager
+from downsample import LevelOfDetail
+from export import Exporter, aggregate_chunks, row_chunks
+from figure_builder import FigureBuilder, typed_array
+from figure_cache import FigureCache
+from metrics import Metrics
+from response_cache import OUTPUTS, ResponseCache
+from static_bundle import StaticBundle
+
+# The data behind the charts: the default dataset (SALES_DATA_PATH or
+# SALES_DATA_URL) and any others named by SALES_DATASETS, loaded on first use
+# and evicted when cold (datasets.py).  Each is swapped in place when its
+# source file changes, so callbacks read datasets.current(name) once and use
+# that snapshot throughout.  With DASHBOARD_STARTUP=lazy the default dataset
+# is loaded in the background and /ready reports when it is in memory.
+datasets = DatasetManager.from_env()
 
-# Load the data using pandas
-data = pd.read_csv(r'https://cf-courses-data.s3.us.cloud-object-storage.appdomain.cloud/IBMDeveloperSkillsNetwork-DV0101EN-SkillsNetwork/Data%20Files/historical_automobile_sales.csv')
+# How year changes in the Yearly Statistics view reach the charts:
+#   'full'       - the server re-renders the whole output container (default)
+#   'clientside' - the per-year aggregates are shipped once in a dcc.Store and
+#                  year changes are patched in the browser (assets/dashboard.js)
+#   'patch'      - the charts are persistent and year changes send only the
+#                  changed parts of each figure as Dash partial updates
+render_mode = os.environ.get('DASHBOARD_RENDER_MODE', 'full')
 
 # Initialize the Dash app
 app = dash.Dash(
     __name__,
     meta_tags=[{"name": "viewport", "content": "width=device-width, initial-scale=1"}],
+    # Callbacks may target charts that only exist once a view is rendered
+    suppress_callback_exceptions=render_mode != 'full',
 )
 
 server = app.server
 
+# Per-stage timings on /metrics (DASHBOARD_METRICS=1) and an optional
+# per-request trace log (DASHBOARD_TRACE_LOG)
+metrics = Metrics.from_env()
+metrics.init_app(server)
+
+# Rendered figures, keyed by (data version, statistics, year, chart)
+figure_cache = FigureCache.from_env()
+metrics.register_stats('figure_cache', figure_cache.stats)
+
+# Optional execution of the plotting callback as a background job on a
+# bounded process pool, one job per distinct request (BACKGROUND_CALLBACKS=1)
+background_manager = PooledDiskcacheManager.from_env(datasets.version)
+
+# Optional replay of encoded callback responses (RESPONSE_CACHE=1).  A
+# background callback answers with a job handle rather than the charts, so
+# there is nothing to replay in that mode.
+if background_manager is None:
+    response_cache = ResponseCache.from_env(datasets.version, outputs=OUTPUTS)
+else:
+    response_cache = None
+if response_cache is not None:
+    response_cache.init_app(server)
+    metrics.register_stats('response_cache', response_cache.stats)
+metrics.register_stats('dataset', datasets.get().stats)
+metrics.register_stats('datasets', datasets.stats)
+
+# Views exported by static_bundle.py, read through on a cache miss
+# (STATIC_BUNDLE).  Its responses are those of the full render mode.  Used
+# while the default dataset has the contents the bundle was built from.
+static_bundle = StaticBundle.from_env(datasets.sources[datasets.default])
+if static_bundle is not None:
+    metrics.register_stats('static_bundle', static_bundle.stats)
+    figure_cache.read_through(static_bundle.figures)
+    if response_cache is not None and static_bundle.render_mode == render_mode:
+        response_cache.read_through(static_bundle.responses)
+
+# Streamed downloads of the chart aggregates and filtered rows (/export)
+exporter = Exporter.from_env()
+metrics.register_stats('export', exporter.stats)
+
 # Set the title of the dashboard
 app.title = "Automobile Statistics Dashboard"
 
@@ -183,102 +258,563 @@ app.index_string = '''
 '''
 
 # Create the dropdown menu options
+dataset_options = [{'label': name, 'value': name} for name in datasets.names]
+
 dropdown_options = [
     {'label': 'Yearly Statistics', 'value': 'Yearly Statistics'},
-    {'label': 'Recession Period Statistics', 'value': 'Recession Period Statistics'}
+    {'label': 'Recession Period Statistics', 'value': 'Recession Period Statistics'},
+    {'label': 'Year Comparison', 'value': 'Year Comparison'}
 ]
 
 # List of years 
 year_list = [i for i in range(1980, 2024, 1)]
 
-# Create the layout of the app
-app.layout = html.Div(
-    className='dashboard-container',
-    children=[
-        # Dashboard Header
-        html.Div(
-            className='dashboard-header',
-            children=[
-                html.H1(
-                    "Automobile Sales Statistics Dashboard",
-                    style={
-                        'textAlign': 'center',
-                        'color': colors['accent'],
-                        'fontSize': '32px',
-                        'fontWeight': 'bold',
-                        'marginBottom': '5px',
-                    }
-                ),
-                html.P(
-                    "Analyze historical automobile sales trends and patterns",
-                    style={
-                        'textAlign': 'center',
-                        'color': colors['secondary_text'],
-                        'fontSize': '16px',
-                        'marginTop': '0',
-                    }
-                ),
-            ]
-        ),
-        
-        # Controls Container
+# Resolution of the whole-period line charts (chart 1 of both reports)
+granularity_options = [
+    {'label': 'Yearly', 'value': 'Year'},
+    {'label': 'Monthly', 'value': 'Month'},
+    {'label': 'Daily', 'value': 'Day'},
+]
+
+# Recession flag of the cross filter
+period_options = [
+    {'label': 'All periods', 'value': 'all'},
+    {'label': 'Recession', 'value': 'recession'},
+    {'label': 'Non-recession', 'value': 'non-recession'},
+]
+period_recession = {'all': None, 'recession': 1, 'non-recession': 0}
+
+# What the Download button exports, and in which format
+export_content_options = [
+    {'label': 'Chart data', 'value': 'aggregates'},
+    {'label': 'Filtered rows', 'value': 'rows'},
+]
+export_format_labels = {'csv': 'CSV', 'parquet': 'Parquet', 'arrow': 'Arrow IPC'}
+
+def filter_summary(where):
+    if not where:
+        return "None. Click a bar, slice or point to filter the other charts."
+    return where.describe()
+
+# Welcome message shown until a report (and year, if applicable) is selected
+welcome_style = {
+    'textAlign': 'center',
+    'padding': '50px 20px',
+    'backgroundColor': colors['secondary_background'],
+    'borderRadius': '10px',
+    'marginTop': '20px',
+    'position': 'relative',  # Add positioning context
+    'zIndex': 1,  # Base z-index
+}
+
+def welcome_message():
+    return html.Div(
+        id='welcome-message',
+        style=welcome_style,
+        children=[
+            html.H3(
+                "Welcome to the Automobile Sales Dashboard",
+                style={'color': colors['text'], 'marginBottom': '15px'}
+            ),
+            html.P(
+                "Please select a report type and year (if applicable) to view the statistics.",
+                style={'color': colors['secondary_text']}
+            ),
+            html.Div(
+                style={
+                    'marginTop': '30px',
+                    'display': 'flex',
+                    'justifyContent': 'center',
+                    'gap': '20px',
+                },
+                children=[
+                    html.Div(
+                        style={
+                            'backgroundColor': colors['card_background'],
+                            'padding': '15px 25px',
+                            'borderRadius': '5px',
+                            'textAlign': 'center',
+                            'boxShadow': '0 2px 4px rgba(0,0,0,0.1)',
+                        },
+                        children=[
+                            html.P("Yearly Statistics", style={'color': colors['accent'], 'fontWeight': 'bold'}),
+                            html.P("View sales data for a specific year", style={'color': colors['secondary_text']})
+                        ]
+                    ),
+                    html.Div(
+                        style={
+                            'backgroundColor': colors['card_background'],
+                            'padding': '15px 25px',
+                            'borderRadius': '5px',
+                            'textAlign': 'center',
+                            'boxShadow': '0 2px 4px rgba(0,0,0,0.1)',
+                        },
+                        children=[
+                            html.P("Recession Statistics", style={'color': colors['accent_secondary'], 'fontWeight': 'bold'}),
+                            html.P("Analyze sales during recession periods", style={'color': colors['secondary_text']})
+                        ]
+                    )
+                ]
+            )
+        ]
+    )
+
+def graph(graph_id, figure):
+    return dcc.Graph(
+        id=graph_id,
+        config={'displayModeBar': False, 'responsive': True},
+        figure=figure
+    )
+
+# Charts whose clicks set the cross filter get pattern-matching IDs, so one
+# callback (update_cross_filter) hears all of them; ``year`` keeps the
+# per-year remount of the yearly charts
+def filter_graph_id(chart, year=''):
+    return {'type': 'filter-chart', 'chart': chart, 'year': year}
+
+# The dimension a click on each chart filters the other charts by
+filter_dimensions = {
+    'recession-chart1': 'Year',
+    'recession-chart2': 'Vehicle_Type',
+    'recession-chart3': 'Vehicle_Type',
+    'yearly-chart1': 'Year',
+    'yearly-chart2': 'Month',
+    'yearly-chart3': 'Vehicle_Type',
+    'yearly-chart4': 'Vehicle_Type',
+}
+
+# Dimensions each chart leaves out of the cross filter: the one it is
+# grouped by, so it keeps every value on screen to click, and the ones its
+# report already fixes (the recession flag, the selected year)
+filter_exclusions = {
+    'recession-chart1': ('Year', 'Recession'),
+    'recession-chart2': ('Vehicle_Type', 'Recession'),
+    'recession-chart3': ('Vehicle_Type', 'Recession'),
+    'recession-chart4': ('Recession',),
+    'yearly-chart1': ('Year',),
+    'yearly-chart2': ('Month',),
+    'yearly-chart3': ('Vehicle_Type', 'Year'),
+    'yearly-chart4': ('Vehicle_Type', 'Year'),
+}
+
+def chart_filter(chart, where):
+    return where.without(*filter_exclusions[chart])
+
+# Filtered charts are cached apart from the unfiltered ones, whose keys
+# stay as they were
+def filtered_key(key, where):
+    return key + (where.key,) if where else key
+
+# Persistent chart slots for DASHBOARD_RENDER_MODE=patch.  Both reports draw
+# into the same four graphs, which are never unmounted; callbacks only send
+# the parts of each figure that changed.
+chart_slots = ['output-chart1', 'output-chart2', 'output-chart3', 'output-chart4']
+
+def persistent_output_children():
+    return [
+        welcome_message(),
         html.Div(
-            className='controls-container',
+            id='charts-container',
+            style={'display': 'none'},
             children=[
-                # Report Type Dropdown
                 html.Div(
-                    className='control-item',
+                    className='chart-row',
                     children=[
-                        html.Label(
-                            "Select Statistics:",
-                            style={
-                                'marginBottom': '10px',
-                                'fontSize': '16px',
-                                'fontWeight': 'normal',
-                                'color': colors['text'],
-                            }
-                        ),
-                        dcc.Dropdown(
-                            id='dropdown-statistics',
-                            options=dropdown_options,
-                            value='Select Statistics',
-                            placeholder='Select a report type',
-                            clearable=False,
-                        )
+                        html.Div(className='chart-item', children=[graph(chart_slots[0], {})]),
+                        html.Div(className='chart-item', children=[graph(chart_slots[1], {})])
                     ]
                 ),
-                
-                # Year Selection Dropdown
                 html.Div(
-                    className='control-item',
+                    className='chart-row',
                     children=[
-                        html.Label(
-                            "Select Year:",
-                            style={
-                                'marginBottom': '10px',
-                                'fontSize': '16px',
-                                'fontWeight': 'normal',
-                                'color': colors['text'],
-                            }
-                        ),
-                        dcc.Dropdown(
-                            id='select-year',
-                            options=[{'label': i, 'value': i} for i in year_list],
-                            value='Select Year',
-                            clearable=False,
-                        )
+                        html.Div(className='chart-item', children=[graph(chart_slots[2], {})]),
+                        html.Div(className='chart-item', children=[graph(chart_slots[3], {})])
                     ]
                 ),
             ]
         ),
-        
-        # Output Container
-        html.Div(
-            id='output-container',
-            className='chart-grid',
-        )
+        # The (statistics, year) currently drawn in the chart slots
+        dcc.Store(id='rendered-view'),
+        # Zoom events of the first slot with its width (see lod_graph)
+        dcc.Store(id='lod-request'),
     ]
+
+# The layout is built per page load rather than at import, so a worker
+# starts serving without constructing it, and each page gets the per-year
+# series of the current data in the clientside mode
+def serve_layout():
+    layout = html.Div(
+        className='dashboard-container',
+        children=[
+            # Dashboard Header
+            html.Div(
+                className='dashboard-header',
+                children=[
+                    html.H1(
+                        "Automobile Sales Statistics Dashboard",
+                        style={
+                            'textAlign': 'center',
+                            'color': colors['accent'],
+                            'fontSize': '32px',
+                            'fontWeight': 'bold',
+                            'marginBottom': '5px',
+                        }
+                    ),
+                    html.P(
+                        "Analyze historical automobile sales trends and patterns",
+                        style={
+                            'textAlign': 'center',
+                            'color': colors['secondary_text'],
+                            'fontSize': '16px',
+                            'marginTop': '0',
+                        }
+                    ),
+                ]
+            ),
+            
+            # Picks up ?dataset=name from the page URL
+            dcc.Location(id='url', refresh=False),
+
+            # Controls Container
+            html.Div(
+                className='controls-container',
+                children=[
+                    # Dataset Dropdown, shown when there is more than one
+                    html.Div(
+                        className='control-item',
+                        style=None if len(dataset_options) > 1 else {'display': 'none'},
+                        children=[
+                            html.Label(
+                                "Select Dataset:",
+                                style={
+                                    'marginBottom': '10px',
+                                    'fontSize': '16px',
+                                    'fontWeight': 'normal',
+                                    'color': colors['text'],
+                                }
+                            ),
+                            dcc.Dropdown(
+                                id='dropdown-dataset',
+                                options=dataset_options,
+                                value=datasets.default,
+                                clearable=False,
+                            )
+                        ]
+                    ),
+
+                    # Report Type Dropdown
+                    html.Div(
+                        className='control-item',
+                        children=[
+                            html.Label(
+                                "Select Statistics:",
+                                style={
+                                    'marginBottom': '10px',
+                                    'fontSize': '16px',
+                                    'fontWeight': 'normal',
+                                    'color': colors['text'],
+                                }
+                            ),
+                            dcc.Dropdown(
+                                id='dropdown-statistics',
+                                options=dropdown_options,
+                                value='Select Statistics',
+                                placeholder='Select a report type',
+                                clearable=False,
+                            )
+                        ]
+                    ),
+                    
+                    # Year Selection Dropdown
+                    html.Div(
+                        className='control-item',
+                        children=[
+                            html.Label(
+                                "Select Year:",
+                                style={
+                                    'marginBottom': '10px',
+                                    'fontSize': '16px',
+                                    'fontWeight': 'normal',
+                                    'color': colors['text'],
+                                }
+                            ),
+                            dcc.Dropdown(
+                                id='select-year',
+                                options=[{'label': i, 'value': i} for i in year_list],
+                                value='Select Year',
+                                clearable=False,
+                            )
+                        ]
+                    ),
+
+                    # Granularity Dropdown
+                    html.Div(
+                        className='control-item',
+                        children=[
+                            html.Label(
+                                "Select Granularity:",
+                                style={
+                                    'marginBottom': '10px',
+                                    'fontSize': '16px',
+                                    'fontWeight': 'normal',
+                                    'color': colors['text'],
+                                }
+                            ),
+                            dcc.Dropdown(
+                                id='select-granularity',
+                                options=granularity_options,
+                                value='Year',
+                                clearable=False,
+                            )
+                        ]
+                    ),
+
+                    # Years to compare in the Year Comparison report
+                    html.Div(
+                        className='control-item',
+                        children=[
+                            html.Label(
+                                "Compare Years:",
+                                style={
+                                    'marginBottom': '10px',
+                                    'fontSize': '16px',
+                                    'fontWeight': 'normal',
+                                    'color': colors['text'],
+                                }
+                            ),
+                            dcc.Dropdown(
+                                id='compare-years',
+                                options=[{'label': i, 'value': i} for i in year_list],
+                                value=[],
+                                multi=True,
+                                disabled=True,
+                                placeholder='Select years to compare',
+                            )
+                        ]
+                    ),
+                ]
+            ),
+            
+            # Cross filter set by clicking the charts
+            html.Div(
+                className='controls-container',
+                children=[
+                    html.Div(
+                        className='control-item',
+                        children=[
+                            html.Label(
+                                "Filters:",
+                                style={
+                                    'marginBottom': '10px',
+                                    'fontSize': '16px',
+                                    'fontWeight': 'normal',
+                                    'color': colors['text'],
+                                }
+                            ),
+                            html.Div(
+                                id='filter-summary',
+                                children=filter_summary(CrossFilter()),
+                                style={'color': colors['secondary_text']},
+                            ),
+                        ]
+                    ),
+                    html.Div(
+                        className='control-item',
+                        children=[
+                            html.Label(
+                                "Period:",
+                                style={
+                                    'marginBottom': '10px',
+                                    'fontSize': '16px',
+                                    'fontWeight': 'normal',
+                                    'color': colors['text'],
+                                }
+                            ),
+                            dcc.RadioItems(
+                                id='filter-period',
+                                options=period_options,
+                                value='all',
+                                inline=True,
+                                inputStyle={'marginRight': '5px', 'marginLeft': '10px'},
+                            ),
+                        ]
+                    ),
+                    html.Div(
+                        className='control-item',
+                        style={'display': 'flex', 'alignItems': 'flex-end'},
+                        children=[
+                            html.Button(
+                                "Clear Filters",
+                                id='clear-filters',
+                                n_clicks=0,
+                                style={
+                                    'backgroundColor': colors['card_background'],
+                                    'color': colors['text'],
+                                    'border': f"1px solid {colors['accent']}",
+                                    'borderRadius': '5px',
+                                    'padding': '8px 16px',
+                                    'cursor': 'pointer',
+                                },
+                            ),
+                        ]
+                    ),
+                ]
+            ),
+            dcc.Store(id='cross-filter'),
+
+            # Download of the numbers behind the current view
+            html.Div(
+                className='controls-container',
+                children=[
+                    html.Div(
+                        className='control-item',
+                        children=[
+                            html.Label(
+                                "Export:",
+                                style={
+                                    'marginBottom': '10px',
+                                    'fontSize': '16px',
+                                    'fontWeight': 'normal',
+                                    'color': colors['text'],
+                                }
+                            ),
+                            dcc.Dropdown(
+                                id='export-content',
+                                options=export_content_options,
+                                value='aggregates',
+                                clearable=False,
+                            ),
+                        ]
+                    ),
+                    html.Div(
+                        className='control-item',
+                        children=[
+                            html.Label(
+                                "Format:",
+                                style={
+                                    'marginBottom': '10px',
+                                    'fontSize': '16px',
+                                    'fontWeight': 'normal',
+                                    'color': colors['text'],
+                                }
+                            ),
+                            dcc.Dropdown(
+                                id='export-format',
+                                options=[{'label': export_format_labels[fmt], 'value': fmt} for fmt in exporter.formats],
+                                value='csv',
+                                clearable=False,
+                            ),
+                        ]
+                    ),
+                    html.Div(
+                        className='control-item',
+                        style={'display': 'flex', 'alignItems': 'flex-end'},
+                        children=[
+                            # A plain link, so the browser streams the file
+                            # to disk instead of receiving it in a callback
+                            html.A(
+                                "Download",
+                                id='export-link',
+                                href='/export',
+                                style={
+                                    'backgroundColor': colors['card_background'],
+                                    'color': colors['text'],
+                                    'border': f"1px solid {colors['accent']}",
+                                    'borderRadius': '5px',
+                                    'padding': '8px 16px',
+                                    'textDecoration': 'none',
+                                },
+                            ),
+                        ]
+                    ),
+                ]
+            ),
+
+            # Output Container
+            html.Div(
+                id='output-container',
+                className='chart-grid',
+                children=persistent_output_children() if render_mode == 'patch' else None,
+            )
+        ]
+    )
+    if render_mode == 'clientside':
+        layout.children.extend([
+            dcc.Store(id='yearly-aggregates', data=yearly_store(datasets.default, datasets.current())),
+            # The year the server should render; only set when it has to
+            dcc.Store(id='server-year'),
+        ])
+    return layout
+
+app.layout = serve_layout
+
+# Per-year series for the clientside Yearly Statistics charts
+def yearly_store_data(cube):
+    years = {}
+    for year in cube.years:
+        sales = cube.series('Automobile_Sales', 'Vehicle_Type', year=year)
+        expenditure = cube.series('Advertising_Expenditure', 'Vehicle_Type', stat='sum', year=year)
+        years[str(year)] = {
+            'sales': {
+                'x': sales['Vehicle_Type'].tolist(),
+                'y': sales['Automobile_Sales'].tolist(),
+            },
+            'expenditure': {
+                'labels': expenditure['Vehicle_Type'].tolist(),
+                'values': expenditure['Advertising_Expenditure'].tolist(),
+            },
+        }
+    return {'years': years}
+
+# Computed once per dataset and data version; pages loaded after a data
+# refresh get the new per-year series
+_yearly_store = {}
+
+def yearly_store(name, snapshot):
+    version, data = _yearly_store.get(name, (None, None))
+    if version != snapshot.version:
+        data = yearly_store_data(snapshot.cube)
+        _yearly_store[name] = (snapshot.version, data)
+    return data
+
+# The per-year series of another dataset, when one is picked
+if render_mode == 'clientside':
+    @app.callback(
+        Output(component_id='yearly-aggregates', component_property='data'),
+        Input(component_id='dropdown-dataset', component_property='value'),
+        prevent_initial_call=True
+    )
+    def update_yearly_aggregates(dataset_name):
+        name = datasets.resolve(dataset_name)
+        return yearly_store(name, datasets.current(name))
+
+# A dataset named in the page URL (?dataset=name) is selected on load
+@app.callback(
+    Output(component_id='dropdown-dataset', component_property='value'),
+    Input(component_id='url', component_property='search')
 )
+def select_dataset_from_url(search):
+    name = parse_qs((search or '').lstrip('?')).get('dataset', [None])[0]
+    if name not in datasets.sources:
+        raise PreventUpdate
+    return name
+
+# What an evicted dataset leaves behind: its cached figures (keyed by its
+# data versions), its cached responses and its clientside per-year series.
+# The cube memos go with its snapshots.
+def key_versions(key):
+    versions = key[0]
+    return set(versions) if isinstance(versions, tuple) else {versions}
+
+def forget_dataset(name, evicted):
+    snapshot = evicted.current
+    versions = {snapshot.version, snapshot.recession_version, *snapshot.year_versions.values()}
+    figure_cache.discard(lambda key: bool(key_versions(key) & versions))
+    if response_cache is not None:
+        response_cache.discard(name)
+    _yearly_store.pop(name, None)
+
+datasets.on_evict(forget_dataset)
 
 # Define the callback function to update the input container based on the selected statistics
 @app.callback(
@@ -291,189 +827,623 @@ def update_input_container(selected_statistics):
     else: 
         return True
 
-# Callback for plotting
 @app.callback(
-    Output(component_id='output-container', component_property='children'),
-    [Input(component_id='select-year', component_property='value'), 
-     Input(component_id='dropdown-statistics', component_property='value')]
+    Output(component_id='compare-years', component_property='disabled'),
+    Input(component_id='dropdown-statistics', component_property='value')
 )
-def update_output_container(input_year, selected_statistics):
-    # Clear the output container on new selections
-    if not selected_statistics or (selected_statistics == 'Yearly Statistics' and not input_year):
-        # Return default/welcome message
-        return html.Div(
-            style={
-                'textAlign': 'center',
-                'padding': '50px 20px',
-                'backgroundColor': colors['secondary_background'],
-                'borderRadius': '10px',
-                'marginTop': '20px',
-                'position': 'relative',  # Add positioning context
-                'zIndex': 1,  # Base z-index
-            },
-            children=[
-                html.H3(
-                    "Welcome to the Automobile Sales Dashboard",
-                    style={'color': colors['text'], 'marginBottom': '15px'}
-                ),
-                html.P(
-                    "Please select a report type and year (if applicable) to view the statistics.",
-                    style={'color': colors['secondary_text']}
-                ),
-                html.Div(
-                    style={
-                        'marginTop': '30px',
-                        'display': 'flex',
-                        'justifyContent': 'center',
-                        'gap': '20px',
-                    },
-                    children=[
-                        html.Div(
-                            style={
-                                'backgroundColor': colors['card_background'],
-                                'padding': '15px 25px',
-                                'borderRadius': '5px',
-                                'textAlign': 'center',
-                                'boxShadow': '0 2px 4px rgba(0,0,0,0.1)',
-                            },
-                            children=[
-                                html.P("Yearly Statistics", style={'color': colors['accent'], 'fontWeight': 'bold'}),
-                                html.P("View sales data for a specific year", style={'color': colors['secondary_text']})
-                            ]
-                        ),
-                        html.Div(
-                            style={
-                                'backgroundColor': colors['card_background'],
-                                'padding': '15px 25px',
-                                'borderRadius': '5px',
-                                'textAlign': 'center',
-                                'boxShadow': '0 2px 4px rgba(0,0,0,0.1)',
-                            },
-                            children=[
-                                html.P("Recession Statistics", style={'color': colors['accent_secondary'], 'fontWeight': 'bold'}),
-                                html.P("Analyze sales during recession periods", style={'color': colors['secondary_text']})
-                            ]
-                        )
-                    ]
-                )
-            ]
-        )
-    
-    # Common graph layout settings
-    graph_layout = {
-        'paper_bgcolor': colors['card_background'],
-        'plot_bgcolor': colors['card_background'],
-        'font': {'color': colors['text']},
-        'title_font': {'color': colors['text'], 'size': 16},
-        'legend_font': {'color': colors['text']},
-        'xaxis': {
-            'gridcolor': colors['grid'],
-            'title_font': {'color': colors['text']},
-            'tickfont': {'color': colors['text']},
-        },
-        'yaxis': {
-            'gridcolor': colors['grid'],
-            'title_font': {'color': colors['text']},
-            'tickfont': {'color': colors['text']},
-        },
-        'margin': {'t': 50, 'b': 50, 'l': 50, 'r': 30},
+def update_compare_container(selected_statistics):
+    return selected_statistics != 'Year Comparison'
+
+# The recession report fixes the recession flag, and the comparison report
+# is not cross-filtered
+@app.callback(
+    Output(component_id='filter-period', component_property='options'),
+    Input(component_id='dropdown-statistics', component_property='value')
+)
+def update_period_container(selected_statistics):
+    disabled = selected_statistics in ('Recession Period Statistics', 'Year Comparison')
+    return [dict(option, disabled=disabled) for option in period_options]
+
+# Common graph layout settings
+graph_layout = {
+    'paper_bgcolor': colors['card_background'],
+    'plot_bgcolor': colors['card_background'],
+    'font': {'color': colors['text']},
+    'title_font': {'color': colors['text'], 'size': 16},
+    'legend_font': {'color': colors['text']},
+    'xaxis': {
+        'gridcolor': colors['grid'],
+        'title_font': {'color': colors['text']},
+        'tickfont': {'color': colors['text']},
+    },
+    'yaxis': {
+        'gridcolor': colors['grid'],
+        'title_font': {'color': colors['text']},
+        'tickfont': {'color': colors['text']},
+    },
+    'margin': {'t': 50, 'b': 50, 'l': 50, 'r': 30},
+}
+
+# Figures are written as dicts from a precompiled layout unless
+# FIGURE_BUILDER=px asks for the Plotly Express path
+if os.environ.get('FIGURE_BUILDER', 'dict') == 'px':
+    figure_builder = None
+else:
+    figure_builder = FigureBuilder(graph_layout, template='plotly_dark')
+
+
+def _px():
+    # Imported on first use rather than at startup; it takes a good part of
+    # the import time, and the dict path never needs it
+    import plotly.express as px
+    return px
+
+# Points drawn by the monthly and daily line charts, from the visible range
+# and the chart width the browser reports (LOD_METHOD; LOD_WIDTH until then)
+lod = LevelOfDetail.from_env()
+
+# Bins of the continuous drivers on the x-axis of bar charts, so their
+# group count does not grow with the data (BINNING_METHOD, BINNING_BINS)
+binning = Binning.from_env()
+
+# Legend placement of the donut charts
+pie_legend = dict(
+    orientation="h",
+    yanchor="bottom",
+    y=-0.15,
+    xanchor="center",
+    x=0.5
+)
+
+# The monthly and daily charts have a date axis; the year marker sits in
+# the middle of the year
+def year_marker_x(input_year, granularity):
+    return input_year if granularity == 'Year' else f'{input_year}-07-01'
+
+def year_marker(input_year, granularity, y1):
+    return {
+        'line': {'color': colors['accent_secondary'], 'dash': 'dot', 'width': 2},
+        'type': 'line',
+        'x0': year_marker_x(input_year, granularity),
+        'x1': year_marker_x(input_year, granularity),
+        'y0': 0,
+        'y1': y1,
     }
-    
-    if selected_statistics == 'Recession Period Statistics':
-        # Filter the data for recession periods
-        recession_data = data[data['Recession'] == 1]
-        
-        # Plot 1: Automobile sales fluctuate over Recession Period (year wise)
-        yearly_rec = recession_data.groupby('Year')['Automobile_Sales'].mean().reset_index()
-        R_chart1 = dcc.Graph(
-            id='recession-chart1',  # Add unique ID
-            config={'displayModeBar': False, 'responsive': True},
-            figure=px.line(
-                yearly_rec, 
-                x='Year',
-                y='Automobile_Sales',
-                title="Average Automobile Sales During Recession Periods",
-                template="plotly_dark",
-                line_shape='spline',  # Smooth line
-                color_discrete_sequence=[colors['accent']]
-            ).update_layout(
-                **graph_layout,
-                xaxis_title='Year',
-                yaxis_title='Average Sales',
-                title_x=0.5
-            )
+
+# Whole-period line at monthly or daily granularity.  Only as many points as
+# the chart can show are sent; zooming in fetches the visible window at the
+# same density (lod_window).  Straight segments, since a spline through
+# thousands of points costs the browser far more and looks the same.
+def timeseries_chart(cube, granularity, title, recession=None, input_year=None, where=None):
+    watch = metrics.stopwatch()
+    series = cube.timeseries(granularity, recession=recession, where=where)
+    dates, sales = lod.window(series['Date'].to_numpy(), series['Automobile_Sales'].to_numpy())
+    frame = pd.DataFrame({'Date': dates, 'Automobile_Sales': sales})
+    watch.lap('aggregate')
+    shapes = []
+    if input_year is not None:
+        shapes.append(year_marker(input_year, granularity, series['Automobile_Sales'].max() * 1.1))
+    if figure_builder is not None:
+        figure = figure_builder.line(
+            frame, x='Date', y='Automobile_Sales', title=title,
+            color=colors['accent'], xaxis_title='Date', yaxis_title='Average Sales',
+            shapes=shapes, line_shape='linear'
         )
+        # Keep the user's zoom when the window's points are swapped in
+        figure['layout']['uirevision'] = granularity
+        watch.lap('figure')
+        return figure
+    figure = _px().line(
+        frame,
+        x='Date',
+        y='Automobile_Sales',
+        title=title,
+        template="plotly_dark",
+        line_shape='linear',
+        render_mode='svg',  # The level of detail keeps the points few enough
+        color_discrete_sequence=[colors['accent']]
+    )
+    watch.lap('figure')
+    figure.update_layout(
+        **graph_layout,
+        xaxis_title='Date',
+        yaxis_title='Average Sales',
+        title_x=0.5,
+        shapes=shapes,
+        uirevision=granularity
+    )
+    watch.lap('layout')
+    return figure
 
-        # Plot 2: Calculate the average number of vehicles sold by vehicle type
-        average_sales = recession_data.groupby('Vehicle_Type')['Automobile_Sales'].mean().reset_index()
-        R_chart2 = dcc.Graph(
-            id='recession-chart2',  # Add unique ID
-            config={'displayModeBar': False, 'responsive': True},
-            figure=px.bar(
-                average_sales, 
-                x='Vehicle_Type',
-                y='Automobile_Sales',
-                title="Average Sales by Vehicle Type During Recessions",
-                template="plotly_dark",
-                color_discrete_sequence=[colors['accent_secondary']]
-            ).update_layout(
-                **graph_layout,
-                xaxis_title='Vehicle Type',
-                yaxis_title='Average Sales',
-                title_x=0.5
-            )
+# Recession Period Statistics Report Plots
+def recession_chart1(cube, granularity='Year', where=None):
+    # Plot 1: Automobile sales fluctuate over Recession Period (year wise)
+    if granularity != 'Year':
+        return timeseries_chart(cube, granularity, "Average Automobile Sales During Recession Periods", recession=1, where=where)
+    watch = metrics.stopwatch()
+    yearly_rec = cube.series('Automobile_Sales', 'Year', recession=1, where=where)
+    watch.lap('aggregate')
+    if figure_builder is not None:
+        figure = figure_builder.line(
+            yearly_rec, x='Year', y='Automobile_Sales',
+            title="Average Automobile Sales During Recession Periods",
+            color=colors['accent'], xaxis_title='Year', yaxis_title='Average Sales'
         )
-        
-        # Plot 3: Pie chart for total expenditure share by vehicle type during recessions
-        exp_rec = recession_data.groupby('Vehicle_Type')['Advertising_Expenditure'].sum().reset_index()
-        R_chart3 = dcc.Graph(
-            id='recession-chart3',  # Add unique ID
-            config={'displayModeBar': False, 'responsive': True},
-            figure=px.pie(
-                exp_rec,
-                values='Advertising_Expenditure',
-                names='Vehicle_Type',
-                title="Ad Expenditure by Vehicle Type During Recessions",
-                template="plotly_dark",
-                color_discrete_sequence=px.colors.sequential.Blues_r,
-                hole=0.4  # Create a donut chart for better appearance
-            ).update_layout(
-                **graph_layout,
-                title_x=0.5,
-                legend=dict(
-                    orientation="h",
-                    yanchor="bottom",
-                    y=-0.15,
-                    xanchor="center",
-                    x=0.5
-                )
-            )
+        watch.lap('figure')
+        return figure
+    figure = _px().line(
+        yearly_rec, 
+        x='Year',
+        y='Automobile_Sales',
+        title="Average Automobile Sales During Recession Periods",
+        template="plotly_dark",
+        line_shape='spline',  # Smooth line
+        color_discrete_sequence=[colors['accent']]
+    )
+    watch.lap('figure')
+    figure.update_layout(
+        **graph_layout,
+        xaxis_title='Year',
+        yaxis_title='Average Sales',
+        title_x=0.5
+    )
+    watch.lap('layout')
+    return figure
+
+def recession_chart2(cube, where=None):
+    # Plot 2: Calculate the average number of vehicles sold by vehicle type
+    watch = metrics.stopwatch()
+    average_sales = cube.series('Automobile_Sales', 'Vehicle_Type', recession=1, where=where)
+    watch.lap('aggregate')
+    if figure_builder is not None:
+        figure = figure_builder.bar(
+            average_sales, x='Vehicle_Type', y='Automobile_Sales',
+            title="Average Sales by Vehicle Type During Recessions",
+            color=colors['accent_secondary'], xaxis_title='Vehicle Type', yaxis_title='Average Sales'
         )
+        watch.lap('figure')
+        return figure
+    figure = _px().bar(
+        average_sales, 
+        x='Vehicle_Type',
+        y='Automobile_Sales',
+        title="Average Sales by Vehicle Type During Recessions",
+        template="plotly_dark",
+        color_discrete_sequence=[colors['accent_secondary']]
+    )
+    watch.lap('figure')
+    figure.update_layout(
+        **graph_layout,
+        xaxis_title='Vehicle Type',
+        yaxis_title='Average Sales',
+        title_x=0.5
+    )
+    watch.lap('layout')
+    return figure
 
-        # Plot 4: Bar chart for the effect of unemployment rate on vehicle type and sales
-        unemp = recession_data.groupby(['Vehicle_Type', 'unemployment_rate'])['Automobile_Sales'].mean().reset_index()
-        R_chart4 = dcc.Graph(
-            id='recession-chart4',  # Add unique ID
-            config={'displayModeBar': False, 'responsive': True},
-            figure=px.bar(
-                unemp,
-                x='unemployment_rate',
-                y='Automobile_Sales',
-                color="Vehicle_Type",
-                title="Effect of Unemployment Rate on Vehicle Sales",
-                template="plotly_dark",
-                color_discrete_sequence=px.colors.sequential.Blues_r,
-                barmode='group'
-            ).update_layout(
-                **graph_layout,
-                xaxis_title='Unemployment Rate',
-                yaxis_title='Average Sales',
-                title_x=0.5,
-                legend_title_text='Vehicle Type'
-            )
+def recession_chart3(cube, where=None):
+    # Plot 3: Pie chart for total expenditure share by vehicle type during recessions
+    watch = metrics.stopwatch()
+    exp_rec = cube.series('Advertising_Expenditure', 'Vehicle_Type', stat='sum', recession=1, where=where)
+    watch.lap('aggregate')
+    if figure_builder is not None:
+        figure = figure_builder.pie(
+            exp_rec, values='Advertising_Expenditure', names='Vehicle_Type',
+            title="Ad Expenditure by Vehicle Type During Recessions",
+            colors=sequential.Blues_r, hole=0.4, legend=pie_legend
+        )
+        watch.lap('figure')
+        return figure
+    figure = _px().pie(
+        exp_rec,
+        values='Advertising_Expenditure',
+        names='Vehicle_Type',
+        title="Ad Expenditure by Vehicle Type During Recessions",
+        template="plotly_dark",
+        color_discrete_sequence=sequential.Blues_r,
+        hole=0.4  # Create a donut chart for better appearance
+    )
+    watch.lap('figure')
+    figure.update_layout(
+        **graph_layout,
+        title_x=0.5,
+        legend=pie_legend
+    )
+    watch.lap('layout')
+    return figure
+
+def recession_chart4(cube, where=None):
+    # Plot 4: Bar chart for the effect of unemployment rate on vehicle type and sales
+    watch = metrics.stopwatch()
+    unemp = cube.by_driver('unemployment_rate', binning, recession=1, where=where)
+    watch.lap('aggregate')
+    if figure_builder is not None:
+        figure = figure_builder.grouped_bar(
+            unemp, x='unemployment_rate', y='Automobile_Sales', group='Vehicle_Type',
+            title="Effect of Unemployment Rate on Vehicle Sales",
+            colors=sequential.Blues_r, xaxis_title='Unemployment Rate',
+            yaxis_title='Average Sales', legend_title='Vehicle Type'
+        )
+        watch.lap('figure')
+        return figure
+    figure = _px().bar(
+        unemp,
+        x='unemployment_rate',
+        y='Automobile_Sales',
+        color="Vehicle_Type",
+        title="Effect of Unemployment Rate on Vehicle Sales",
+        template="plotly_dark",
+        color_discrete_sequence=sequential.Blues_r,
+        barmode='group'
+    )
+    watch.lap('figure')
+    figure.update_layout(
+        **graph_layout,
+        xaxis_title='Unemployment Rate',
+        yaxis_title='Average Sales',
+        title_x=0.5,
+        legend_title_text='Vehicle Type'
+    )
+    watch.lap('layout')
+    return figure
+
+# Yearly Statistic Report Plots
+def yearly_chart1(cube, input_year, granularity='Year', where=None):
+    # Plot 1: Yearly Automobile sales using line chart for the whole period
+    if granularity != 'Year':
+        return timeseries_chart(cube, granularity, "Average Automobile Sales (1980-2023)", input_year=input_year, where=where)
+    watch = metrics.stopwatch()
+    yas = cube.series('Automobile_Sales', 'Year', where=where)
+    watch.lap('aggregate')
+    if figure_builder is not None:
+        figure = figure_builder.line(
+            yas, x='Year', y='Automobile_Sales',
+            title="Average Automobile Sales (1980-2023)",
+            color=colors['accent'], xaxis_title='Year', yaxis_title='Average Sales',
+            shapes=[year_marker(input_year, granularity, yas['Automobile_Sales'].max() * 1.1)]  # Highlight selected year
+        )
+        watch.lap('figure')
+        return figure
+    figure = _px().line(
+        yas, 
+        x='Year',
+        y='Automobile_Sales',
+        title="Average Automobile Sales (1980-2023)",
+        template="plotly_dark",
+        line_shape='spline',  # Smooth line
+        color_discrete_sequence=[colors['accent']]
+    )
+    watch.lap('figure')
+    figure.update_layout(
+        **graph_layout,
+        xaxis_title='Year',
+        yaxis_title='Average Sales',
+        title_x=0.5
+    ).add_shape(  # Highlight selected year
+        type="line",
+        x0=input_year,
+        y0=0,
+        x1=input_year,
+        y1=yas['Automobile_Sales'].max() * 1.1,
+        line=dict(color=colors['accent_secondary'], width=2, dash="dot")
+    )
+    watch.lap('layout')
+    return figure
+
+def yearly_chart2(cube, where=None):
+    # Plot 2: Total Monthly Automobile sales using line chart
+    # The cube keeps months in calendar order
+    watch = metrics.stopwatch()
+    mas = cube.series('Automobile_Sales', 'Month', where=where)
+    watch.lap('aggregate')
+    if figure_builder is not None:
+        figure = figure_builder.line(
+            mas, x='Month', y='Automobile_Sales',
+            title="Average Monthly Automobile Sales",
+            color=colors['accent'], xaxis_title='Month', yaxis_title='Average Sales', markers=True
+        )
+        watch.lap('figure')
+        return figure
+    figure = _px().line(
+        mas, 
+        x='Month',
+        y='Automobile_Sales',
+        title="Average Monthly Automobile Sales",
+        template="plotly_dark",
+        line_shape='spline',  # Smooth line
+        markers=True,  # Show markers on the line
+        color_discrete_sequence=[colors['accent']]
+    )
+    watch.lap('figure')
+    figure.update_layout(
+        **graph_layout,
+        xaxis_title='Month',
+        yaxis_title='Average Sales',
+        title_x=0.5
+    )
+    watch.lap('layout')
+    return figure
+
+def yearly_chart3(cube, input_year, where=None):
+    # Plot 3: Bar chart for average number of vehicles sold during the given year
+    watch = metrics.stopwatch()
+    avr_vdata = cube.series('Automobile_Sales', 'Vehicle_Type', year=input_year, where=where)
+    watch.lap('aggregate')
+    if figure_builder is not None:
+        figure = figure_builder.bar(
+            avr_vdata, x='Vehicle_Type', y='Automobile_Sales',
+            title=f'Average Sales by Vehicle Type in {input_year}',
+            color=colors['accent_secondary'], xaxis_title='Vehicle Type', yaxis_title='Average Sales'
+        )
+        watch.lap('figure')
+        return figure
+    figure = _px().bar(
+        avr_vdata, 
+        x='Vehicle_Type',
+        y='Automobile_Sales',
+        title=f'Average Sales by Vehicle Type in {input_year}',
+        template="plotly_dark",
+        color_discrete_sequence=[colors['accent_secondary']]
+    )
+    watch.lap('figure')
+    figure.update_layout(
+        **graph_layout,
+        xaxis_title='Vehicle Type',
+        yaxis_title='Average Sales',
+        title_x=0.5
+    )
+    watch.lap('layout')
+    return figure
+
+def yearly_chart4(cube, input_year, where=None):
+    # Plot 4: Total Advertisement Expenditure for each vehicle using pie chart
+    watch = metrics.stopwatch()
+    exp_data = cube.series('Advertising_Expenditure', 'Vehicle_Type', stat='sum', year=input_year, where=where)
+    watch.lap('aggregate')
+    if figure_builder is not None:
+        figure = figure_builder.pie(
+            exp_data, values='Advertising_Expenditure', names='Vehicle_Type',
+            title=f"Ad Expenditure by Vehicle Type in {input_year}",
+            colors=sequential.Blues_r, hole=0.4, legend=pie_legend
+        )
+        watch.lap('figure')
+        return figure
+    figure = _px().pie(
+        exp_data,
+        values='Advertising_Expenditure',
+        names='Vehicle_Type',
+        title=f"Ad Expenditure by Vehicle Type in {input_year}",
+        template="plotly_dark",
+        color_discrete_sequence=sequential.Blues_r,
+        hole=0.4  # Create a donut chart for better appearance
+    )
+    watch.lap('figure')
+    figure.update_layout(
+        **graph_layout,
+        title_x=0.5,
+        legend=pie_legend
+    )
+    watch.lap('layout')
+    return figure
+
+
+# Year Comparison Report Plots.  Every selected year is reduced in a single
+# pass over the cube (SalesCube.by_year) and drawn as one bar per year in
+# each vehicle type group.
+def comparison_years(compare_years):
+    return tuple(sorted({int(year) for year in compare_years or []}))
+
+def comparison_chart(frame, y, title, yaxis_title):
+    # Years as strings so they are discrete groups, not a colour scale
+    frame = frame.assign(Year=frame['Year'].astype(str))
+    if figure_builder is not None:
+        return figure_builder.grouped_bar(
+            frame, x='Vehicle_Type', y=y, group='Year', title=title,
+            colors=qualitative.Plotly, xaxis_title='Vehicle Type',
+            yaxis_title=yaxis_title, legend_title='Year'
         )
+    figure = _px().bar(
+        frame,
+        x='Vehicle_Type',
+        y=y,
+        color='Year',
+        title=title,
+        template="plotly_dark",
+        color_discrete_sequence=qualitative.Plotly,
+        barmode='group'
+    )
+    figure.update_layout(
+        **graph_layout,
+        xaxis_title='Vehicle Type',
+        yaxis_title=yaxis_title,
+        title_x=0.5,
+        legend_title_text='Year'
+    )
+    return figure
 
+def comparison_chart1(cube, years):
+    # Plot 1: Average sales by vehicle type, one bar per selected year
+    watch = metrics.stopwatch()
+    sales = cube.by_year('Automobile_Sales', 'Vehicle_Type', years)
+    watch.lap('aggregate')
+    figure = comparison_chart(sales, 'Automobile_Sales', "Average Sales by Vehicle Type per Year", 'Average Sales')
+    watch.lap('figure')
+    return figure
+
+def comparison_chart2(cube, years):
+    # Plot 2: Total advertisement expenditure by vehicle type, one bar per selected year
+    watch = metrics.stopwatch()
+    expenditure = cube.by_year('Advertising_Expenditure', 'Vehicle_Type', years, stat='sum')
+    watch.lap('aggregate')
+    figure = comparison_chart(expenditure, 'Advertising_Expenditure', "Ad Expenditure by Vehicle Type per Year", 'Ad Expenditure')
+    watch.lap('figure')
+    return figure
+
+# Partial updates that move the Yearly Statistics charts to another year:
+# the marker on chart 1 and the traces of charts 3 and 4.  Chart 2 is the
+# same for every year.
+def yearly_patches(cube, input_year, granularity='Year', where=CrossFilter()):
+    chart1 = Patch()
+    chart1['layout']['shapes'][0]['x0'] = year_marker_x(input_year, granularity)
+    chart1['layout']['shapes'][0]['x1'] = year_marker_x(input_year, granularity)
+
+    avr_vdata = cube.series('Automobile_Sales', 'Vehicle_Type', year=input_year, where=chart_filter('yearly-chart3', where))
+    chart3 = Patch()
+    chart3['data'][0]['x'] = avr_vdata['Vehicle_Type'].tolist()
+    chart3['data'][0]['y'] = avr_vdata['Automobile_Sales'].tolist()
+    chart3['layout']['title']['text'] = f'Average Sales by Vehicle Type in {input_year}'
+
+    exp_data = cube.series('Advertising_Expenditure', 'Vehicle_Type', stat='sum', year=input_year, where=chart_filter('yearly-chart4', where))
+    chart4 = Patch()
+    chart4['data'][0]['labels'] = exp_data['Vehicle_Type'].tolist()
+    chart4['data'][0]['values'] = exp_data['Advertising_Expenditure'].tolist()
+    chart4['layout']['title']['text'] = f"Ad Expenditure by Vehicle Type in {input_year}"
+
+    return [chart1, no_update, chart3, chart4]
+
+# Cache key and builder for each of the four charts of a view.  A key
+# carries the version of the data its chart is drawn from: the recession
+# rows, one year, or (for the whole-period charts) the dataset.  A refresh
+# that appends rows for some years keeps the other charts cached.  Chart 1
+# is drawn at the selected granularity, which is part of its key.  Each
+# chart is drawn with its part of the cross filter ``where``, which is part
+# of its key when it filters anything.
+def view_charts(snapshot, input_year, selected_statistics, granularity='Year', compare_years=(), where=CrossFilter()):
+    cube = snapshot.cube
+    if selected_statistics == 'Year Comparison':
+        years = comparison_years(compare_years)
+        version = tuple(snapshot.year_version(year) for year in years)
+        return [
+            ((version, selected_statistics, years, 1), lambda: comparison_chart1(cube, years)),
+            ((version, selected_statistics, years, 2), lambda: comparison_chart2(cube, years)),
+        ]
+    if selected_statistics == 'Recession Period Statistics':
+        # The recession view ignores the year, so all years share its charts
+        version = snapshot.recession_version
+        w1, w2, w3, w4 = [chart_filter(f'recession-chart{i}', where) for i in range(1, 5)]
+        return [
+            (filtered_key((version, selected_statistics, None, 1, granularity), w1), lambda: recession_chart1(cube, granularity, w1)),
+            (filtered_key((version, selected_statistics, None, 2), w2), lambda: recession_chart2(cube, w2)),
+            (filtered_key((version, selected_statistics, None, 3), w3), lambda: recession_chart3(cube, w3)),
+            # Other bins draw another chart
+            (filtered_key((version, selected_statistics, None, 4, binning and binning.key), w4), lambda: recession_chart4(cube, w4)),
+        ]
+    year_version = snapshot.year_version(input_year)
+    w1, w2, w3, w4 = [chart_filter(f'yearly-chart{i}', where) for i in range(1, 5)]
+    return [
+        (filtered_key((snapshot.version, selected_statistics, input_year, 1, granularity), w1), lambda: yearly_chart1(cube, input_year, granularity, w1)),
+        (filtered_key((snapshot.version, selected_statistics, None, 2), w2), lambda: yearly_chart2(cube, w2)),
+        (filtered_key((year_version, selected_statistics, input_year, 3), w3), lambda: yearly_chart3(cube, input_year, w3)),
+        (filtered_key((year_version, selected_statistics, input_year, 4), w4), lambda: yearly_chart4(cube, input_year, w4)),
+    ]
+
+# The four figures of the selected view, or None until a report (and year,
+# if applicable) is selected
+def output_figures(snapshot, input_year, selected_statistics, granularity='Year', compare_years=(), where=CrossFilter()):
+    if (selected_statistics == 'Recession Period Statistics'
+            or (input_year and selected_statistics == 'Yearly Statistics')
+            or (compare_years and selected_statistics == 'Year Comparison')):
+        return [
+            figure_cache.get_or_create(key, build)
+            for key, build in view_charts(snapshot, input_year, selected_statistics, granularity, compare_years, where)
+        ]
+    return None
+
+# The aggregates each chart of the view is drawn from, as (chart title,
+# frame) pairs, for the export route.  Same reductions and cross filters as
+# view_charts; the time series are whole, not thinned to a zoom window.
+# None until a report (and year, if applicable) is selected.
+def view_aggregates(snapshot, input_year, selected_statistics, granularity='Year', compare_years=(), where=CrossFilter()):
+    cube = snapshot.cube
+    if selected_statistics == 'Year Comparison' and compare_years:
+        years = comparison_years(compare_years)
+        return [
+            ("Average Sales by Vehicle Type per Year", cube.by_year('Automobile_Sales', 'Vehicle_Type', years)),
+            ("Ad Expenditure by Vehicle Type per Year", cube.by_year('Advertising_Expenditure', 'Vehicle_Type', years, stat='sum')),
+        ]
+    if selected_statistics == 'Recession Period Statistics':
+        w1, w2, w3, w4 = [chart_filter(f'recession-chart{i}', where) for i in range(1, 5)]
+        if granularity == 'Year':
+            sales = cube.series('Automobile_Sales', 'Year', recession=1, where=w1)
+        else:
+            sales = cube.timeseries(granularity, recession=1, where=w1)
         return [
+            ("Average Automobile Sales During Recession Periods", sales),
+            ("Average Sales by Vehicle Type During Recessions", cube.series('Automobile_Sales', 'Vehicle_Type', recession=1, where=w2)),
+            ("Ad Expenditure by Vehicle Type During Recessions", cube.series('Advertising_Expenditure', 'Vehicle_Type', stat='sum', recession=1, where=w3)),
+            ("Effect of Unemployment Rate on Vehicle Sales", cube.by_driver('unemployment_rate', binning, recession=1, where=w4)),
+        ]
+    if input_year and selected_statistics == 'Yearly Statistics':
+        w1, w2, w3, w4 = [chart_filter(f'yearly-chart{i}', where) for i in range(1, 5)]
+        if granularity == 'Year':
+            sales = cube.series('Automobile_Sales', 'Year', where=w1)
+        else:
+            sales = cube.timeseries(granularity, where=w1)
+        return [
+            ("Average Automobile Sales (1980-2023)", sales),
+            ("Average Monthly Automobile Sales", cube.series('Automobile_Sales', 'Month', where=w2)),
+            (f'Average Sales by Vehicle Type in {input_year}', cube.series('Automobile_Sales', 'Vehicle_Type', year=input_year, where=w3)),
+            (f"Ad Expenditure by Vehicle Type in {input_year}", cube.series('Advertising_Expenditure', 'Vehicle_Type', stat='sum', year=input_year, where=w4)),
+        ]
+    return None
+
+if render_mode == 'clientside':
+    year_input = Input(component_id='server-year', component_property='data')
+else:
+    year_input = Input(component_id='select-year', component_property='value')
+
+# The monthly and daily charts get pattern-matching IDs, so that one
+# callback (update_lod_window) serves the zoom events of all of them
+def lod_graph_id(selected_statistics, input_year=''):
+    return {'type': 'lod-chart', 'statistics': selected_statistics, 'year': input_year}
+
+# Each of them has a store beside it, into which the browser copies its
+# zoom events together with the chart's width in pixels (lodRequest in
+# assets/dashboard.js), so the points fit the chart as drawn
+def lod_graph(graph_id, figure):
+    return html.Div([graph(graph_id, figure), dcc.Store(id=dict(graph_id, type='lod-request'))])
+
+# Callback for plotting
+def update_output_container(input_year, selected_statistics, granularity='Year', compare_years=(), cross_filter=None, dataset_name=None):
+    where = CrossFilter.from_store(cross_filter)
+    figures = output_figures(datasets.current(dataset_name), input_year, selected_statistics, granularity, compare_years, where)
+
+    # Clear the output container on new selections
+    if figures is None:
+        # Return default/welcome message
+        return welcome_message()
+
+    watch = metrics.stopwatch()
+    if selected_statistics == 'Year Comparison':
+        C_chart1, C_chart2 = [
+            graph(f'comparison-chart{i}', figure)
+            for i, figure in enumerate(figures, start=1)
+        ]
+
+        children = [
+            html.Div(
+                id='comparison-row1',
+                className='chart-row',
+                style={'position': 'relative', 'zIndex': 10},
+                children=[
+                    html.Div(className='chart-item', children=[C_chart1]),
+                    html.Div(className='chart-item', children=[C_chart2])
+                ]
+            )
+        ]
+        watch.lap('components')
+        return children
+
+    if selected_statistics == 'Recession Period Statistics':
+        R_chart1, R_chart2, R_chart3 = [
+            graph(filter_graph_id(f'recession-chart{i}'), figure)  # Add unique ID
+            for i, figure in enumerate(figures[:3], start=1)
+        ]
+        R_chart4 = graph('recession-chart4', figures[3])
+        if granularity != 'Year':
+            R_chart1 = lod_graph(lod_graph_id(selected_statistics), figures[0])
+
+        children = [
             html.Div(
                 id='recession-row1',  # Add unique ID
                 className='chart-row',
@@ -493,197 +1463,401 @@ def update_output_container(input_year, selected_statistics):
                 ]
             )
         ]
+        watch.lap('components')
+        return children
 
-    # Yearly Statistic Report Plots                             
-    elif (input_year and selected_statistics == 'Yearly Statistics'):
-        yearly_data = data[data['Year'] == input_year]
-                              
-        # Plot 1: Yearly Automobile sales using line chart for the whole period
-        yas = data.groupby('Year')['Automobile_Sales'].mean().reset_index()
-        Y_chart1 = dcc.Graph(
-            id=f'yearly-chart1-{input_year}',  # Add unique ID with year
-            config={'displayModeBar': False, 'responsive': True},
-            figure=px.line(
-                yas, 
-                x='Year',
-                y='Automobile_Sales',
-                title="Average Automobile Sales (1980-2023)",
-                template="plotly_dark",
-                line_shape='spline',  # Smooth line
-                color_discrete_sequence=[colors['accent']]
-            ).update_layout(
-                **graph_layout,
-                xaxis_title='Year',
-                yaxis_title='Average Sales',
-                title_x=0.5
-            ).add_shape(  # Highlight selected year
-                type="line",
-                x0=input_year,
-                y0=0,
-                x1=input_year,
-                y1=yas['Automobile_Sales'].max() * 1.1,
-                line=dict(color=colors['accent_secondary'], width=2, dash="dot")
-            )
-        )
-
-        # Plot 2: Total Monthly Automobile sales using line chart
-        mas = data.groupby('Month')['Automobile_Sales'].mean().reset_index()
-        # Convert month to proper order
-        month_order = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-        mas['Month'] = pd.Categorical(mas['Month'], categories=month_order, ordered=True)
-        mas = mas.sort_values('Month')
-        
-        Y_chart2 = dcc.Graph(
-            id=f'yearly-chart2-{input_year}',  # Add unique ID with year
-            config={'displayModeBar': False, 'responsive': True},
-            figure=px.line(
-                mas, 
-                x='Month',
-                y='Automobile_Sales',
-                title="Average Monthly Automobile Sales",
-                template="plotly_dark",
-                line_shape='spline',  # Smooth line
-                markers=True,  # Show markers on the line
-                color_discrete_sequence=[colors['accent']]
-            ).update_layout(
-                **graph_layout,
-                xaxis_title='Month',
-                yaxis_title='Average Sales',
-                title_x=0.5
-            )
-        )
-
-        # Plot 3: Bar chart for average number of vehicles sold during the given year
-        avr_vdata = yearly_data.groupby('Vehicle_Type')['Automobile_Sales'].mean().reset_index()
-        Y_chart3 = dcc.Graph(
-            id=f'yearly-chart3-{input_year}',  # Add unique ID with year
-            config={'displayModeBar': False, 'responsive': True},
-            figure=px.bar(
-                avr_vdata, 
-                x='Vehicle_Type',
-                y='Automobile_Sales',
-                title=f'Average Sales by Vehicle Type in {input_year}',
-                template="plotly_dark",
-                color_discrete_sequence=[colors['accent_secondary']]
-            ).update_layout(
-                **graph_layout,
-                xaxis_title='Vehicle Type',
-                yaxis_title='Average Sales',
-                title_x=0.5
-            )
-        )
-            
-        # Plot 4: Total Advertisement Expenditure for each vehicle using pie chart
-        exp_data = yearly_data.groupby('Vehicle_Type')['Advertising_Expenditure'].sum().reset_index()
-        Y_chart4 = dcc.Graph(
-            id=f'yearly-chart4-{input_year}',  # Add unique ID with year
-            config={'displayModeBar': False, 'responsive': True},
-            figure=px.pie(
-                exp_data,
-                values='Advertising_Expenditure',
-                names='Vehicle_Type',
-                title=f"Ad Expenditure by Vehicle Type in {input_year}",
-                template="plotly_dark",
-                color_discrete_sequence=px.colors.sequential.Blues_r,
-                hole=0.4  # Create a donut chart for better appearance
-            ).update_layout(
-                **graph_layout,
-                title_x=0.5,
-                legend=dict(
-                    orientation="h",
-                    yanchor="bottom",
-                    y=-0.15,
-                    xanchor="center",
-                    x=0.5
-                )
-            )
-        )
+    # The year suffix forces a remount on every change; clientside mode
+    # needs stable IDs so the browser can patch the charts in place
+    suffix = '' if render_mode == 'clientside' else f'-{input_year}'
+    Y_chart1, Y_chart2, Y_chart3, Y_chart4 = [
+        graph(filter_graph_id(f'yearly-chart{i}', suffix), figure)  # Add unique ID with year
+        for i, figure in enumerate(figures, start=1)
+    ]
+    if granularity != 'Year':
+        Y_chart1 = lod_graph(lod_graph_id(selected_statistics, suffix), figures[0])
 
-        return [
-            # Use a container div with clear identifier
-            html.Div(
-                id=f'yearly-stats-container-{input_year}',  # Add unique ID with year
-                style={'width': '100%', 'position': 'relative', 'zIndex': 20},  # Add positioning and higher z-index
-                children=[
-                    html.Div(
-                        id=f'yearly-row1-{input_year}',  # Add unique ID with year
-                        className='chart-row',
-                        children=[
-                            html.Div(className='chart-item', children=[Y_chart1]),
-                            html.Div(className='chart-item', children=[Y_chart2])
-                        ]
-                    ),
-                    html.Div(
-                        id=f'yearly-row2-{input_year}',  # Add unique ID with year
-                        className='chart-row',
-                        children=[
-                            html.Div(className='chart-item', children=[Y_chart3]),
-                            html.Div(className='chart-item', children=[Y_chart4])
-                        ]
-                    )
-                ]
-            )
-        ]
-        
-    else:
-        # If no selection is made yet, show a welcome message
-        return html.Div(
-            style={
-                'textAlign': 'center',
-                'padding': '50px 20px',
-                'backgroundColor': colors['secondary_background'],
-                'borderRadius': '10px',
-                'marginTop': '20px',
-                'position': 'relative',  # Add positioning context
-                'zIndex': 1,  # Base z-index
-            },
+    children = [
+        # Use a container div with clear identifier
+        html.Div(
+            id=f'yearly-stats-container{suffix}',  # Add unique ID with year
+            style={'width': '100%', 'position': 'relative', 'zIndex': 20},  # Add positioning and higher z-index
             children=[
-                html.H3(
-                    "Welcome to the Automobile Sales Dashboard",
-                    style={'color': colors['text'], 'marginBottom': '15px'}
-                ),
-                html.P(
-                    "Please select a report type and year (if applicable) to view the statistics.",
-                    style={'color': colors['secondary_text']}
+                html.Div(
+                    id=f'yearly-row1{suffix}',  # Add unique ID with year
+                    className='chart-row',
+                    children=[
+                        html.Div(className='chart-item', children=[Y_chart1]),
+                        html.Div(className='chart-item', children=[Y_chart2])
+                    ]
                 ),
                 html.Div(
-                    style={
-                        'marginTop': '30px',
-                        'display': 'flex',
-                        'justifyContent': 'center',
-                        'gap': '20px',
-                    },
+                    id=f'yearly-row2{suffix}',  # Add unique ID with year
+                    className='chart-row',
                     children=[
-                        html.Div(
-                            style={
-                                'backgroundColor': colors['card_background'],
-                                'padding': '15px 25px',
-                                'borderRadius': '5px',
-                                'textAlign': 'center',
-                                'boxShadow': '0 2px 4px rgba(0,0,0,0.1)',
-                            },
-                            children=[
-                                html.P("Yearly Statistics", style={'color': colors['accent'], 'fontWeight': 'bold'}),
-                                html.P("View sales data for a specific year", style={'color': colors['secondary_text']})
-                            ]
-                        ),
-                        html.Div(
-                            style={
-                                'backgroundColor': colors['card_background'],
-                                'padding': '15px 25px',
-                                'borderRadius': '5px',
-                                'textAlign': 'center',
-                                'boxShadow': '0 2px 4px rgba(0,0,0,0.1)',
-                            },
-                            children=[
-                                html.P("Recession Statistics", style={'color': colors['accent_secondary'], 'fontWeight': 'bold'}),
-                                html.P("Analyze sales during recession periods", style={'color': colors['secondary_text']})
-                            ]
-                        )
+                        html.Div(className='chart-item', children=[Y_chart3]),
+                        html.Div(className='chart-item', children=[Y_chart4])
                     ]
                 )
             ]
         )
+    ]
+    watch.lap('components')
+    return children
+
+# An empty chart slot
+def blank_figure():
+    return {
+        'data': [],
+        'layout': {
+            'paper_bgcolor': colors['card_background'],
+            'plot_bgcolor': colors['card_background'],
+            'xaxis': {'visible': False},
+            'yaxis': {'visible': False},
+        },
+    }
+
+# Callback for plotting in DASHBOARD_RENDER_MODE=patch
+def update_output_figures(input_year, selected_statistics, granularity, compare_years, cross_filter, dataset_name, rendered_view):
+    name = datasets.resolve(dataset_name)
+    snapshot = datasets.current(name)
+    where = CrossFilter.from_store(cross_filter)
+    view = {
+        'statistics': selected_statistics, 'year': input_year, 'granularity': granularity,
+        'dataset': name, 'version': snapshot.version, 'filter': where.to_store(),
+    }
+    if selected_statistics == 'Year Comparison':
+        view['years'] = list(comparison_years(compare_years))
+    if rendered_view == view:
+        raise PreventUpdate
+
+    # A year change within the Yearly Statistics report only patches the
+    # charts, as long as they were drawn from the current data at the same
+    # granularity and cross filter
+    if (input_year and selected_statistics == 'Yearly Statistics'
+            and rendered_view and rendered_view['statistics'] == 'Yearly Statistics'
+            and rendered_view.get('granularity') == granularity
+            and rendered_view.get('version') == snapshot.version
+            and rendered_view.get('filter') == view['filter']):
+        return yearly_patches(snapshot.cube, input_year, granularity, where) + [no_update, no_update, view]
+
+    figures = output_figures(snapshot, input_year, selected_statistics, granularity, compare_years, where)
+    if figures is None:
+        return [no_update] * 4 + [welcome_style, {'display': 'none'}, None]
+    # The comparison report fills two of the four slots
+    figures = list(figures) + [blank_figure()] * (len(chart_slots) - len(figures))
+    return figures + [{'display': 'none'}, {'width': '100%'}, view]
+
+if render_mode == 'patch':
+    app.callback(
+        [Output(component_id=slot, component_property='figure') for slot in chart_slots]
+        + [Output(component_id='welcome-message', component_property='style'),
+           Output(component_id='charts-container', component_property='style'),
+           Output(component_id='rendered-view', component_property='data')],
+        [Input(component_id='select-year', component_property='value'), 
+         Input(component_id='dropdown-statistics', component_property='value'),
+         Input(component_id='select-granularity', component_property='value'),
+         Input(component_id='compare-years', component_property='value'),
+         Input(component_id='cross-filter', component_property='data'),
+         Input(component_id='dropdown-dataset', component_property='value')],
+        State(component_id='rendered-view', component_property='data'),
+        background=background_manager is not None,
+        manager=background_manager
+    )(metrics.timed('callback')(update_output_figures))
+else:
+    app.callback(
+        Output(component_id='output-container', component_property='children'),
+        [year_input, 
+         Input(component_id='dropdown-statistics', component_property='value'),
+         Input(component_id='select-granularity', component_property='value'),
+         Input(component_id='compare-years', component_property='value'),
+         Input(component_id='cross-filter', component_property='data'),
+         Input(component_id='dropdown-dataset', component_property='value')],
+        background=background_manager is not None,
+        manager=background_manager
+    )(metrics.timed('callback')(update_output_container))
+
+# The x-range of a zoom or pan in a graph's relayoutData: (start, end), or
+# (None, None) when the axis was reset; None for any other layout change
+def relayout_range(relayout_data):
+    if not relayout_data:
+        return None
+    if relayout_data.get('xaxis.autorange'):
+        return None, None
+    if 'xaxis.range[0]' in relayout_data:
+        return relayout_data['xaxis.range[0]'], relayout_data.get('xaxis.range[1]')
+    if 'xaxis.range' in relayout_data:
+        return tuple(relayout_data['xaxis.range'])
+    return None
+
+# The width in pixels the browser reported for a chart, None if it did not
+def reported_width(lod_request):
+    width = lod_request.get('width')
+    if isinstance(width, (int, float)) and not isinstance(width, bool) and width >= 1:
+        return int(width)
+    return None
+
+# New points for a monthly or daily chart after a zoom: the visible window
+# at the chart's density, sent as a partial update of the trace.
+# ``lod_request`` holds the relayoutData of the zoom and the chart's width.
+def lod_window(snapshot, selected_statistics, granularity, lod_request, cross_filter=None):
+    lod_request = lod_request or {}
+    x_range = relayout_range(lod_request.get('relayout'))
+    if x_range is None or granularity not in ('Month', 'Day'):
+        raise PreventUpdate
+    if selected_statistics == 'Recession Period Statistics':
+        recession, chart = 1, 'recession-chart1'
+    else:
+        recession, chart = None, 'yearly-chart1'
+    where = chart_filter(chart, CrossFilter.from_store(cross_filter))
+    series = snapshot.cube.timeseries(granularity, recession=recession, where=where)
+    start, end = [None if bound is None else np.datetime64(pd.Timestamp(bound)) for bound in x_range]
+    dates, sales = lod.window(
+        series['Date'].to_numpy(), series['Automobile_Sales'].to_numpy(), start, end, reported_width(lod_request),
+    )
+    chart = Patch()
+    chart['data'][0]['x'] = typed_array(dates)
+    chart['data'][0]['y'] = typed_array(sales)
+    return chart
+
+def update_lod_window(lod_request, granularity, request_id, cross_filter, dataset_name):
+    return lod_window(datasets.current(dataset_name), request_id['statistics'], granularity, lod_request, cross_filter)
+
+# In patch mode the monthly and daily charts live in the first chart slot
+def update_lod_slot(lod_request, rendered_view):
+    if not rendered_view or rendered_view['statistics'] == 'Year Comparison':
+        raise PreventUpdate
+    return lod_window(
+        datasets.current(rendered_view.get('dataset')), rendered_view['statistics'], rendered_view.get('granularity'), lod_request,
+        rendered_view.get('filter'),
+    )
+
+if render_mode == 'patch':
+    app.clientside_callback(
+        ClientsideFunction(namespace='dashboard', function_name='lodRequest'),
+        Output(component_id='lod-request', component_property='data'),
+        Input(component_id=chart_slots[0], component_property='relayoutData'),
+        State(component_id=chart_slots[0], component_property='id'),
+        prevent_initial_call=True
+    )
+    app.callback(
+        Output(component_id=chart_slots[0], component_property='figure', allow_duplicate=True),
+        Input(component_id='lod-request', component_property='data'),
+        State(component_id='rendered-view', component_property='data'),
+        prevent_initial_call=True
+    )(metrics.timed('callback')(update_lod_slot))
+else:
+    lod_chart = {'type': 'lod-chart', 'statistics': MATCH, 'year': MATCH}
+    lod_request = {'type': 'lod-request', 'statistics': MATCH, 'year': MATCH}
+    app.clientside_callback(
+        ClientsideFunction(namespace='dashboard', function_name='lodRequest'),
+        Output(component_id=lod_request, component_property='data'),
+        Input(component_id=lod_chart, component_property='relayoutData'),
+        State(component_id=lod_chart, component_property='id'),
+        prevent_initial_call=True
+    )
+    app.callback(
+        Output(component_id=lod_chart, component_property='figure'),
+        Input(component_id=lod_request, component_property='data'),
+        [State(component_id='select-granularity', component_property='value'),
+         State(component_id=lod_request, component_property='id'),
+         State(component_id='cross-filter', component_property='data'),
+         State(component_id='dropdown-dataset', component_property='value')],
+        prevent_initial_call=True
+    )(metrics.timed('callback')(update_lod_window))
+
+# The cross filter after a click on a chart, a change of period or a clear.
+# ``chart`` and ``click_data`` describe the click, if that was the trigger.
+def cross_filter_event(cross_filter, chart, click_data, period):
+    where = CrossFilter.from_store(cross_filter)
+    if ctx.triggered_id == 'clear-filters':
+        where = CrossFilter()
+    elif ctx.triggered_id == 'filter-period':
+        where = where.with_recession(period_recession.get(period))
+    else:
+        # Charts mounted with no click yet trigger with None
+        if chart not in filter_dimensions or not click_data or not click_data.get('points'):
+            raise PreventUpdate
+        point = click_data['points'][0]
+        # Pie slices carry a label, bars and line points an x value
+        value = point.get('label', point.get('x'))
+        if value is None:
+            raise PreventUpdate
+        where = where.toggle(filter_dimensions[chart], value)
+    period = next(name for name, recession in period_recession.items() if recession == where.recession)
+    return [where.to_store(), period, filter_summary(where)]
+
+def update_cross_filter(clicks, period, clear_clicks, cross_filter):
+    chart = click_data = None
+    if isinstance(ctx.triggered_id, dict):
+        chart = ctx.triggered_id['chart']
+        click_data = ctx.triggered[0]['value']
+    return cross_filter_event(cross_filter, chart, click_data, period)
+
+# In patch mode the chart in a slot depends on the view drawn into it; the
+# monthly and daily charts of slot 1 have dates, not years, on their x-axis
+def update_cross_filter_slots(click1, click2, click3, click4, period, clear_clicks, cross_filter, rendered_view):
+    chart = click_data = None
+    if ctx.triggered_id in chart_slots and rendered_view:
+        slot = chart_slots.index(ctx.triggered_id)
+        prefix = {'Recession Period Statistics': 'recession-chart', 'Yearly Statistics': 'yearly-chart'}.get(rendered_view['statistics'])
+        if prefix and (slot > 0 or rendered_view.get('granularity') == 'Year'):
+            chart = f'{prefix}{slot + 1}'
+            click_data = [click1, click2, click3, click4][slot]
+    return cross_filter_event(cross_filter, chart, click_data, period)
+
+cross_filter_outputs = [
+    Output(component_id='cross-filter', component_property='data'),
+    Output(component_id='filter-period', component_property='value'),
+    Output(component_id='filter-summary', component_property='children'),
+]
+cross_filter_controls = [
+    Input(component_id='filter-period', component_property='value'),
+    Input(component_id='clear-filters', component_property='n_clicks'),
+]
+if render_mode == 'patch':
+    app.callback(
+        cross_filter_outputs,
+        [Input(component_id=slot, component_property='clickData') for slot in chart_slots] + cross_filter_controls,
+        [State(component_id='cross-filter', component_property='data'),
+         State(component_id='rendered-view', component_property='data')],
+        prevent_initial_call=True
+    )(metrics.timed('callback')(update_cross_filter_slots))
+else:
+    app.callback(
+        cross_filter_outputs,
+        [Input(component_id=filter_graph_id(ALL, ALL), component_property='clickData')] + cross_filter_controls,
+        State(component_id='cross-filter', component_property='data'),
+        prevent_initial_call=True
+    )(metrics.timed('callback')(update_cross_filter))
+
+# Link of the Download button for the current view and cross filter
+@app.callback(
+    Output(component_id='export-link', component_property='href'),
+    [Input(component_id='dropdown-statistics', component_property='value'),
+     Input(component_id='select-year', component_property='value'),
+     Input(component_id='select-granularity', component_property='value'),
+     Input(component_id='compare-years', component_property='value'),
+     Input(component_id='cross-filter', component_property='data'),
+     Input(component_id='export-content', component_property='value'),
+     Input(component_id='export-format', component_property='value'),
+     Input(component_id='dropdown-dataset', component_property='value')]
+)
+def update_export_link(selected_statistics, input_year, granularity, compare_years, cross_filter, content, fmt, dataset_name):
+    query = {'dataset': datasets.resolve(dataset_name), 'content': content, 'format': fmt}
+    if content == 'aggregates':
+        query.update(statistics=selected_statistics, year=input_year, granularity=granularity, compare=compare_years or [])
+    if cross_filter:
+        query['filter'] = json.dumps(cross_filter)
+    return '/export?' + urlencode(query, doseq=True)
+
+if render_mode == 'clientside':
+    # Decide in the browser whether a year change needs the server at all.
+    # Every other input of the output callback is an input here too, so the
+    # server never renders with the year of an earlier request.
+    app.clientside_callback(
+        ClientsideFunction(namespace='dashboard', function_name='requestYear'),
+        Output(component_id='server-year', component_property='data'),
+        Input(component_id='select-year', component_property='value'),
+        Input(component_id='dropdown-statistics', component_property='value'),
+        Input(component_id='select-granularity', component_property='value'),
+        Input(component_id='compare-years', component_property='value'),
+        Input(component_id='cross-filter', component_property='data'),
+        Input(component_id='dropdown-dataset', component_property='value')
+    )
+
+    # Apply year changes to the rendered Yearly Statistics charts
+    app.clientside_callback(
+        ClientsideFunction(namespace='dashboard', function_name='patchYearlyCharts'),
+        [Output(component_id=filter_graph_id('yearly-chart1'), component_property='figure'),
+         Output(component_id=filter_graph_id('yearly-chart3'), component_property='figure'),
+         Output(component_id=filter_graph_id('yearly-chart4'), component_property='figure')],
+        Input(component_id='select-year', component_property='value'),
+        [State(component_id='yearly-aggregates', component_property='data'),
+         State(component_id=filter_graph_id('yearly-chart1'), component_property='figure'),
+         State(component_id=filter_graph_id('yearly-chart3'), component_property='figure'),
+         State(component_id=filter_graph_id('yearly-chart4'), component_property='figure'),
+         State(component_id='cross-filter', component_property='data')],
+        prevent_initial_call=True
+    )
+
+# Every chart the dropdowns can produce: the recession report plus one view
+# per year, at each of ``granularities``
+def all_output_charts(snapshot, granularities=('Year',)):
+    charts = {}
+    for granularity in granularities:
+        charts.update(view_charts(snapshot, None, 'Recession Period Statistics', granularity))
+        for year in year_list:
+            charts.update(view_charts(snapshot, year, 'Yearly Statistics', granularity))
+    return charts
+
+def warm_figure_cache():
+    charts = all_output_charts(datasets.current())
+    return figure_cache.warm(charts, lambda key: charts[key]())
+
+if os.environ.get('FIGURE_CACHE_WARMUP') == '1':
+    if datasets.get().lazy:
+        # Runs once the data is loaded, without holding up startup
+        threading.Thread(target=warm_figure_cache, name='figure-cache-warmup', daemon=True).start()
+    else:
+        warm_figure_cache()
+
+# Readiness probe: 503 until the data is loaded, so a load balancer only
+# routes traffic to workers that can answer it without waiting
+@server.route('/ready')
+def ready():
+    dataset = datasets.get()
+    if dataset.ready():
+        return flask.jsonify({'ready': True, 'version': dataset.current.version})
+    return flask.jsonify({'ready': False, 'error': dataset.last_error}), 503
+
+# Streamed download of the chart aggregates of a view, or of the raw rows
+# passing its cross filter (see export.py)
+@server.route('/export')
+def export_data():
+    args = flask.request.args
+    fmt = args.get('format', 'csv')
+    if fmt not in exporter.formats:
+        return flask.jsonify({'error': f'Unsupported format {fmt!r}', 'formats': exporter.formats}), 400
+    try:
+        where = CrossFilter.from_store(json.loads(args.get('filter') or 'null'))
+    except (ValueError, TypeError, AttributeError):
+        return flask.jsonify({'error': 'Malformed filter'}), 400
+    name = datasets.resolve(args.get('dataset'))
+    dataset = datasets.get(name)
+    snapshot = dataset.current
+    # Files of the other datasets carry their name
+    prefix = '' if name == datasets.default else f'{name}-'
+    if args.get('content') == 'rows':
+        try:
+            rows = row_chunks(dataset, snapshot, where, exporter.chunk_rows)
+        except ValueError as error:
+            return flask.jsonify({'error': str(error)}), 409
+        return exporter.response(rows, fmt, f'{prefix}automobile-sales-rows', limited=True)
+
+    granularity = args.get('granularity', 'Year')
+    if granularity not in [option['value'] for option in granularity_options]:
+        return flask.jsonify({'error': f'Unknown granularity {granularity!r}'}), 400
+    selected_statistics = args.get('statistics')
+    input_year = args.get('year', type=int)
+    tables = view_aggregates(snapshot, input_year, selected_statistics, granularity, args.getlist('compare', type=int), where)
+    if tables is None:
+        return flask.jsonify({'error': 'Select a report (and year) to export'}), 400
+    filename = selected_statistics.lower().replace(' ', '-')
+    if selected_statistics == 'Yearly Statistics':
+        filename += f'-{input_year}'
+    return exporter.response(aggregate_chunks(tables, exporter.chunk_rows), fmt, prefix + filename)
+
+# Expose the cache counters
+@server.route('/cache-stats')
+def cache_stats():
+    return flask.jsonify({
+        'figures': figure_cache.stats(),
+        'responses': response_cache.stats() if response_cache is not None else None,
+        'dataset': datasets.get().stats(),
+        'datasets': datasets.stats(),
+        'exports': exporter.stats(),
+        'static_bundle': static_bundle.stats() if static_bundle is not None else None,
+    })
 
 # Run the Dash app
 if __name__ == '__main__':
@@ -0,0 +1,140 @@
+"""Row indexes over the raw sales frame.
+
+The loader keeps rows sorted by Year, so each year is one contiguous row
+range and selecting it is a slice rather than a boolean scan of the whole
+frame.  Recession rows are kept as a sorted array of row positions.
+
+For cross filters (``cross_filter.CrossFilter``) every value of Month,
+Vehicle_Type and Recession also gets a bitmap of its rows, packed eight rows
+to a byte.  A filter is answered by OR-ing the bitmaps of the selected
+values of each column and AND-ing the columns (and the year range)
+together, which touches ``n_rows / 8`` bytes per bitmap instead of
+comparing every row of the frame.
+"""
+import numpy as np
+import pandas as pd
+
+# Columns with a bitmap per value
+BITMAP_COLUMNS = ('Month', 'Vehicle_Type', 'Recession')
+
+
+def _bitmaps(values):
+    """Packed bitmap of the rows of each distinct value in ``values``."""
+    codes, uniques = pd.factorize(values, sort=True)
+    return {
+        value: np.packbits(codes == code)
+        for code, value in enumerate(uniques.tolist())
+    }
+
+
+class RowIndex:
+
+    def __init__(self, n_rows, years, starts, stops, recession_rows, order=None, bitmaps=None, valid=None):
+        self.n_rows = n_rows
+        self.years = years
+        self.recession_rows = recession_rows
+        # Permutation that sorts the frame by Year, or None when it already is
+        self.order = order
+        self._ranges = {year: (start, stop) for year, start, stop in zip(years.tolist(), starts.tolist(), stops.tolist())}
+        # Column -> value -> packed bitmap of its rows
+        self.bitmaps = bitmaps or {}
+        # Packed bitmap of the rows with Year, Month and Vehicle_Type all
+        # present, the rows the cube counts
+        self.valid = valid
+
+    @classmethod
+    def from_frame(cls, frame):
+        years = frame['Year'].to_numpy()
+        order = None
+        if len(years) and np.any(years[1:] < years[:-1]):
+            order = np.argsort(years, kind='stable')
+            years = years[order]
+        unique = np.unique(years)
+        starts = np.searchsorted(years, unique, side='left')
+        stops = np.searchsorted(years, unique, side='right')
+        recession = frame['Recession'].to_numpy() == 1
+        recession_rows = np.flatnonzero(recession)
+        bitmaps = {
+            'Month': _bitmaps(frame['Month']),
+            'Vehicle_Type': _bitmaps(frame['Vehicle_Type']),
+            'Recession': _bitmaps(recession.astype(np.int8)),
+        }
+        valid = np.packbits(frame[['Year', 'Month', 'Vehicle_Type']].notna().all(axis=1).to_numpy())
+        return cls(len(frame), unique, starts, stops, recession_rows, order, bitmaps, valid)
+
+    @property
+    def nbytes(self):
+        arrays = [self.years, self.recession_rows, self.order, self.valid]
+        arrays += [bits for values in self.bitmaps.values() for bits in values.values()]
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    def year_rows(self, year):
+        start, stop = self._ranges.get(year, (0, 0))
+        if self.order is None:
+            return slice(start, stop)
+        return np.sort(self.order[start:stop])
+
+    def rows(self, year=None, recession=None):
+        """Row positions matching the given year and/or recession flag."""
+        if year is None:
+            if recession is None:
+                return slice(None)
+            if recession == 1:
+                return self.recession_rows
+            return np.setdiff1d(np.arange(self.n_rows), self.recession_rows, assume_unique=True)
+
+        year_rows = self.year_rows(year)
+        if recession is None:
+            return year_rows
+        if isinstance(year_rows, slice):
+            # Recession rows inside a contiguous range: two binary searches
+            lo, hi = np.searchsorted(self.recession_rows, [year_rows.start, year_rows.stop])
+            in_recession = self.recession_rows[lo:hi]
+            if recession == 1:
+                return in_recession
+            return np.setdiff1d(np.arange(year_rows.start, year_rows.stop), in_recession, assume_unique=True)
+        in_recession = np.isin(year_rows, self.recession_rows, assume_unique=True)
+        return year_rows[in_recession if recession == 1 else ~in_recession]
+
+    def select(self, frame, year=None, recession=None):
+        return frame.iloc[self.rows(year, recession)]
+
+    def _year_span(self, first, last):
+        """Start and stop row of the years ``first`` to ``last``."""
+        lo, hi = np.searchsorted(self.years, [first, last + 1])
+        if lo >= hi:
+            return 0, 0
+        return self._ranges[self.years[lo].item()][0], self._ranges[self.years[hi - 1].item()][1]
+
+    def filter_rows(self, where):
+        """Sorted positions of the rows passing the cross filter ``where``."""
+        start, stop = 0, self.n_rows
+        year_bits = None
+        if where.years is not None:
+            start, stop = self._year_span(*where.years)
+            if self.order is not None:
+                # The years are not contiguous in the frame
+                selected = np.zeros(self.n_rows, dtype=bool)
+                selected[self.order[start:stop]] = True
+                year_bits = np.packbits(selected)
+                start, stop = 0, self.n_rows
+        if start >= stop:
+            return np.empty(0, dtype=np.intp)
+        # Only the bytes covering the year range are combined and unpacked
+        first_byte, last_byte = start // 8, -(-stop // 8)
+        window = slice(first_byte, last_byte)
+        bitmap = self.valid[window] if year_bits is None else self.valid[window] & year_bits[window]
+        for column in BITMAP_COLUMNS:
+            values = self.bitmaps[column]
+            mask = where.mask(column, list(values))
+            if mask is None:
+                continue
+            selected = [bits[window] for bits, keep in zip(values.values(), mask) if keep]
+            if not selected:
+                return np.empty(0, dtype=np.intp)
+            bitmap = bitmap & np.bitwise_or.reduce(selected)
+        rows = np.flatnonzero(np.unpackbits(bitmap)) + first_byte * 8
+        return rows[(rows >= start) & (rows < stop)]
+
+    def select_where(self, frame, where):
+        return frame.iloc[self.filter_rows(where)]
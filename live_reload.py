@@ -0,0 +1,340 @@
+"""Live reload of the sales data without restarting the process.
+
+``LiveDataset`` holds the current ``Snapshot`` -- the raw frame (if kept),
+its row index, the aggregate cube and the version tokens the caches key
+on.  Callbacks read ``dataset.current`` once and work on that snapshot, so
+a reload is a single attribute swap and no request ever sees a mix of old
+and new data.
+
+A background thread polls the source file (``SALES_RELOAD_INTERVAL``
+seconds).  When rows were only appended, just the new lines are parsed and
+folded into the cube with ``SalesCube.merge``; anything else (the file was
+truncated or rewritten) triggers a full reload, as does any change with one
+of the SQL backends (``SALES_BACKEND``) or to a database or Parquet source.
+
+Appended rows are kept in a small delta segment with its own row index,
+selected from beside the base frame, so an append never copies or re-indexes
+the (possibly shared) base rows.
+
+With ``lazy=True`` (``DASHBOARD_STARTUP=lazy``) the first snapshot is loaded
+in a background thread, so the process can start serving before the data is
+in memory.  ``ready()`` tells whether it is; reading ``current`` before then
+waits for the load to finish.
+
+Besides the dataset version, a snapshot tracks the version at which each
+year and the recession rows last changed.  Figures drawn from one year or
+from the recession rows are keyed on those, so appending a month only
+invalidates the figures of the years it touched.
+"""
+import hashlib
+import os
+import threading
+import time
+from functools import cached_property
+
+import pandas as pd
+
+from aggregates import SalesCube
+from data_source import DEFAULT_CHUNK_SIZE, CSVSource, apply_schema, load_data
+from indexes import RowIndex
+from query_engine import load_cube
+
+# Bytes before the last read offset that must be unchanged for a grown file
+# to count as appended to
+TAIL_SIZE = 4096
+
+# Appended rows are kept in a delta segment beside the (possibly shared) base
+# frame; they are folded into it once they reach this share of its rows
+DELTA_SHARE = 0.25
+
+
+class Snapshot:
+
+    # Stat stamp of the source file the rows were read from and the bytes of
+    # it they cover, set by LiveDataset; None when unknown or not a file
+    stamp = None
+    extent = None
+
+    def __init__(self, version, data, row_index, cube, year_versions, recession_version, delta=None):
+        self.version = version
+        self.data = data
+        self.row_index = row_index
+        # (frame, row_index) of the rows appended since data was loaded
+        self.delta = delta
+        self.cube = cube
+        self.year_versions = year_versions
+        self.recession_version = recession_version
+
+    @classmethod
+    def load(cls, source, stream=False, chunksize=DEFAULT_CHUNK_SIZE, backend='pandas'):
+        version = source.fingerprint()
+        if backend != 'pandas':
+            # Every aggregate is a query against a database file
+            # (query_engine); no rows are held in memory
+            data = None
+            row_index = None
+            cube = load_cube(source, backend, chunksize)
+        elif stream:
+            # Fold the CSV into the aggregate cube chunk by chunk; the raw rows
+            # are never held in memory at once, so peak memory does not grow
+            # with the file.  Its totals are detailed enough to answer cross
+            # filters without them.
+            data = None
+            row_index = None
+            cube = SalesCube.from_chunks(source.read_chunks(chunksize), detailed=True)
+        else:
+            # Load the data from the local columnar cache, building it from the
+            # CSV on first start
+            data = load_data(source)
+
+            # Row ranges per year, the recession row set and per-value
+            # bitmaps, so raw rows can be selected without scanning the frame
+            row_index = RowIndex.from_frame(data)
+
+            # Fold the data once into the aggregate cube the charts are drawn
+            # from; cross filters the cube cannot answer read the rows
+            cube = SalesCube.from_frame(data).attach_rows(data, row_index)
+        year_versions = dict.fromkeys(cube.years.tolist(), version)
+        return cls(version, data, row_index, cube, year_versions, version)
+
+    @cached_property
+    def nbytes(self):
+        """Approximate memory of the rows, row index and cube."""
+        total = self.cube.nbytes
+        for frame, row_index in self.segments:
+            total += int(frame.memory_usage(index=False).sum()) + row_index.nbytes
+        return total
+
+    @property
+    def segments(self):
+        """The ``(frame, row_index)`` pairs holding the raw rows."""
+        if self.data is None:
+            return []
+        return [(self.data, self.row_index)] + ([self.delta] if self.delta is not None else [])
+
+    def unchanged(self, source):
+        """True while the file of ``source`` is as the rows were read from it."""
+        return self.stamp is not None and source.path is not None and _file_stamp(source.path) == self.stamp
+
+    def year_version(self, year):
+        # Years without rows have no version of their own
+        return self.year_versions.get(year, self.version)
+
+    def append(self, frame, version):
+        """New snapshot with the rows of ``frame`` added.
+
+        The rows go to the delta segment, so the base frame is neither copied
+        nor indexed again; only once the delta grows past ``DELTA_SHARE`` of
+        the base are the two merged.
+        """
+        cube = self.cube.merge(SalesCube.from_frame(frame, detailed=self.cube.detailed))
+        data, row_index, delta = self.data, self.row_index, None
+        if data is not None:
+            rows = frame if self.delta is None else pd.concat([self.delta[0], frame], ignore_index=True)
+            if len(rows) > len(data) * DELTA_SHARE:
+                data, row_index = _merged(data, rows)
+            else:
+                rows = _sorted(apply_schema(rows))
+                delta = (rows, RowIndex.from_frame(rows))
+            cube.attach_rows(data, row_index, *([delta] if delta is not None else []))
+
+        year_versions = dict(self.year_versions)
+        year_versions.update(dict.fromkeys(frame['Year'].dropna().astype(int).unique().tolist(), version))
+        recession_version = version if (frame['Recession'] == 1).any() else self.recession_version
+        return Snapshot(version, data, row_index, cube, year_versions, recession_version, delta)
+
+
+def _sorted(frame):
+    if frame['Year'].is_monotonic_increasing:
+        return frame
+    return frame.sort_values('Year', kind='stable', ignore_index=True)
+
+
+def _merged(data, rows):
+    """``data`` and ``rows`` as one frame sorted by year, with its row index."""
+    # Categoricals with different categories concatenate to object columns,
+    # so the schema is applied again
+    rows = _sorted(rows)
+    merged = apply_schema(pd.concat([data, rows], ignore_index=True))
+    if rows['Year'].min() < data['Year'].max():
+        merged = merged.sort_values('Year', kind='stable', ignore_index=True)
+    return merged, RowIndex.from_frame(merged)
+
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def _read_tail(path, offset):
+    with open(path, 'rb') as fh:
+        fh.seek(max(offset - TAIL_SIZE, 0))
+        return fh.read(offset - max(offset - TAIL_SIZE, 0))
+
+
+class LiveDataset:
+
+    def __init__(self, source, stream=False, chunksize=DEFAULT_CHUNK_SIZE, lazy=False, backend='pandas'):
+        self.source = source
+        self.stream = stream
+        self.chunksize = chunksize
+        self.backend = backend
+        self.lazy = lazy
+        self.appends = 0
+        self.reloads = 0
+        self.last_error = None
+        self.load_seconds = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._current = None
+        self._loaded = threading.Event()
+        if lazy:
+            threading.Thread(target=self._first_load, name='sales-warmup', daemon=True).start()
+        else:
+            self._first_load()
+
+    @classmethod
+    def from_env(cls, source):
+        dataset = cls(
+            source,
+            stream=os.environ.get('SALES_INGEST') == 'stream',
+            chunksize=int(os.environ.get('SALES_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)),
+            lazy=os.environ.get('DASHBOARD_STARTUP') == 'lazy',
+            backend=os.environ.get('SALES_BACKEND', 'pandas'),
+        )
+        interval = float(os.environ.get('SALES_RELOAD_INTERVAL', 0))
+        if interval > 0:
+            dataset.watch(interval)
+        return dataset
+
+    def _first_load(self):
+        start = time.perf_counter()
+        try:
+            self._current = self._load()
+        except Exception as exc:
+            self.last_error = repr(exc)
+            # Eager startup fails the import as before; a lazy one reports
+            # the error through ready() and current
+            if not self.lazy:
+                raise
+        finally:
+            self.load_seconds = time.perf_counter() - start
+            self._loaded.set()
+
+    @property
+    def current(self):
+        if self._current is None:
+            self._loaded.wait()
+            if self._current is None:
+                raise RuntimeError(f'The sales data failed to load: {self.last_error}')
+        return self._current
+
+    def ready(self):
+        """True once the first snapshot is loaded."""
+        return self._current is not None
+
+    def _load(self):
+        path = self.source.path
+        before = _file_stamp(path) if path else None
+        snapshot = Snapshot.load(self.source, self.stream, self.chunksize, self.backend)
+        self._stamp = None
+        if path and before is not None and _file_stamp(path) == before:
+            self._stamp = snapshot.stamp = before
+            self._offset = snapshot.extent = before[0]
+            self._tail = _read_tail(path, self._offset)
+            self._columns = self.source.columns()
+        # Otherwise the file changed while loading and the next refresh
+        # reloads it in full
+        return snapshot
+
+    def subscribe(self, listener):
+        """Call ``listener(snapshot)`` after every swap."""
+        self._listeners.append(listener)
+
+    def _swap(self, snapshot):
+        self._current = snapshot
+        for listener in self._listeners:
+            listener(snapshot)
+
+    def _appended(self, stamp):
+        # A grown file whose previously read bytes are untouched
+        if self._stamp is None or stamp[0] <= self._offset:
+            return False
+        return _read_tail(self.source.path, self._offset) == self._tail
+
+    def refresh(self):
+        """Pick up changes to the source; True if a new snapshot was swapped in."""
+        path = self.source.path
+        if path is None:
+            return False
+        with self._lock:
+            stamp = _file_stamp(path)
+            if stamp is None or stamp == self._stamp:
+                return False
+
+            # A database copy of the file is rebuilt rather than appended to,
+            # since every worker only reads it.  Only CSV lines can be read
+            # from an offset; a grown database or Parquet file is reloaded.
+            appendable = self.backend == 'pandas' and isinstance(self.source, CSVSource)
+            if not appendable or not self._appended(stamp):
+                self._swap(self._load())
+                self.reloads += 1
+                return True
+
+            frame, offset = self.source.read_appended(self._offset, self._columns)
+            # Derived from the previous version and the new end of data, so
+            # the same rows always map to the same version
+            token = f'{self.current.version}:{offset}'
+            self._stamp = stamp
+            self._offset = offset
+            self._tail = _read_tail(path, offset)
+            if frame is None:
+                return False
+            version = hashlib.sha1(token.encode('utf-8')).hexdigest()[:16]
+            snapshot = self.current.append(frame, version)
+            snapshot.stamp = stamp
+            snapshot.extent = offset
+            self._swap(snapshot)
+            self.appends += 1
+            return True
+
+    def watch(self, interval):
+        """Poll the source every ``interval`` seconds in a daemon thread."""
+        if self._thread is not None:
+            return
+        stop = threading.Event()
+
+        def run():
+            self._loaded.wait()
+            while not stop.wait(interval):
+                try:
+                    self.refresh()
+                    self.last_error = None
+                except Exception as exc:  # keep serving the last good snapshot
+                    self.last_error = repr(exc)
+
+        self._stop = stop
+        self._thread = threading.Thread(target=run, name='sales-live-reload', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        return {
+            'ready': self.ready(),
+            'backend': self.backend,
+            'version': self._current.version if self._current is not None else None,
+            'load_seconds': self.load_seconds,
+            'watching': self._thread is not None,
+            'appends': self.appends,
+            'reloads': self.reloads,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,238 @@
+"""Per-stage timings and a Prometheus ``/metrics`` route for the dashboard.
+
+Chart builders time their stages with a stopwatch::
+
+    watch = metrics.stopwatch()
+    frame = cube.series(...)
+    watch.lap('aggregate')     # pandas / cube reduction
+    figure = px.line(frame, ...)
+    watch.lap('figure')        # Plotly Express construction
+    figure.update_layout(...)
+    watch.lap('layout')
+
+and the Flask hooks time each ``_dash-update-component`` request.  The
+time a request spends outside the callback is reported as the ``encode``
+stage (Dash dispatch and JSON encoding).  Samples go into histograms;
+counters of other components (the figure and response caches) are read
+when ``/metrics`` is scraped.
+
+Disabled (the default), ``stopwatch()`` returns a shared no-op object and
+no hooks or routes are installed.  Configured through ``DASHBOARD_METRICS``
+(``1`` to enable) and ``DASHBOARD_TRACE_LOG`` (a file, or ``-`` for
+stderr, that gets one JSON line per callback request).  Metrics are per
+process; with gunicorn every worker keeps its own.
+"""
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+import flask
+
+# Histogram buckets, in seconds and bytes
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (1_000, 10_000, 30_000, 100_000, 300_000, 1_000_000, 10_000_000)
+
+# Fields of a stats() dict that only ever grow
+COUNTER_FIELDS = {'hits', 'misses', 'evictions', 'appends', 'reloads', 'shared', 'loads', 'changes', 'exports', 'rejected', 'figure_hits', 'response_hits', 'mismatches'}
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def samples(self, name):
+        with self._lock:
+            items = [(labels, list(counts), count, total) for labels, (counts, count, total) in self._series.items()]
+        for labels, counts, count, total in sorted(items):
+            for bound, cumulative in zip(self.buckets, counts):
+                yield f'{name}_bucket', labels + (('le', repr(float(bound))),), cumulative
+            yield f'{name}_bucket', labels + (('le', '+Inf'),), count
+            yield f'{name}_count', labels, count
+            yield f'{name}_sum', labels, total
+
+
+class _NullStopwatch:
+
+    def lap(self, stage):
+        pass
+
+
+NULL_STOPWATCH = _NullStopwatch()
+
+
+class Stopwatch:
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        """Record the time since the previous lap (or start) under ``stage``."""
+        now = time.perf_counter()
+        self.metrics.observe_stage(stage, now - self.last)
+        self.last = now
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    body = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels)
+    return '{' + body + '}'
+
+
+class Metrics:
+
+    def __init__(self, enabled=False, trace_log=None):
+        self.enabled = enabled
+        self.trace_log = trace_log
+        self.stages = Histogram(LATENCY_BUCKETS)
+        self.requests = Histogram(LATENCY_BUCKETS)
+        self.response_bytes = Histogram(SIZE_BUCKETS)
+        self._stats = {}
+        self._local = threading.local()
+        self._trace_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        trace_log = os.environ.get('DASHBOARD_TRACE_LOG') or None
+        enabled = os.environ.get('DASHBOARD_METRICS') == '1' or trace_log is not None
+        return cls(enabled, trace_log)
+
+    def stopwatch(self):
+        if not self.enabled:
+            return NULL_STOPWATCH
+        return Stopwatch(self)
+
+    def timed(self, stage):
+        """Decorator recording every call of the function under ``stage``."""
+        def decorate(function):
+            if not self.enabled:
+                return function
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.observe_stage(stage, time.perf_counter() - start)
+            return wrapper
+        return decorate
+
+    def observe_stage(self, stage, seconds):
+        self.stages.observe((('stage', stage),), seconds)
+        trace = getattr(self._local, 'trace', None)
+        if trace is not None:
+            trace[stage] = trace.get(stage, 0.0) + seconds
+
+    def register_stats(self, name, stats):
+        """Expose the numeric fields of ``stats()`` as ``dashboard_<name>_*``."""
+        self._stats[name] = stats
+
+    def init_app(self, server):
+        if not self.enabled:
+            return
+        # Registered before other request hooks so that requests answered
+        # from a before_request cache are timed as well
+        server.before_request(self._start)
+        server.after_request(self._finish)
+        server.add_url_rule('/metrics', 'metrics', self._serve_metrics)
+
+    def _start(self):
+        if flask.request.path.endswith('/_dash-update-component'):
+            self._local.trace = {}
+            flask.g.metrics_start = time.perf_counter()
+
+    def _finish(self, response):
+        start = flask.g.pop('metrics_start', None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        trace = self._local.trace
+        self._local.trace = None
+
+        body = flask.request.get_json(silent=True) or {}
+        output = str(body.get('output', ''))
+        cache = response.headers.get('X-Response-Cache', 'none')
+        size = response.calculate_content_length() or 0
+        self.requests.observe((('output', output), ('response_cache', cache)), elapsed)
+        self.response_bytes.observe((('output', output),), size)
+
+        # Everything outside the callback: Dash dispatch and JSON encoding
+        callback = trace.get('callback')
+        if callback is not None:
+            trace['encode'] = max(elapsed - callback, 0.0)
+            self.stages.observe((('stage', 'encode'),), trace['encode'])
+
+        if self.trace_log is not None:
+            self._write_trace({
+                'time': time.time(),
+                'output': output,
+                'inputs': {f"{i.get('id')}.{i.get('property')}": i.get('value') for i in body.get('inputs', []) if isinstance(i, dict)},
+                'status': response.status_code,
+                'response_cache': cache,
+                'bytes': size,
+                'total_ms': elapsed * 1000,
+                'stages_ms': {stage: seconds * 1000 for stage, seconds in trace.items()},
+            })
+        return response
+
+    def _write_trace(self, record):
+        line = json.dumps(record, default=str) + '\n'
+        with self._trace_lock:
+            if self.trace_log == '-':
+                sys.stderr.write(line)
+            else:
+                with open(self.trace_log, 'a') as fh:
+                    fh.write(line)
+
+    def samples(self):
+        for sample in self.stages.samples('dashboard_stage_seconds'):
+            yield 'histogram', sample
+        for sample in self.requests.samples('dashboard_request_seconds'):
+            yield 'histogram', sample
+        for sample in self.response_bytes.samples('dashboard_response_bytes'):
+            yield 'histogram', sample
+        for name, stats in self._stats.items():
+            values = stats() or {}
+            for field, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                if field in COUNTER_FIELDS:
+                    yield 'counter', (f'dashboard_{name}_{field}_total', (), value)
+                else:
+                    yield 'gauge', (f'dashboard_{name}_{field}', (), value)
+
+    def render(self):
+        """Prometheus text exposition format."""
+        lines = []
+        typed = set()
+        for kind, (name, labels, value) in self.samples():
+            # Drop the _bucket/_count/_sum or _total suffix
+            family = name.rsplit('_', 1)[0] if kind in ('histogram', 'counter') else name
+            if family not in typed:
+                lines.append(f'# TYPE {family} {kind}')
+                typed.add(family)
+            lines.append(f'{name}{_format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def _serve_metrics(self):
+        return flask.Response(self.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
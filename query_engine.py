@@ -0,0 +1,379 @@
+"""Aggregate pushdown to an embedded SQL engine.
+
+With ``SALES_BACKEND=sqlite`` or ``SALES_BACKEND=duckdb`` the sales rows stay
+in a database file and every chart aggregate runs as one GROUP BY query
+against it (``SqlCube``).  Only the few result rows reach Python, so the
+memory of a worker does not grow with the number of rows.  The default
+``pandas`` backend keeps the in-memory ``SalesCube``.
+
+A CSV source is copied once, in chunks of ``SALES_CHUNK_SIZE`` rows, into
+``<SALES_CACHE_DIR>/<fingerprint>.sqlite`` (or ``.duckdb``).  A
+``SALES_DATA_PATH`` naming a database with a ``sales`` table is queried in
+place, and so is a Parquet file with DuckDB.  SQLite ships with Python;
+DuckDB needs ``pip install duckdb``.
+
+Cross filters (``cross_filter.CrossFilter``) become extra WHERE conditions
+(``filter_sql``); filtered results are not memoized, the figure cache holds
+the charts drawn from them.
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from aggregates import DIMENSIONS, DRIVERS, MEASURES, MONTH_ORDER, date_series, parse_date_totals
+from binning import reduce_totals
+from data_source import DEFAULT_CHUNK_SIZE, DatabaseSource, cache_path, prune_cache
+
+TABLE = 'sales'
+# The columns the charts query; a CSV is copied with only these
+COLUMNS = ('Date',) + DIMENSIONS + DRIVERS + MEASURES
+
+# Rows with a missing key are left out, as SalesCube does
+KEYS_PRESENT = 'Year IS NOT NULL AND Month IS NOT NULL AND Vehicle_Type IS NOT NULL'
+RECESSION = 'COALESCE(CAST(Recession AS INTEGER), 0) = 1'
+RECESSION_KEY = f'CASE WHEN {RECESSION} THEN 1 ELSE 0 END'
+
+MONTH_RANK = {month: i for i, month in enumerate(MONTH_ORDER)}
+
+
+def filter_sql(where):
+    """WHERE conditions and parameters for the cross filter ``where``."""
+    conditions, params = [], []
+    if not where:
+        return conditions, params
+    if where.years is not None:
+        conditions.append('Year BETWEEN ? AND ?')
+        params.extend(where.years)
+    for column, values in (('Month', where.months), ('Vehicle_Type', where.vehicle_types)):
+        if values:
+            conditions.append(f'{column} IN ({", ".join("?" * len(values))})')
+            params.extend(values)
+    if where.recession is not None:
+        conditions.append(RECESSION if where.recession == 1 else f'NOT ({RECESSION})')
+    return conditions, params
+
+
+class SqliteEngine:
+
+    extension = 'sqlite'
+
+    def connect(self, path, read_only=True):
+        if read_only:
+            return sqlite3.connect(f'file:{path}?mode=ro', uri=True, check_same_thread=False)
+        return sqlite3.connect(path)
+
+    def relation(self, path):
+        return TABLE
+
+    def insert(self, connection, frame):
+        frame.to_sql(TABLE, connection, if_exists='append', index=False)
+
+    def finish(self, connection):
+        # Year filters read one index range instead of the whole table
+        connection.execute(f'CREATE INDEX {TABLE}_year ON {TABLE} (Year)')
+        connection.commit()
+
+
+class DuckdbEngine:
+
+    extension = 'duckdb'
+
+    def connect(self, path, read_only=True):
+        import duckdb
+        if path.endswith('.parquet'):
+            # Queried in place through read_parquet()
+            return duckdb.connect()
+        return duckdb.connect(path, read_only=read_only)
+
+    def relation(self, path):
+        if path.endswith('.parquet'):
+            return "read_parquet('{}')".format(path.replace("'", "''"))
+        return TABLE
+
+    def insert(self, connection, frame):
+        connection.register('chunk', frame)
+        exists = connection.execute(
+            'SELECT count(*) FROM information_schema.tables WHERE table_name = ?', [TABLE]
+        ).fetchone()[0]
+        if exists:
+            connection.execute(f'INSERT INTO {TABLE} SELECT * FROM chunk')
+        else:
+            connection.execute(f'CREATE TABLE {TABLE} AS SELECT * FROM chunk')
+        connection.unregister('chunk')
+
+    def finish(self, connection):
+        connection.execute('CHECKPOINT')
+
+
+ENGINES = {
+    'sqlite': SqliteEngine(),
+    'duckdb': DuckdbEngine(),
+}
+
+
+def _plain(frame):
+    """``frame`` with the queried columns in types both engines take."""
+    columns = {}
+    for name in COLUMNS:
+        if name not in frame.columns:
+            continue
+        column = frame[name]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            column = column.astype(object).where(column.notna(), None)
+        elif name == 'Recession':
+            column = column.astype(np.int8)
+        columns[name] = column
+    return pd.DataFrame(columns)
+
+
+def build_database(source, path, engine, chunksize=DEFAULT_CHUNK_SIZE):
+    """Copy the rows of ``source`` into a new database at ``path``."""
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    # Built in a scratch directory and renamed into place, so concurrent
+    # workers never open a half-written database
+    scratch = tempfile.mkdtemp(prefix='.building-', dir=parent)
+    try:
+        target = os.path.join(scratch, os.path.basename(path))
+        connection = engine.connect(target, read_only=False)
+        try:
+            empty = True
+            for chunk in source.read_chunks(chunksize):
+                engine.insert(connection, _plain(chunk))
+                empty = False
+            if empty:
+                raise ValueError('No rows to aggregate')
+            engine.finish(connection)
+        finally:
+            connection.close()
+        try:
+            os.rename(target, path)
+        except OSError:
+            # Another process won the race
+            if not os.path.exists(path):
+                raise
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def load_cube(source, backend, chunksize=DEFAULT_CHUNK_SIZE, cache_dir=None):
+    """``SqlCube`` over ``source``, copying a CSV into a database first."""
+    if backend not in ENGINES:
+        raise ValueError(f'Unknown backend {backend!r}; expected pandas or one of {sorted(ENGINES)}')
+    engine = ENGINES[backend]
+    if isinstance(source, DatabaseSource):
+        path = source.path
+    else:
+        path = cache_path(source, cache_dir, engine.extension)
+        if not os.path.exists(path):
+            build_database(source, path, engine, chunksize)
+            prune_cache(path)
+    return SqlCube(lambda: engine.connect(path), engine.relation(path))
+
+
+def _in_label_order(frame, column):
+    """Rows sorted on ``column`` the way SalesCube orders its labels."""
+    frame = frame.sort_values(column, kind='stable')
+    if column == 'Month':
+        rank = frame['Month'].map(MONTH_RANK).fillna(len(MONTH_ORDER)).to_numpy()
+        frame = frame.iloc[np.argsort(rank, kind='stable')]
+    return frame.reset_index(drop=True)
+
+
+class SqlCube:
+    """The query interface of ``SalesCube``, answered by SQL queries.
+
+    Results are memoized per instance; a new snapshot gets a new instance.
+    Each thread (and forked process) opens its own connection.
+    """
+
+    # The rows stay in the database; only small query results are held
+    nbytes = 0
+
+    def __init__(self, connect, relation=TABLE):
+        self._connect = connect
+        self.relation = relation
+        self._local = threading.local()
+        self._memo = {}
+        # Read from the Year index alone, without a scan of the table
+        years = self._query(f'SELECT DISTINCT Year FROM {relation} WHERE Year IS NOT NULL ORDER BY Year')
+        self.years = np.array([int(year) for year, in years], dtype=np.int64)
+        self._year_index = {year: i for i, year in enumerate(self.years.tolist())}
+
+    def _query_cursor(self, sql, params=()):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = self._local.connection = self._connect()
+            self._local.pid = os.getpid()
+        return connection.execute(sql, list(params))
+
+    def _query(self, sql, params=()):
+        return self._query_cursor(sql, params).fetchall()
+
+    def _memoized(self, key, compute):
+        result = self._memo.get(key)
+        if result is None:
+            result = self._memo[key] = compute()
+        return result
+
+    def has_year(self, year):
+        return year in self._year_index
+
+    @cached_property
+    def row_count(self):
+        return self._query(f'SELECT COUNT(*) FROM {self.relation} WHERE {KEYS_PRESENT}')[0][0]
+
+    def _aggregate(self, measure, stat):
+        if measure not in MEASURES:
+            raise ValueError(f'Unknown measure {measure!r}')
+        if stat == 'mean':
+            return f'AVG({measure})'
+        if stat == 'sum':
+            return f'COALESCE(SUM({measure}), 0)'
+        raise ValueError(f'Unsupported statistic {stat!r}')
+
+    def _frame(self, rows, columns, stat):
+        frame = pd.DataFrame(rows, columns=columns)
+        measure = columns[-1]
+        if stat == 'mean' or frame[measure].dtype == object:
+            frame[measure] = frame[measure].astype(np.float64)
+        if 'Recession' in columns:
+            frame['Recession'] = frame['Recession'].astype(np.int64)
+        return frame
+
+    def series(self, measure, by, stat='mean', year=None, recession=None, where=None):
+        """Aggregate ``measure`` grouped by one dimension; see SalesCube.series."""
+        if by not in DIMENSIONS:
+            raise ValueError(f'Unknown dimension {by!r}')
+
+        def compute():
+            conditions, params = filter_sql(where)
+            conditions.insert(0, KEYS_PRESENT)
+            if year is not None:
+                if year not in self._year_index:
+                    return self._frame([], [by, measure], stat)
+                conditions.append('Year = ?')
+                params.append(int(year))
+            if recession is not None:
+                conditions.append(RECESSION if recession == 1 else f'NOT ({RECESSION})')
+            key = RECESSION_KEY if by == 'Recession' else by
+            rows = self._query(
+                f'SELECT {key}, {self._aggregate(measure, stat)} FROM {self.relation} '
+                f'WHERE {" AND ".join(conditions)} GROUP BY 1',
+                params,
+            )
+            return _in_label_order(self._frame(rows, [by, measure], stat), by)
+
+        if where:
+            return compute()
+        return self._memoized(('series', measure, by, stat, year, recession), compute)
+
+    def by_year(self, measure, by, years, stat='mean'):
+        """Aggregate ``measure`` per year and ``by``; see SalesCube.by_year."""
+        if by not in DIMENSIONS:
+            raise ValueError(f'Unknown dimension {by!r}')
+        years = [int(year) for year in years if year in self._year_index]
+
+        def compute():
+            if not years:
+                return self._frame([], ['Year', by, measure], stat)
+            key = RECESSION_KEY if by == 'Recession' else by
+            rows = self._query(
+                f'SELECT Year, {key}, {self._aggregate(measure, stat)} FROM {self.relation} '
+                f'WHERE {KEYS_PRESENT} AND Year IN ({", ".join("?" * len(years))}) GROUP BY 1, 2',
+                years,
+            )
+            frame = _in_label_order(self._frame(rows, ['Year', by, measure], stat), by)
+            # Years in the order they were asked for
+            rank = frame['Year'].map({year: i for i, year in enumerate(years)}).to_numpy()
+            return frame.iloc[np.argsort(rank, kind='stable')].reset_index(drop=True)
+
+        return self._memoized(('by_year', measure, by, tuple(years), stat), compute)
+
+    @cached_property
+    def columns(self):
+        cursor = self._query_cursor(f'SELECT * FROM {self.relation} LIMIT 0')
+        return [column[0] for column in cursor.description]
+
+    def iter_rows(self, where=None, chunksize=DEFAULT_CHUNK_SIZE):
+        """The rows passing ``where`` as frames of up to ``chunksize`` rows.
+
+        Fetched from the cursor one chunk at a time; yields at least one
+        (possibly empty) frame.
+        """
+        conditions, params = filter_sql(where)
+        cursor = self._query_cursor(
+            f'SELECT * FROM {self.relation} WHERE {" AND ".join([KEYS_PRESENT] + conditions)}', params
+        )
+        columns = [column[0] for column in cursor.description]
+        rows = cursor.fetchmany(chunksize)
+        yield pd.DataFrame(rows, columns=columns)
+        while rows:
+            rows = cursor.fetchmany(chunksize)
+            if rows:
+                yield pd.DataFrame(rows, columns=columns)
+
+    def driver_totals(self, driver, where=None):
+        """Sum and count of Automobile_Sales per (Vehicle_Type, driver, Recession)."""
+        if driver not in DRIVERS or driver not in self.columns:
+            raise KeyError(driver)
+
+        def compute():
+            conditions, params = filter_sql(where)
+            rows = self._query(
+                f'SELECT Vehicle_Type, {driver}, {RECESSION_KEY}, COALESCE(SUM(Automobile_Sales), 0), '
+                f'COUNT(Automobile_Sales) FROM {self.relation} '
+                f'WHERE {" AND ".join([KEYS_PRESENT, f"{driver} IS NOT NULL"] + conditions)} GROUP BY 1, 2, 3',
+                params,
+            )
+            totals = pd.DataFrame(rows, columns=['Vehicle_Type', driver, 'Recession', 'sum', 'count'])
+            totals['Recession'] = totals['Recession'].astype(bool)
+            totals['sum'] = totals['sum'].astype(np.float64)
+            return totals
+
+        if where:
+            return compute()
+        return self._memoized(('driver_totals', driver), compute)
+
+    def by_driver(self, driver, binning=None, recession=None, where=None):
+        """Average Automobile_Sales per vehicle type and driver value or bin;
+        see SalesCube.by_driver."""
+        if where:
+            return reduce_totals(self.driver_totals(driver, where), driver, binning, recession)
+        return self._memoized(
+            ('by_driver', driver, binning.key if binning is not None else None, recession),
+            lambda: reduce_totals(self.driver_totals(driver), driver, binning, recession),
+        )
+
+    def _date_totals(self, where=None):
+        conditions, params = filter_sql(where)
+        rows = self._query(
+            f'SELECT Date, {RECESSION_KEY}, COALESCE(SUM(Automobile_Sales), 0), COUNT(Automobile_Sales) '
+            f'FROM {self.relation} WHERE {" AND ".join([KEYS_PRESENT, "Date IS NOT NULL"] + conditions)} '
+            'GROUP BY 1, 2',
+            params,
+        )
+        totals = pd.DataFrame(rows, columns=['Date', 'Recession', 'sum', 'count'])
+        totals['Recession'] = totals['Recession'].astype(bool)
+        totals['sum'] = totals['sum'].astype(np.float64)
+        return parse_date_totals(totals)
+
+    @cached_property
+    def date_totals(self):
+        """Sum and count of Automobile_Sales per (Date, Recession)."""
+        return self._date_totals()
+
+    def timeseries(self, granularity, recession=None, where=None):
+        """Average Automobile_Sales per month or day; see SalesCube.timeseries."""
+        if where:
+            return date_series(self._date_totals(where), granularity, recession)
+        return self._memoized(
+            ('timeseries', granularity, recession),
+            lambda: date_series(self.date_totals, granularity, recession),
+        )
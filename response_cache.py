@@ -0,0 +1,179 @@
+"""Byte-level cache for encoded Dash callback responses.
+
+Even when the figures come from ``FigureCache``, Dash still walks the
+component tree and JSON-encodes every figure (layout and template included)
+on each callback.  ``ResponseCache`` sits in front of the
+``_dash-update-component`` route and replays the encoded payload of a
+previous identical request byte for byte, optionally pre-compressed with
+gzip or brotli.  The data version is part of every key and the cache is
+emptied when it changes.  Keys also name the dataset the request selected,
+so ``discard`` can drop the responses of an evicted dataset.  Misses can
+be read through from another source of encoded payloads (``read_through``),
+such as a static bundle.
+
+Configured through ``RESPONSE_CACHE`` (``1`` to enable),
+``RESPONSE_CACHE_SIZE`` and ``RESPONSE_CACHE_COMPRESSION`` (comma
+separated, e.g. ``gzip,br``).
+"""
+import gzip
+import hashlib
+import json
+import os
+
+import flask
+
+from figure_cache import MemoryBackend
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+DEFAULT_SIZE = 256
+
+# Callback outputs of the dashboard whose responses are cached
+OUTPUTS = ['output-container.children', 'output-chart1.figure']
+
+# Input holding the name of the dataset a request is for
+DATASET_INPUT = 'dropdown-dataset'
+
+COMPRESSORS = {
+    'gzip': lambda payload: gzip.compress(payload, compresslevel=9, mtime=0),
+}
+if brotli is not None:
+    COMPRESSORS['br'] = lambda payload: brotli.compress(payload, quality=11)
+
+
+def request_token(body):
+    """Digest of the outputs, inputs and state of a callback request."""
+    request_args = {
+        'output': body['output'],
+        'inputs': [(i.get('id'), i.get('property'), i.get('value')) for i in body.get('inputs', [])],
+        'state': [(s.get('id'), s.get('property'), s.get('value')) for s in body.get('state', [])],
+    }
+    token = json.dumps(request_args, sort_keys=True, default=str)
+    return hashlib.sha1(token.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+
+    def __init__(self, version, outputs, maxsize=DEFAULT_SIZE, encodings=('gzip',), dataset_input=DATASET_INPUT):
+        # ``version`` is a callable so a reloaded dataset is picked up
+        self.version = version
+        self.outputs = set(outputs)
+        self.dataset_input = dataset_input
+        self.encodings = [e for e in encodings if e in COMPRESSORS]
+        self.store = MemoryBackend(maxsize)
+        self.hits = 0
+        self.misses = 0
+        self.source = None
+        self._seen_version = None
+
+    @classmethod
+    def from_env(cls, version, outputs):
+        if os.environ.get('RESPONSE_CACHE') != '1':
+            return None
+        encodings = os.environ.get('RESPONSE_CACHE_COMPRESSION', 'gzip')
+        return cls(
+            version,
+            outputs,
+            maxsize=int(os.environ.get('RESPONSE_CACHE_SIZE', DEFAULT_SIZE)),
+            encodings=[e.strip() for e in encodings.split(',') if e.strip()],
+        )
+
+    def read_through(self, source):
+        """Look up misses in ``source.get(key)`` (encoded payload or None)."""
+        self.source = source
+
+    def init_app(self, server):
+        server.before_request(self._serve)
+        server.after_request(self._store)
+
+    def _key(self, body):
+        if not isinstance(body, dict):
+            return None
+        # ``outputs`` is a single {id, property} dict or a list of them
+        outputs = body.get('outputs')
+        if isinstance(outputs, dict):
+            outputs = [outputs]
+        targets = {f"{o.get('id')}.{o.get('property')}" for o in outputs or [] if isinstance(o, dict)}
+        if not targets & self.outputs:
+            return None
+        return (self.version(), self._dataset(body), request_token(body))
+
+    def _dataset(self, body):
+        for item in body.get('inputs', []) + body.get('state', []):
+            if isinstance(item, dict) and item.get('id') == self.dataset_input:
+                return item.get('value')
+        return None
+
+    def _entry(self, payload):
+        entry = {'identity': payload}
+        for encoding in self.encodings:
+            entry[encoding] = COMPRESSORS[encoding](payload)
+        return entry
+
+    def _accepted_encoding(self):
+        accepted = flask.request.accept_encodings
+        for encoding in self.encodings:
+            if accepted[encoding]:
+                return encoding
+        return None
+
+    def _response(self, entry, status):
+        encoding = self._accepted_encoding()
+        response = flask.Response(entry[encoding or 'identity'], content_type='application/json')
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['X-Response-Cache'] = status
+        return response
+
+    def _serve(self):
+        request = flask.request
+        if request.method != 'POST' or not request.path.endswith('/_dash-update-component'):
+            return None
+        version = self.version()
+        if version != self._seen_version:
+            self.store.clear()
+            self._seen_version = version
+        key = self._key(request.get_json(silent=True))
+        if key is None:
+            return None
+        entry = self.store.get(key)
+        if entry is not None:
+            self.hits += 1
+            return self._response(entry, 'hit')
+        payload = self.source.get(key) if self.source is not None else None
+        if payload is not None:
+            entry = self._entry(payload)
+            self.store.set(key, entry)
+            self.hits += 1
+            return self._response(entry, 'read-through')
+        self.misses += 1
+        flask.g.response_cache_key = key
+        return None
+
+    def _store(self, response):
+        key = flask.g.pop('response_cache_key', None)
+        if key is None or response.status_code != 200 or response.direct_passthrough:
+            return response
+        if response.headers.get('Content-Encoding'):
+            return response
+        entry = self._entry(response.get_data())
+        self.store.set(key, entry)
+        # Serve the freshly stored entry so the first response matches repeats
+        return self._response(entry, 'miss')
+
+    def discard(self, dataset_name):
+        """Drop the cached responses for ``dataset_name``; returns how many."""
+        return self.store.discard(lambda key: key[1] == dataset_name)
+
+    def stats(self):
+        return {
+            'size': len(self.store),
+            'maxsize': self.store.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'encodings': self.encodings,
+        }
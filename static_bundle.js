@@ -0,0 +1,67 @@
+// Answers the Dash API of a static bundle site (static_bundle.py) from the
+// bundle's files, so the dashboard runs on a plain file server or CDN.
+// Loaded before the Dash renderer: the layout and the callback graph are
+// read from JSON files, and each callback POST becomes a GET of the response
+// rendered for its inputs.  Any other request goes to the network as usual.
+(function () {
+    var network = window.fetch.bind(window);
+    var API = /_dash-(layout|dependencies|update-component)$/;
+
+    function slug(value) {
+        return String(value).toLowerCase().replace(/ /g, '-');
+    }
+
+    function noUpdate() {
+        // What Dash answers when a callback prevents its update
+        return Promise.resolve(new Response(null, {status: 204}));
+    }
+
+    function json(path) {
+        return network(path).then(function (response) {
+            if (!response.ok) {
+                return new Response(null, {status: 204});
+            }
+            // The renderer only reads bodies sent as JSON, whatever type the
+            // file server gives the file
+            return response.text().then(function (text) {
+                return new Response(text, {status: 200, headers: {'Content-Type': 'application/json'}});
+            });
+        });
+    }
+
+    // Mirrors response_path() and control_path() of static_bundle.py
+    function responsePath(body) {
+        var values = {};
+        (body.inputs || []).forEach(function (input) {
+            values[input.id] = input.value;
+        });
+        var statistics = values['dropdown-statistics'];
+        if (body.output !== 'output-container.children') {
+            return 'responses/controls/' + body.output.split('.')[0] + '/' + slug(statistics) + '.json';
+        }
+        if (values['cross-filter'] || statistics === 'Year Comparison') {
+            return null;
+        }
+        var granularity = values['select-granularity'];
+        if (statistics === 'Recession Period Statistics') {
+            return 'responses/recession/' + granularity + '.json';
+        }
+        if (statistics === 'Yearly Statistics') {
+            return 'responses/yearly/' + slug(values['select-year']) + '/' + granularity + '.json';
+        }
+        return 'responses/welcome.json';
+    }
+
+    window.fetch = function (resource, options) {
+        var url = typeof resource === 'string' ? resource : resource.url;
+        var match = API.exec(url.split('?')[0]);
+        if (!match) {
+            return network(resource, options);
+        }
+        if (match[1] !== 'update-component') {
+            return json('_dash-' + match[1] + '.json');
+        }
+        var path = responsePath(JSON.parse(options.body));
+        return path ? json(path) : noUpdate();
+    };
+})();
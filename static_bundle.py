@@ -0,0 +1,397 @@
+"""Static export of every view the dashboard can show.
+
+The output of the plotting callback depends only on the report, the year
+and the granularity, so the whole output space (bar the Year Comparison
+report, whose inputs are any set of years, and cross-filtered views) can
+be rendered ahead of time::
+
+    python static_bundle.py bundle/ --csv historical_automobile_sales.csv
+
+writes::
+
+    manifest.json                        data version and hash, views and
+                                         request digests
+    responses/<report>/<year>/<granularity>.json
+                                         the encoded response of
+                                         POST /_dash-update-component for the view
+    figures/<sha1>.json                  every chart, in the DiskBackend format
+    index.html, static_bundle.js, ...    the dashboard as a static site
+
+The responses are those of the default ``full`` render mode.
+
+The bundle is a site of its own, served from any plain file server or CDN
+with no Python behind it.  ``index.html`` loads the Dash renderer, the
+component suites and the assets from the bundle by relative URLs, and
+``static_bundle.js`` answers the Dash API from its files: the layout and
+callback graph from ``_dash-layout.json`` and ``_dash-dependencies.json``,
+and each callback by a GET of the response rendered for its inputs
+(``responses/controls/`` for the controls that follow the report).  The
+controls that need a server are left out of the site's layout: the cross
+filter bar, the download, the Year Comparison report and the level of
+detail of zoomed time series.
+
+With ``STATIC_BUNDLE`` pointing at a bundle, the live app reads figures
+(and, with ``RESPONSE_CACHE=1``, responses) through from it instead of
+rendering them.
+
+Entries are stored under the data version of the build, which names the
+source file's path and mtime.  The manifest also records a hash of the
+file's contents, so the app uses the bundle wherever its data has the same
+contents: on another host, at another path or after a copy.  A bundle built
+from other data is never hit.
+"""
+import argparse
+import json
+import os
+import re
+import time
+
+from datasets import DEFAULT_NAME
+from figure_cache import DiskBackend, entry_name
+from response_cache import request_token
+
+RENDER_MODE = 'full'
+GRANULARITIES = ('Year', 'Month', 'Day')
+
+# The script answering the Dash API in the static site
+SITE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static_bundle.js')
+# Callbacks the static site answers from its files.  The ones besides the
+# charts depend on the report alone.
+SITE_OUTPUTS = ('output-container.children', 'select-year.disabled', 'compare-years.disabled')
+CONTROL_OUTPUTS = SITE_OUTPUTS[1:]
+# Components whose row of controls is left out of the site, since they need
+# the server: the cross filter bar and the download link
+SERVER_CONTROLS = ('filter-summary', 'export-link')
+# Where webpack loads async chunks from: a chunk's name with this version
+# inserted, in the directory of the bundle that loads it
+CHUNK_VERSION = re.compile(r'splice\(1,0,"(v[\w-]+m[0-9a-fA-F]+)"\)')
+
+
+class BundleFigures:
+
+    def __init__(self, directory, bundle_version):
+        self.directory = directory
+        self.bundle_version = bundle_version
+        self.hits = 0
+
+    def get(self, key):
+        version = self.bundle_version(key[0])
+        if version is None:
+            return None
+        try:
+            with open(os.path.join(self.directory, entry_name((version,) + key[1:])), 'rb') as fh:
+                figure = json.loads(fh.read())
+        except (OSError, ValueError):
+            return None
+        self.hits += 1
+        return figure
+
+
+class BundleResponses:
+
+    def __init__(self, directory, paths, bundle_version):
+        self.directory = directory
+        # Request digest -> response file
+        self.paths = paths
+        self.bundle_version = bundle_version
+        self.hits = 0
+
+    def get(self, key):
+        version, _, digest = key
+        path = self.paths.get(digest)
+        if path is None or self.bundle_version(version) is None:
+            return None
+        try:
+            with open(os.path.join(self.directory, path), 'rb') as fh:
+                payload = fh.read()
+        except OSError:
+            return None
+        self.hits += 1
+        return payload
+
+
+class StaticBundle:
+
+    def __init__(self, directory, source=None):
+        self.directory = directory
+        with open(os.path.join(directory, 'manifest.json')) as fh:
+            self.manifest = json.load(fh)
+        self.version = self.manifest['version']
+        # None for bundles of a remote file, whose version is its URL
+        self.content = self.manifest.get('content')
+        self.render_mode = self.manifest['render_mode']
+        # The source the app serves, compared with the bundle by contents
+        self.source = source
+        self._matches = {}
+        # Lookups turned away because the app serves other data
+        self.mismatches = 0
+        self.figures = BundleFigures(os.path.join(directory, 'figures'), self.bundle_version)
+        self.responses = BundleResponses(directory, self.manifest['requests'], self.bundle_version)
+
+    @classmethod
+    def from_env(cls, source=None):
+        directory = os.environ.get('STATIC_BUNDLE')
+        if not directory:
+            return None
+        return cls(directory, source)
+
+    def bundle_version(self, version):
+        """The version the bundle stores the data of ``version`` under, or
+        None if the bundle was rendered from other data."""
+        if version == self.version:
+            return version
+        if self.content is None or self.source is None or not isinstance(version, str):
+            return None
+        matches = self._matches.get(version)
+        if matches is None:
+            # The file is hashed once per data version.  Only a version
+            # loaded from the file as it is now (not one with appended rows)
+            # can hold the data the bundle was rendered from.
+            try:
+                matches = self.source.fingerprint() == version and self.source.content_digest() == self.content
+            except OSError:
+                matches = False
+            self._matches[version] = matches
+        if not matches:
+            self.mismatches += 1
+            return None
+        return self.version
+
+    def stats(self):
+        return {
+            'figure_hits': self.figures.hits,
+            'response_hits': self.responses.hits,
+            'mismatches': self.mismatches,
+        }
+
+
+def request_body(year, statistics, granularity):
+    """The body the browser posts for a view in the full render mode."""
+    return {
+        'output': 'output-container.children',
+        'outputs': {'id': 'output-container', 'property': 'children'},
+        'inputs': [
+            {'id': 'select-year', 'property': 'value', 'value': year},
+            {'id': 'dropdown-statistics', 'property': 'value', 'value': statistics},
+            {'id': 'select-granularity', 'property': 'value', 'value': granularity},
+            {'id': 'compare-years', 'property': 'value', 'value': []},
+            {'id': 'cross-filter', 'property': 'data', 'value': None},
+            {'id': 'dropdown-dataset', 'property': 'value', 'value': DEFAULT_NAME},
+        ],
+        'changedPropIds': ['dropdown-statistics.value'],
+        'state': [],
+    }
+
+
+def _slug(value):
+    return str(value).lower().replace(' ', '-')
+
+
+def response_path(year, statistics, granularity):
+    """File of the response a request produces.  Requests that render the
+    same view (the recession report for any year, the welcome message) share
+    one file."""
+    if statistics == 'Recession Period Statistics':
+        return f'responses/recession/{granularity}.json'
+    if statistics == 'Yearly Statistics':
+        return f'responses/yearly/{_slug(year)}/{granularity}.json'
+    return 'responses/welcome.json'
+
+
+def control_body(output, statistics):
+    """The body the browser posts for a control that follows the report."""
+    component, prop = output.split('.')
+    return {
+        'output': output,
+        'outputs': {'id': component, 'property': prop},
+        'inputs': [{'id': 'dropdown-statistics', 'property': 'value', 'value': statistics}],
+        'changedPropIds': ['dropdown-statistics.value'],
+        'state': [],
+    }
+
+
+def control_path(output, statistics):
+    return f'responses/controls/{output.split(".")[0]}/{_slug(statistics)}.json'
+
+
+def _write(directory, path, data):
+    target = os.path.join(directory, path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, 'wb') as fh:
+        fh.write(data)
+    return len(data)
+
+
+def _get(client, url):
+    response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f'GET {url}: HTTP {response.status_code}')
+    return response.get_data()
+
+
+def _contains(node, ids):
+    if isinstance(node, dict):
+        if node.get('props', {}).get('id') in ids:
+            return True
+        return any(_contains(value, ids) for value in node.values())
+    if isinstance(node, list):
+        return any(_contains(value, ids) for value in node)
+    return False
+
+
+def site_layout(node):
+    """The layout JSON ``node`` without what needs the server."""
+    if isinstance(node, list):
+        return [
+            site_layout(child) for child in node
+            if not (
+                isinstance(child, dict)
+                and child.get('props', {}).get('className') == 'controls-container'
+                and _contains(child, SERVER_CONTROLS)
+            )
+        ]
+    if not isinstance(node, dict):
+        return node
+    node = {key: site_layout(value) for key, value in node.items()}
+    props = node.get('props')
+    if isinstance(props, dict) and props.get('id') == 'dropdown-statistics':
+        props['options'] = [o for o in props['options'] if o['value'] != 'Year Comparison']
+    return node
+
+
+def _site_index(html):
+    """``html`` of the app's index page with its URLs relative to the site
+    and ``static_bundle.js`` loaded ahead of the renderer."""
+    prefix = '"requests_pathname_prefix":"\\u002f"'
+    if prefix not in html:
+        raise RuntimeError('The static site needs the app served at /')
+    html = html.replace(prefix, '"requests_pathname_prefix":".\\u002f"')
+    html = re.sub(r'(src|href)="/', r'\1="', html)
+    first_script = html.index('<script src=')
+    return html[:first_script] + '<script src="static_bundle.js"></script>\n' + html[first_script:]
+
+
+def write_site(directory, dashboard, client, statistics_values):
+    """Write the files serving the bundle as a static site; returns their
+    sizes by path."""
+    written = {}
+    for output in CONTROL_OUTPUTS:
+        for statistics in statistics_values:
+            response = client.post('/_dash-update-component', json=control_body(output, statistics))
+            if response.status_code != 200:
+                raise RuntimeError(f'{output} / {statistics}: HTTP {response.status_code}')
+            path = control_path(output, statistics)
+            written[path] = _write(directory, path, response.get_data())
+
+    layout = site_layout(json.loads(_get(client, '/_dash-layout')))
+    written['_dash-layout.json'] = _write(directory, '_dash-layout.json', json.dumps(layout).encode('utf-8'))
+    dependencies = [d for d in json.loads(_get(client, '/_dash-dependencies')) if d['output'] in SITE_OUTPUTS]
+    written['_dash-dependencies.json'] = _write(directory, '_dash-dependencies.json', json.dumps(dependencies).encode('utf-8'))
+
+    html = _get(client, '/').decode('utf-8')
+    written['index.html'] = _write(directory, 'index.html', _site_index(html).encode('utf-8'))
+    with open(SITE_SCRIPT, 'rb') as fh:
+        written['static_bundle.js'] = _write(directory, 'static_bundle.js', fh.read())
+
+    # Everything the page links to, under the path it links to
+    urls = set(re.findall(r'(?:src|href)="/([^"?]+)', html))
+    # Every file of the component suites, including the chunks and plotly.js
+    # the scripts load on demand (registered by rendering the index)
+    chunk_versions = {}
+    for url in urls:
+        if url.endswith('.js'):
+            data = _get(client, f'/{url}').decode('utf-8', 'replace')
+            chunk_versions.setdefault(os.path.dirname(url), set()).update(CHUNK_VERSION.findall(data))
+    for package, paths in dashboard.app.registered_paths.items():
+        for path in paths:
+            if path.endswith('.map'):
+                continue
+            url = f'_dash-component-suites/{package}/{path}'
+            urls.add(url)
+            directory_url, name = os.path.split(url)
+            for version in chunk_versions.get(directory_url, ()):
+                parts = name.split('.')
+                urls.add(f'{directory_url}/{".".join(parts[:1] + [version] + parts[1:])}')
+    for url in sorted(urls):
+        written[url] = _write(directory, url, _get(client, f'/{url}'))
+    return written
+
+
+def export(directory, dashboard, granularities=GRANULARITIES):
+    dataset = dashboard.datasets.get()
+    snapshot = dataset.current
+    client = dashboard.server.test_client()
+    # Year comparisons span every subset of the years, so they are left to
+    # the live app
+    statistics_values = [
+        o['value'] for o in dashboard.dropdown_options if o['value'] != 'Year Comparison'
+    ] + ['Select Statistics']
+
+    requests = {}
+    written = {}
+    for statistics in statistics_values:
+        for year in ['Select Year'] + dashboard.year_list:
+            for granularity in granularities:
+                body = request_body(year, statistics, granularity)
+                path = response_path(year, statistics, granularity)
+                requests[request_token(body)] = path
+                if path in written:
+                    continue
+                response = client.post('/_dash-update-component', json=body)
+                if response.status_code != 200:
+                    raise RuntimeError(f'{statistics} / {year} / {granularity}: HTTP {response.status_code}')
+                payload = response.get_data()
+                target = os.path.join(directory, path)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, 'wb') as fh:
+                    fh.write(payload)
+                written[path] = len(payload)
+
+    site = write_site(directory, dashboard, client, statistics_values)
+
+    charts = dashboard.all_output_charts(snapshot, granularities)
+    figures = DiskBackend(os.path.join(directory, 'figures'), maxsize=len(charts))
+    for key, build in charts.items():
+        figures.set(key, build())
+
+    manifest = {
+        'version': snapshot.version,
+        'content': dataset.source.content_digest(),
+        'render_mode': RENDER_MODE,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'granularities': list(granularities),
+        'figures': len(charts),
+        'responses': written,
+        'requests': requests,
+        'site': site,
+    }
+    with open(os.path.join(directory, 'manifest.json'), 'w') as fh:
+        json.dump(manifest, fh, indent=1, sort_keys=True)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('output', help='directory to write the bundle to')
+    parser.add_argument('--csv', help='local CSV to load (defaults to SALES_DATA_PATH / SALES_DATA_URL)')
+    parser.add_argument('--granularities', nargs='*', default=list(GRANULARITIES), choices=GRANULARITIES)
+    args = parser.parse_args()
+
+    if args.csv:
+        os.environ['SALES_DATA_PATH'] = os.path.abspath(args.csv)
+    # Render exactly what a plain full-mode server would answer
+    os.environ['DASHBOARD_RENDER_MODE'] = RENDER_MODE
+    os.environ['FIGURE_CACHE_BACKEND'] = 'off'
+    for name in ('STATIC_BUNDLE', 'RESPONSE_CACHE', 'BACKGROUND_CALLBACKS', 'SALES_RELOAD_INTERVAL', 'DASHBOARD_METRICS', 'DASHBOARD_TRACE_LOG'):
+        os.environ.pop(name, None)
+    import historical_automobile_sales_dashboard as dashboard
+
+    os.makedirs(args.output, exist_ok=True)
+    manifest = export(args.output, dashboard, args.granularities)
+    print(f"Wrote {len(manifest['responses'])} responses ({sum(manifest['responses'].values())} bytes) "
+          f"for {len(manifest['requests'])} requests, {manifest['figures']} figures and "
+          f"{len(manifest['site'])} site files ({sum(manifest['site'].values())} bytes) to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import synthetic  # noqa: E402
+
+
+@pytest.fixture
+def sales_csv(tmp_path):
+    """Path of a synthetic sales CSV with ``528 * scale`` rows."""
+    def make(scale=1, name='sales.csv', seed=0, daily=False):
+        return synthetic.generate(str(tmp_path / name), scale, seed, daily)
+    return make
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregates import SalesCube
+from binning import Binning, reduce_totals
+from data_source import CSVSource
+from indexes import RowIndex
+
+
+def _totals(frame, driver):
+    frame = frame.assign(Recession=frame['Recession'] == 1)
+    return (
+        frame.groupby(['Vehicle_Type', driver, 'Recession'])['Automobile_Sales']
+        .agg(['sum', 'count'])
+        .reset_index()
+    )
+
+
+def test_fixed_edges_span_the_values_in_equal_steps():
+    values = np.array([1.0, 2.0, 4.0, 11.0])
+    edges = Binning('fixed', 5).edges(values, np.ones(4))
+    np.testing.assert_allclose(edges, [1, 3, 5, 7, 9, 11])
+
+
+def test_quantile_edges_hold_about_as_many_rows_each():
+    values = np.arange(100, dtype=np.float64)
+    weights = np.ones(100)
+    weights[:10] = 50  # most rows sit on the first ten values
+    edges = Binning('quantile', 4).edges(values, weights)
+    assert edges[0] == 0 and edges[-1] == 99
+    counts = np.histogram(np.repeat(values, weights.astype(int)), edges)[0]
+    assert counts.max() - counts.min() <= 50
+    assert np.all(np.diff(edges) > 0)
+
+
+def test_quantile_edges_collapse_on_repeated_values():
+    values = np.array([1.0, 2.0, 3.0])
+    edges = Binning('quantile', 10).edges(values, np.array([1000.0, 1.0, 1.0]))
+    assert np.all(np.diff(edges) > 0)
+    assert edges[0] == 1 and edges[-1] == 3
+
+
+def test_binning_rejects_bad_settings():
+    with pytest.raises(ValueError):
+        Binning('log')
+    with pytest.raises(ValueError):
+        Binning('fixed', 0)
+
+
+def test_few_distinct_values_are_kept_exact(sales_csv):
+    frame = pd.read_csv(sales_csv())
+    got = reduce_totals(_totals(frame, 'unemployment_rate'), 'unemployment_rate', Binning('fixed', 60))
+    expected = frame.groupby(['Vehicle_Type', 'unemployment_rate'])['Automobile_Sales'].mean().reset_index()
+    pd.testing.assert_frame_equal(got, expected, check_dtype=False)
+
+
+@pytest.mark.parametrize('method', ['fixed', 'quantile'])
+def test_bins_match_cut_and_groupby(sales_csv, method):
+    frame = pd.read_csv(sales_csv())
+    binning = Binning(method, 8)
+    got = reduce_totals(_totals(frame, 'GDP'), 'GDP', binning)
+
+    distinct = np.unique(frame['GDP'])
+    weights = frame['GDP'].value_counts().reindex(distinct).to_numpy()
+    edges = binning.edges(distinct, weights)
+    bins = pd.cut(frame['GDP'], edges, include_lowest=True, right=False, labels=False)
+    # The last bin is closed on the right
+    bins = bins.fillna(len(edges) - 2).astype(int)
+    means = frame.groupby(['Vehicle_Type', bins])['Automobile_Sales'].mean()
+    midpoints = (edges[:-1] + edges[1:]) / 2
+    expected = pd.DataFrame({
+        'Vehicle_Type': means.index.get_level_values(0),
+        'GDP': midpoints[means.index.get_level_values(1)],
+        'Automobile_Sales': means.to_numpy(),
+    })
+    assert len(got) <= 8 * frame['Vehicle_Type'].nunique()
+    pd.testing.assert_frame_equal(got, expected, check_dtype=False)
+
+
+def test_recession_selects_its_rows(sales_csv):
+    frame = pd.read_csv(sales_csv())
+    got = reduce_totals(_totals(frame, 'unemployment_rate'), 'unemployment_rate', recession=1)
+    expected = (
+        frame[frame['Recession'] == 1]
+        .groupby(['Vehicle_Type', 'unemployment_rate'])['Automobile_Sales'].mean().reset_index()
+    )
+    pd.testing.assert_frame_equal(got, expected, check_dtype=False)
+
+
+def test_cube_bins_other_drivers_from_the_rows(sales_csv):
+    path = sales_csv(scale=5)
+    data = CSVSource(path).read()
+    cube = SalesCube.from_frame(data).attach_rows(data, RowIndex.from_frame(data))
+    assert list(cube.driver_totals) == ['unemployment_rate']
+
+    raw = pd.read_csv(path)
+    binning = Binning('fixed', 10)
+    got = cube.by_driver('GDP', binning)
+    expected = reduce_totals(_totals(raw, 'GDP'), 'GDP', binning)
+    pd.testing.assert_frame_equal(got, expected, check_exact=False, rtol=1e-5)
+
+
+def test_streamed_cube_keeps_only_the_charted_driver(sales_csv):
+    cube = SalesCube.from_chunks(CSVSource(sales_csv()).read_chunks(1000), detailed=True)
+    assert list(cube.driver_totals) == ['unemployment_rate']
+    assert len(cube.by_driver('unemployment_rate', Binning())) > 0
+    with pytest.raises(ValueError):
+        cube.by_driver('GDP', Binning())
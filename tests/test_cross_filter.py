@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregates import MONTH_ORDER, SalesCube
+from cross_filter import CrossFilter
+from data_source import CSVSource, apply_schema
+from indexes import RowIndex
+from query_engine import load_cube
+
+FILTERS = [
+    CrossFilter(vehicle_types=['Sports']),
+    CrossFilter(years=(1985, 1995), months=['Feb', 'Nov']),
+    CrossFilter(years=(2000, 2000), vehicle_types=['Executivecar', 'Smallfamiliycar'], recession=1),
+    CrossFilter(months=['Jul'], recession=0),
+    # Nothing passes
+    CrossFilter(years=(1950, 1960)),
+]
+
+
+def _filtered(raw, where):
+    keep = np.ones(len(raw), dtype=bool)
+    if where.years is not None:
+        keep &= raw['Year'].between(*where.years).to_numpy()
+    if where.months:
+        keep &= raw['Month'].isin(where.months).to_numpy()
+    if where.vehicle_types:
+        keep &= raw['Vehicle_Type'].isin(where.vehicle_types).to_numpy()
+    if where.recession is not None:
+        keep &= (raw['Recession'] == where.recession).to_numpy()
+    return raw[keep]
+
+
+def _sorted(frame):
+    frame = frame.copy()
+    if 'Month' in frame.columns:
+        frame['Month'] = pd.Categorical(frame['Month'], MONTH_ORDER, ordered=True)
+    frame = frame.sort_values(list(frame.columns[:-1]), ignore_index=True)
+    return frame.astype({column: object for column in frame.columns[:-1] if frame[column].dtype != np.float64})
+
+
+def test_toggle_adds_and_removes_values():
+    where = CrossFilter().toggle('Vehicle_Type', 'Sports').toggle('Month', 'Jan').toggle('Vehicle_Type', 'Executivecar')
+    assert where.vehicle_types == ('Executivecar', 'Sports')
+    assert where.months == ('Jan',)
+    where = where.toggle('Vehicle_Type', 'Sports').toggle('Month', 'Jan')
+    assert where.key == (None, (), ('Executivecar',), None)
+    assert not where.toggle('Vehicle_Type', 'Executivecar')
+
+
+def test_toggle_builds_year_ranges():
+    where = CrossFilter().toggle('Year', 1995)
+    assert where.years == (1995, 1995)
+    assert where.toggle('Year', 1990).years == (1990, 1995)
+    # A click on the selected year clears it, one after a range starts over
+    assert where.toggle('Year', 1995).years is None
+    assert where.toggle('Year', 1990).toggle('Year', 2001).years == (2001, 2001)
+
+
+def test_store_round_trip():
+    where = CrossFilter((1990, 1992), ['Mar'], ['Sports'], 1)
+    assert CrossFilter.from_store(where.to_store()) == where
+    assert CrossFilter.from_store({'years': [2001, 1990, 1995]}).years == (1990, 2001)
+    assert CrossFilter.from_store(None) == CrossFilter()
+
+
+def test_without_drops_the_clicked_dimension():
+    where = CrossFilter((1990, 1992), ['Mar'], ['Sports'], 1)
+    assert where.without('Vehicle_Type').key == ((1990, 1992), ('Mar',), (), 1)
+    assert where.without('Year', 'Recession').key == (None, ('Mar',), ('Sports',), None)
+
+
+def test_mask():
+    where = CrossFilter((1990, 1991), ['Mar'], [], 0)
+    np.testing.assert_array_equal(where.mask('Year', [1989, 1990, 1991, 1992]), [False, True, True, False])
+    np.testing.assert_array_equal(where.mask('Month', np.array(['Jan', 'Mar'], dtype=object)), [False, True])
+    np.testing.assert_array_equal(where.mask('Recession', [0, 1]), [True, False])
+    assert where.mask('Vehicle_Type', ['Sports']) is None
+
+
+@pytest.mark.parametrize('shuffle', [False, True])
+@pytest.mark.parametrize('where', FILTERS, ids=repr)
+def test_row_index_selects_the_rows_of_the_filter(sales_csv, where, shuffle):
+    frame = apply_schema(pd.read_csv(sales_csv(scale=2)))
+    if shuffle:
+        # Rows out of year order exercise the permutation of RowIndex
+        frame = frame.sample(frac=1, random_state=0).reset_index(drop=True)
+    index = RowIndex.from_frame(frame)
+    assert (index.order is not None) == shuffle
+
+    got = index.select_where(frame, where)
+    expected = _filtered(frame.assign(Recession=frame['Recession'].astype(int)), where)
+    np.testing.assert_array_equal(got.index.to_numpy(), expected.index.to_numpy())
+
+
+@pytest.fixture(scope='module')
+def sources(tmp_path_factory):
+    import synthetic
+    path = str(tmp_path_factory.mktemp('data') / 'sales.csv')
+    synthetic.generate(path, 3, daily=True)
+    source = CSVSource(path)
+    data = source.read()
+    cache_dir = str(tmp_path_factory.mktemp('cache'))
+    cubes = {
+        'rows': SalesCube.from_frame(data).attach_rows(data, RowIndex.from_frame(data)),
+        'detailed': SalesCube.from_chunks(source.read_chunks(1000), detailed=True),
+        'sqlite': load_cube(source, 'sqlite', cache_dir=cache_dir),
+    }
+    try:
+        cubes['duckdb'] = load_cube(source, 'duckdb', cache_dir=cache_dir)
+    except ImportError:
+        pass
+    return pd.read_csv(path), cubes
+
+
+@pytest.mark.parametrize('where', FILTERS, ids=repr)
+@pytest.mark.parametrize('backend', ['rows', 'detailed', 'sqlite', 'duckdb'])
+def test_filtered_aggregates_match_groupby(sources, backend, where):
+    raw, cubes = sources
+    if backend not in cubes:
+        pytest.skip('duckdb is not installed')
+    cube = cubes[backend]
+    rows = _filtered(raw, where)
+
+    for by in ('Year', 'Month', 'Vehicle_Type', 'Recession'):
+        got = cube.series('Automobile_Sales', by, where=where)
+        expected = rows.groupby(by)['Automobile_Sales'].mean().reset_index()
+        pd.testing.assert_frame_equal(_sorted(got), _sorted(expected), check_dtype=False)
+
+    got = cube.series('Advertising_Expenditure', 'Vehicle_Type', 'sum', recession=1, where=where)
+    expected = rows[rows['Recession'] == 1].groupby('Vehicle_Type')['Advertising_Expenditure'].sum().reset_index()
+    pd.testing.assert_frame_equal(_sorted(got), _sorted(expected), check_dtype=False)
+
+    for granularity, unit in (('Month', 'M'), ('Day', 'D')):
+        got = cube.timeseries(granularity, where=where)
+        dates = pd.to_datetime(rows['Date']).to_numpy().astype(f'datetime64[{unit}]').astype('datetime64[ns]')
+        expected = rows.groupby(dates)['Automobile_Sales'].mean().rename_axis('Date').reset_index()
+        pd.testing.assert_frame_equal(got, expected, check_dtype=False)
+
+    got = cube.by_driver('unemployment_rate', recession=1, where=where)
+    expected = (
+        rows[rows['Recession'] == 1]
+        .groupby(['Vehicle_Type', 'unemployment_rate'])['Automobile_Sales'].mean().reset_index()
+    )
+    pd.testing.assert_frame_equal(_sorted(got), _sorted(expected), check_dtype=False)
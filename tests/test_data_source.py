@@ -0,0 +1,65 @@
+import os
+
+from data_source import CSVSource, cache_path, load_data, prune_cache
+
+
+def _touch(path, directory=False):
+    if directory:
+        os.mkdir(path)
+    else:
+        open(path, 'w').close()
+
+
+def test_prune_cache_keeps_current_version_in_every_format(tmp_path):
+    current = tmp_path / 'abcd1234-0123456789abcdef.npy'
+    _touch(current, directory=True)
+    _touch(tmp_path / 'abcd1234-0123456789abcdef.sqlite')
+    _touch(tmp_path / 'abcd1234-1111111111111111.npy', directory=True)
+    _touch(tmp_path / 'abcd1234-1111111111111111.duckdb')
+    # Another source sharing the directory
+    _touch(tmp_path / 'ffff0000-2222222222222222.npy', directory=True)
+
+    prune_cache(str(current))
+
+    assert sorted(os.listdir(tmp_path)) == [
+        'abcd1234-0123456789abcdef.npy',
+        'abcd1234-0123456789abcdef.sqlite',
+        'ffff0000-2222222222222222.npy',
+    ]
+
+
+def test_prune_cache_deletes_unprefixed_legacy_caches(tmp_path):
+    current = tmp_path / 'abcd1234-0123456789abcdef.npy'
+    _touch(current, directory=True)
+    _touch(tmp_path / '0123456789abcdef.npy', directory=True)
+    _touch(tmp_path / 'fedcba9876543210.feather', directory=True)
+    _touch(tmp_path / 'fedcba9876543210.sqlite')
+    _touch(tmp_path / 'fedcba9876543210.duckdb')
+    # Not caches
+    _touch(tmp_path / 'README.txt')
+    _touch(tmp_path / 'fedcba9876543210.csv')
+
+    prune_cache(str(current))
+
+    assert sorted(os.listdir(tmp_path)) == [
+        'README.txt',
+        'abcd1234-0123456789abcdef.npy',
+        'fedcba9876543210.csv',
+    ]
+
+
+def test_load_data_replaces_cache_of_edited_file(tmp_path, sales_csv):
+    path = sales_csv()
+    source = CSVSource(path)
+    cache_dir = str(tmp_path / 'cache')
+    first = load_data(source, cache_dir=cache_dir)
+    old = cache_path(source, cache_dir)
+
+    with open(path, 'a') as fh:
+        fh.write('1/1/2024,2024,Jan,0,100,0.5,25000,2000,5,40,0.3,3.0,1500,Sports,Georgia\n')
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10**9))
+    second = load_data(source, cache_dir=cache_dir)
+
+    assert len(second) == len(first) + 1
+    assert os.listdir(cache_dir) == [os.path.basename(cache_path(source, cache_dir))]
+    assert not os.path.exists(old)
@@ -0,0 +1,186 @@
+import importlib
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+import synthetic
+from datasets import DatasetManager
+from figure_cache import DiskBackend
+
+
+class FakeSnapshot:
+
+    def __init__(self, name, nbytes):
+        self.version = f'{name}-v1'
+        self.nbytes = nbytes
+
+
+class FakeDataset:
+
+    def __init__(self, name, nbytes):
+        self.current = FakeSnapshot(name, nbytes)
+        self.stopped = False
+
+    def ready(self):
+        return True
+
+    def subscribe(self, listener):
+        pass
+
+    def stop(self):
+        self.stopped = True
+
+
+def _manager(names, nbytes=None, **kwargs):
+    nbytes = nbytes or {}
+    opened = []
+
+    def open_dataset(source):
+        opened.append(source)
+        return FakeDataset(source, nbytes.get(source, 1))
+
+    manager = DatasetManager({name: name for name in names}, open_dataset=open_dataset, **kwargs)
+    evicted = []
+    manager.on_evict(lambda name, dataset: evicted.append((name, dataset.stopped)))
+    return manager, opened, evicted
+
+
+def test_least_recently_used_dataset_is_evicted():
+    manager, opened, evicted = _manager(['default', 'a', 'b', 'c'], max_loaded=3)
+    manager.get('a')
+    manager.get('b')
+    manager.get('a')
+    manager.get('c')
+
+    assert evicted == [('b', True)]
+    assert manager.loaded() == ['default', 'a', 'c']
+    assert opened == ['default', 'a', 'b', 'c']
+    assert manager.stats()['evictions'] == 1
+
+
+def test_memory_budget_evicts_until_the_rest_fit():
+    sizes = {'default': 10, 'a': 40, 'b': 40, 'c': 60}
+    manager, _, evicted = _manager(list(sizes), sizes, max_bytes=100)
+    manager.get('a')
+    manager.get('b')
+    manager.get('c')
+
+    # The default stays, and the dataset just loaded stays even alone over budget
+    assert [name for name, _ in evicted] == ['a', 'b']
+    assert manager.loaded() == ['default', 'c']
+    manager.get('a')
+    assert manager.loaded() == ['default', 'a']
+
+
+def test_unknown_names_resolve_to_the_default():
+    manager, opened, _ = _manager(['default', 'a'])
+    assert manager.get('missing') is manager.get('default')
+    assert opened == ['default']
+
+
+def test_concurrent_first_requests_share_one_load():
+    opened = []
+    release = threading.Event()
+
+    def open_dataset(source):
+        opened.append(source)
+        if source == 'a':
+            release.wait(5)
+        return FakeDataset(source, 1)
+
+    manager = DatasetManager({'default': 'default', 'a': 'a'}, open_dataset=open_dataset)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(manager.get('a'))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert opened == ['default', 'a']
+    assert len({id(dataset) for dataset in results}) == 1
+
+
+def test_disk_backend_discards_by_key(tmp_path):
+    backend = DiskBackend(str(tmp_path), maxsize=10)
+    backend.set(('v1', 'Yearly Statistics', 1990), {'data': []})
+    backend.set(('v2', 'Yearly Statistics', 1990), {'data': []})
+
+    assert backend.discard(lambda key: key[0] == 'v1') == 1
+    assert ('v1', 'Yearly Statistics', 1990) not in backend
+    assert ('v2', 'Yearly Statistics', 1990) in backend
+    assert sorted(name.rsplit('.', 1)[1] for name in os.listdir(tmp_path) if not name.startswith('.')) == ['json', 'key']
+
+
+def _body(dataset, year=1990):
+    inputs = [
+        ('select-year', 'value', year),
+        ('dropdown-statistics', 'value', 'Yearly Statistics'),
+        ('select-granularity', 'value', 'Year'),
+        ('compare-years', 'value', []),
+        ('cross-filter', 'data', None),
+        ('dropdown-dataset', 'value', dataset),
+    ]
+    return {
+        'output': 'output-container.children',
+        'outputs': {'id': 'output-container', 'property': 'children'},
+        'inputs': [{'id': i, 'property': p, 'value': v} for i, p, v in inputs],
+        'changedPropIds': ['dropdown-dataset.value'],
+        'state': [],
+    }
+
+
+@pytest.fixture
+def dashboard(tmp_path, monkeypatch):
+    paths = {}
+    for seed, name in enumerate(('default', 'a', 'b')):
+        paths[name] = synthetic.generate(str(tmp_path / f'{name}.csv'), 1, seed=seed)
+    monkeypatch.setenv('SALES_DATA_PATH', paths['default'])
+    monkeypatch.setenv('SALES_DATASETS', f"a={paths['a']},b={paths['b']}")
+    monkeypatch.setenv('SALES_DATASETS_MAX', '2')
+    monkeypatch.setenv('SALES_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setenv('FIGURE_CACHE_BACKEND', 'disk')
+    monkeypatch.setenv('FIGURE_CACHE_DIR', str(tmp_path / 'figures'))
+    monkeypatch.setenv('FIGURE_CACHE_WARMUP', '0')
+    monkeypatch.setenv('RESPONSE_CACHE', '1')
+    sys.modules.pop('historical_automobile_sales_dashboard', None)
+    module = importlib.import_module('historical_automobile_sales_dashboard')
+    yield module
+    sys.modules.pop('historical_automobile_sales_dashboard', None)
+
+
+def _figure_keys(dashboard):
+    backend = dashboard.figure_cache.backend
+    keys = []
+    for name in os.listdir(backend.directory):
+        if name.endswith('.key'):
+            with open(os.path.join(backend.directory, name)) as fh:
+                keys.append(fh.read())
+    return keys
+
+
+def test_eviction_discards_cached_figures_and_responses(dashboard):
+    client = dashboard.server.test_client()
+    assert client.post('/_dash-update-component', json=_body('a')).status_code == 200
+    a = dashboard.datasets.current('a')
+    assert any(a.version in key for key in _figure_keys(dashboard))
+    assert any(key[1] == 'a' for key in dashboard.response_cache.store._entries)
+    response = client.post('/_dash-update-component', json=_body('a'))
+    assert response.headers['X-Response-Cache'] == 'hit'
+
+    # Loading b goes past SALES_DATASETS_MAX and evicts a
+    assert client.post('/_dash-update-component', json=_body('b')).status_code == 200
+    assert dashboard.datasets.loaded() == ['default', 'b']
+    keys = _figure_keys(dashboard)
+    assert keys and not any(a.version in key for key in keys)
+    assert any(dashboard.datasets.current('b').version in key for key in keys)
+    assert {key[1] for key in dashboard.response_cache.store._entries} == {'b'}
+
+    # a is loaded again and rendered afresh
+    response = client.post('/_dash-update-component', json=_body('a'))
+    assert response.headers['X-Response-Cache'] == 'miss'
+    assert dashboard.datasets.loaded() == ['default', 'a']
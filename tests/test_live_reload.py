@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import synthetic
+from binning import Binning
+from cross_filter import CrossFilter
+from data_source import CSVSource
+from live_reload import DELTA_SHARE, LiveDataset, Snapshot
+
+FILTERS = [
+    CrossFilter(),
+    CrossFilter(years=(1985, 2024), vehicle_types=['Sports', 'Executivecar']),
+    CrossFilter(months=['Jan', 'Dec'], recession=1),
+]
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('SALES_CACHE_DIR', str(tmp_path / 'cache'))
+
+
+def _append(path, year, scale=1, seed=1):
+    rows = synthetic.year_frame(year, scale, np.random.default_rng(seed))
+    with open(path, 'a', newline='') as fh:
+        rows.to_csv(fh, header=False, index=False)
+    return len(rows)
+
+
+def _assert_same_data(snapshot, reloaded):
+    a, b = snapshot.cube, reloaded.cube
+    assert a.row_count == b.row_count
+    for where in FILTERS:
+        for by in ('Year', 'Month', 'Vehicle_Type', 'Recession'):
+            pd.testing.assert_frame_equal(a.series('Automobile_Sales', by, where=where), b.series('Automobile_Sales', by, where=where))
+        pd.testing.assert_frame_equal(
+            a.series('Advertising_Expenditure', 'Vehicle_Type', 'sum', year=2024, where=where),
+            b.series('Advertising_Expenditure', 'Vehicle_Type', 'sum', year=2024, where=where),
+        )
+        pd.testing.assert_frame_equal(a.timeseries('Month', where=where), b.timeseries('Month', where=where))
+        pd.testing.assert_frame_equal(
+            a.by_driver('unemployment_rate', Binning(), recession=1, where=where),
+            b.by_driver('unemployment_rate', Binning(), recession=1, where=where),
+        )
+
+
+def _rows(snapshot):
+    frames = [frame for frame, _ in snapshot.segments]
+    rows = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    return rows.sort_values(['Year', 'Date', 'Vehicle_Type', 'Automobile_Sales'], ignore_index=True)
+
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_append_matches_full_reload(sales_csv, stream):
+    path = sales_csv(scale=2)
+    dataset = LiveDataset(CSVSource(path), stream=stream)
+    # A new year, and rows of a year already loaded
+    _append(path, 2024)
+    _append(path, 1990, seed=2)
+
+    assert dataset.refresh()
+    assert (dataset.appends, dataset.reloads) == (1, 0)
+    _assert_same_data(dataset.current, Snapshot.load(CSVSource(path), stream=stream))
+
+
+def test_append_only_changes_the_years_it_touched(sales_csv):
+    path = sales_csv()
+    dataset = LiveDataset(CSVSource(path))
+    before = dataset.current
+    _append(path, 2024)
+    dataset.refresh()
+    after = dataset.current
+
+    assert after.version != before.version
+    assert after.year_version(2024) == after.version
+    assert after.year_version(1990) == before.year_version(1990)
+    # Synthetic 2024 is not a recession year
+    assert after.recession_version == before.recession_version
+
+
+def test_appends_stay_in_the_delta_until_folded(sales_csv):
+    path = sales_csv(scale=2)
+    dataset = LiveDataset(CSVSource(path))
+    base = dataset.current.data
+    appended = 0
+    for seed, year in enumerate((2024, 2025, 1999)):
+        appended += _append(path, year, seed=seed)
+        assert dataset.refresh()
+        snapshot = dataset.current
+        # The base rows are neither copied nor re-indexed
+        assert snapshot.data is base
+        assert len(snapshot.delta[0]) == appended
+        _assert_same_data(snapshot, Snapshot.load(CSVSource(path)))
+
+    # Past DELTA_SHARE of the base the delta is folded in
+    scale = int(len(base) * DELTA_SHARE / 12) + 1
+    _append(path, 2026, scale=scale, seed=9)
+    assert dataset.refresh()
+    snapshot = dataset.current
+    assert snapshot.delta is None
+    assert snapshot.data['Year'].is_monotonic_increasing
+    reloaded = Snapshot.load(CSVSource(path))
+    assert len(snapshot.data) == len(reloaded.data)
+    _assert_same_data(snapshot, reloaded)
+    pd.testing.assert_frame_equal(_rows(snapshot), _rows(reloaded), check_categorical=False)
+    assert dataset.appends == 4
+
+
+def test_partial_line_waits_for_the_next_refresh(sales_csv):
+    path = sales_csv()
+    dataset = LiveDataset(CSVSource(path))
+    rows = dataset.current.cube.row_count
+    line = '1/1/2024,2024,Jan,0,100,0.5,25000,2000,5,40,0.3,3.0,1500,Sports,Georgia\n'
+    with open(path, 'a') as fh:
+        fh.write(line[:20])
+    assert not dataset.refresh()
+    with open(path, 'a') as fh:
+        fh.write(line[20:])
+    assert dataset.refresh()
+    assert dataset.current.cube.row_count == rows + 1
+
+
+def test_rewritten_file_is_reloaded_in_full(sales_csv):
+    path = sales_csv()
+    dataset = LiveDataset(CSVSource(path))
+    # Same rows with a different seed, and one more year: the bytes read
+    # before are no longer what the file starts with
+    synthetic.generate(path, 1, seed=5)
+    _append(path, 2024)
+
+    assert dataset.refresh()
+    assert (dataset.appends, dataset.reloads) == (0, 1)
+    _assert_same_data(dataset.current, Snapshot.load(CSVSource(path)))
@@ -0,0 +1,165 @@
+import importlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+import synthetic
+from static_bundle import CHUNK_VERSION, SITE_OUTPUTS, control_path, export, response_path
+
+GRANULARITIES = ('Year', 'Month')
+
+# Loads static_bundle.js into Node with a fetch that reads the site's files,
+# then replays the requests the Dash renderer makes
+NODE_CLIENT = r'''
+const fs = require('fs');
+const path = require('path');
+const [site, requests] = process.argv.slice(2);
+const seen = [];
+globalThis.window = globalThis;
+globalThis.fetch = async (url, options) => {
+    seen.push(url);
+    const file = path.join(site, url.split('?')[0]);
+    if (!fs.existsSync(file)) return new Response('missing', {status: 404});
+    return new Response(fs.readFileSync(file), {headers: {'Content-Type': 'application/octet-stream'}});
+};
+require(path.join(site, 'static_bundle.js'));
+(async () => {
+    const results = [];
+    for (const [url, body] of JSON.parse(fs.readFileSync(requests))) {
+        const options = body === null ? {method: 'GET'} : {method: 'POST', body: JSON.stringify(body)};
+        const response = await window.fetch(url, options);
+        results.push({
+            status: response.status,
+            type: response.headers.get('content-type'),
+            body: response.status === 200 ? await response.text() : null,
+        });
+    }
+    console.log(JSON.stringify({results, seen}));
+})();
+'''
+
+
+@pytest.fixture(scope='module')
+def site(tmp_path_factory):
+    root = tmp_path_factory.mktemp('static')
+    path = synthetic.generate(str(root / 'sales.csv'), 1)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv('SALES_DATA_PATH', path)
+        patch.setenv('SALES_CACHE_DIR', str(root / 'cache'))
+        patch.setenv('FIGURE_CACHE_BACKEND', 'off')
+        for name in ('SALES_DATASETS', 'RESPONSE_CACHE', 'STATIC_BUNDLE', 'DASHBOARD_RENDER_MODE'):
+            patch.delenv(name, raising=False)
+        sys.modules.pop('historical_automobile_sales_dashboard', None)
+        dashboard = importlib.import_module('historical_automobile_sales_dashboard')
+        directory = str(root / 'site')
+        os.makedirs(directory)
+        manifest = export(directory, dashboard, GRANULARITIES)
+        sys.modules.pop('historical_automobile_sales_dashboard', None)
+    return directory, manifest, dashboard.year_list
+
+
+def test_index_loads_everything_from_the_site(site):
+    directory, _, _ = site
+    with open(os.path.join(directory, 'index.html')) as fh:
+        html = fh.read()
+    urls = re.findall(r'(?:src|href)="([^"]+)"', html)
+    assert 'static_bundle.js' in urls
+    assert urls.index('static_bundle.js') < next(i for i, url in enumerate(urls) if 'dash_renderer' in url)
+    for url in urls:
+        assert not url.startswith('/') and '://' not in url
+        assert os.path.isfile(os.path.join(directory, url.split('?')[0])), url
+    assert '"requests_pathname_prefix":".\\u002f"' in html
+    assert os.path.isfile(os.path.join(directory, '_dash-component-suites/plotly/package_data/plotly.min.js'))
+
+
+def test_chunks_are_stored_where_webpack_loads_them(site):
+    directory, _, _ = site
+    suites = os.path.join(directory, '_dash-component-suites', 'dash', 'dcc')
+    with open(os.path.join(suites, 'dash_core_components.js')) as fh:
+        versions = CHUNK_VERSION.findall(fh.read())
+    assert versions
+    for version in versions:
+        assert os.path.isfile(os.path.join(suites, f'async-graph.{version}.js'))
+        assert os.path.isfile(os.path.join(suites, f'async-dropdown.{version}.js'))
+
+
+def test_site_leaves_out_what_needs_the_server(site):
+    directory, _, _ = site
+    with open(os.path.join(directory, '_dash-dependencies.json')) as fh:
+        dependencies = json.load(fh)
+    assert sorted(d['output'] for d in dependencies) == sorted(SITE_OUTPUTS)
+    with open(os.path.join(directory, '_dash-layout.json')) as fh:
+        layout = fh.read()
+    for component in ('export-link', 'filter-summary', 'clear-filters', 'Year Comparison'):
+        assert component not in layout
+    for component in ('dropdown-statistics', 'select-year', 'select-granularity', 'cross-filter', 'output-container'):
+        assert f'"{component}"' in layout
+
+
+def _body(output, **values):
+    return {
+        'output': output,
+        'inputs': [{'id': id, 'property': 'value', 'value': value} for id, value in values.items()],
+        'state': [],
+    }
+
+
+def _view(statistics, year, granularity, cross_filter=None):
+    return _body(
+        'output-container.children',
+        **{
+            'select-year': year,
+            'dropdown-statistics': statistics,
+            'select-granularity': granularity,
+            'compare-years': [],
+            'cross-filter': cross_filter,
+            'dropdown-dataset': 'default',
+        },
+    )
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='needs Node.js')
+def test_static_bundle_js_answers_callbacks_from_files(site, tmp_path):
+    directory, manifest, years = site
+    requests, expected = [], []
+
+    def expect(url, body, path):
+        requests.append((url, body))
+        expected.append(path)
+
+    expect('./_dash-layout', None, '_dash-layout.json')
+    expect('./_dash-dependencies', None, '_dash-dependencies.json')
+    for statistics in ('Yearly Statistics', 'Recession Period Statistics', 'Select Statistics'):
+        for year in ['Select Year'] + years:
+            for granularity in GRANULARITIES:
+                expect('./_dash-update-component', _view(statistics, year, granularity), response_path(year, statistics, granularity))
+        for output in SITE_OUTPUTS[1:]:
+            expect('./_dash-update-component', _body(output, **{'dropdown-statistics': statistics}), control_path(output, statistics))
+    # Views the bundle has no response for are left as they are
+    expect('./_dash-update-component', _view('Yearly Statistics', 1990, 'Year', {'vehicle_types': ['Sports']}), None)
+    expect('./_dash-update-component', _view('Year Comparison', 'Select Year', 'Year'), None)
+    expect('./_dash-component-suites/plotly/package_data/plotly.min.js', None, '_dash-component-suites/plotly/package_data/plotly.min.js')
+
+    script = tmp_path / 'client.js'
+    script.write_text(NODE_CLIENT)
+    replay = tmp_path / 'requests.json'
+    replay.write_text(json.dumps(requests))
+    output = subprocess.run(['node', str(script), directory, str(replay)], capture_output=True, text=True, check=True).stdout
+    results = json.loads(output)['results']
+
+    assert len(results) == len(expected)
+    for (url, body), path, result in zip(requests, expected, results):
+        if path is None:
+            assert result['status'] == 204, (url, body)
+            continue
+        assert result['status'] == 200, (url, path)
+        with open(os.path.join(directory, path), encoding='utf-8') as fh:
+            assert result['body'] == fh.read(), path
+        if path.endswith('.json'):
+            assert result['type'] == 'application/json'
+    assert set(manifest['responses']) <= set(expected)
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from aggregates import SalesCube
+from binning import Binning
+from data_source import CSVSource
+
+
+def _repeated(path, times):
+    """A copy of the CSV at ``path`` with its rows repeated ``times`` times."""
+    with open(path) as fh:
+        header, *rows = fh.readlines()
+    copy = path.replace('.csv', f'_x{times}.csv')
+    with open(copy, 'w') as fh:
+        fh.write(header)
+        for _ in range(times):
+            fh.writelines(rows)
+    return copy
+
+
+def _stream(path, chunksize=1000):
+    return SalesCube.from_chunks(CSVSource(path).read_chunks(chunksize), detailed=True)
+
+
+def test_streamed_cube_size_does_not_grow_with_the_rows(sales_csv):
+    path = sales_csv(scale=4, daily=True)
+    cube = _stream(path)
+    bigger = _stream(_repeated(path, 10))
+
+    assert bigger.row_count == 10 * cube.row_count
+    assert bigger.nbytes == cube.nbytes
+    for driver, totals in cube.driver_totals.items():
+        assert len(bigger.driver_totals[driver]) == len(totals)
+    assert len(bigger.date_totals) == len(cube.date_totals)
+
+
+def test_streamed_cube_matches_the_loaded_one(sales_csv):
+    path = sales_csv(scale=3, daily=True)
+    data = CSVSource(path).read()
+    loaded = SalesCube.from_frame(data)
+    streamed = _stream(path, chunksize=700)
+
+    for measure, stat in (('Automobile_Sales', 'mean'), ('Advertising_Expenditure', 'sum')):
+        for by in ('Year', 'Month', 'Vehicle_Type'):
+            pd.testing.assert_frame_equal(
+                streamed.series(measure, by, stat, recession=1), loaded.series(measure, by, stat, recession=1)
+            )
+    for granularity in ('Month', 'Day'):
+        pd.testing.assert_frame_equal(streamed.timeseries(granularity), loaded.timeseries(granularity))
+    pd.testing.assert_frame_equal(
+        streamed.by_driver('unemployment_rate', Binning(), recession=1),
+        loaded.by_driver('unemployment_rate', Binning(), recession=1),
+    )
+
+    raw = pd.read_csv(path)
+    expected = raw.groupby('Year')['Automobile_Sales'].mean()
+    np.testing.assert_allclose(streamed.series('Automobile_Sales', 'Year')['Automobile_Sales'], expected)